@@ -1,80 +1,56 @@
-from db import (get_date_for_habit, get_all_habits, get_periodicity, get_all_dates_for_habit)
-import pandas as pd
-from tabulate import tabulate
-from datetime import datetime, timedelta
-import questionary
+from db import (get_all_habits, get_periodicity, get_all_dates_for_habit, get_periods_for_habit,
+                get_all_periodicities, iter_completion_dates, get_habit_rows, get_sorted_habits,
+                get_streak_leaders, get_leaderboard, get_all_completion_periods, day_number,
+                get_summary, get_habits_by_partition, get_completion_bitmap, get_days_for_habit, get_habit_version,
+                open_completion_archive, get_archived_habits, PERIOD_LENGTHS, HABIT_HEADERS)
+from instrumentation import profiled
+from collections import OrderedDict
+from itertools import islice
 
+# numpy, tabulate and questionary are imported by the functions that need them, so that starting the command line
+# interface does not pay for loading them
 
+
+@profiled
 def calculate_current_streak(db, habit_name):
     """
     Calculate the length of the current streak
 
     :param db: An initialized SQLite3 database connection
     :param habit_name: Name of the habit for which the length of the current streak should be calculated
-    :return: Length of the current streak
+    :return: Length of the current streak, counted in consecutive calendar periods of the habit's periodicity
     """
-    completion_dates = get_date_for_habit(db, habit_name)
-    completion_dates.reverse()
-    periodicity = get_periodicity(db, habit_name)
     current_streak = 0
+    if get_periodicity(db, habit_name) not in PERIOD_LENGTHS:
+        return current_streak
+    periods = get_periods_for_habit(db, habit_name)
 
-    for i in range(len(completion_dates) - 1):
-        if periodicity == 'Daily':
-            date1 = datetime.strptime(completion_dates[i], '%Y-%m-%d')
-            date2 = datetime.strptime(completion_dates[i + 1], '%Y-%m-%d')
-            delta = timedelta(days=1)
-            if date2 - date1 == delta:
-                current_streak += 1
-            else:
-                current_streak = 0
-                print('The current streak has been reset')
-        elif periodicity == 'Weekly':
-            date1 = datetime.strptime(completion_dates[i], '%Y-%m-%d')
-            date2 = datetime.strptime(completion_dates[i + 1], '%Y-%m-%d')
-            delta = timedelta(weeks=1)
-            if date2 - date1 == delta:
-                current_streak += 1
-            else:
-                current_streak = 0
-                print('The current streak has been reset')
-        elif periodicity == 'Monthly':
-            date1 = datetime.strptime(completion_dates[i], '%Y-%m-%d')
-            date2 = datetime.strptime(completion_dates[i + 1], '%Y-%m-%d')
-            delta = timedelta(days=30)
-            if date2 - date1 == delta:
-                current_streak += 1
-            else:
-                current_streak = 0
-                print('The current streak has been reset')
+    for i in range(len(periods) - 1):
+        if periods[i + 1] - periods[i] == 1:
+            current_streak += 1
+        else:
+            current_streak = 0
+            print('The current streak has been reset')
     return current_streak
 
 
+@profiled
 def calculate_longest_streak(db, habit_name):
     """
     Calculate the length of the longest streak
 
     :param db: An initialized SQLite3 database connection
     :param habit_name: Name of the habit for which the longest streak should be calculated
-    :return: Length of the longest streak since tracking the habit
+    :return: Length of the longest streak since tracking the habit, counted in consecutive calendar periods
     """
-    completion_dates = get_date_for_habit(db, habit_name)
-    completion_dates.reverse()
-    periodicity = get_periodicity(db, habit_name)
     longest_streak = 0
     current_streak = 0
+    if get_periodicity(db, habit_name) not in PERIOD_LENGTHS:
+        return longest_streak
+    periods = get_periods_for_habit(db, habit_name)
 
-    for i in range(len(completion_dates) - 1):
-        date1 = datetime.strptime(completion_dates[i], '%Y-%m-%d')
-        date2 = datetime.strptime(completion_dates[i + 1], '%Y-%m-%d')
-
-        if periodicity == 'Daily':
-            delta = timedelta(days=1)
-        elif periodicity == 'Weekly':
-            delta = timedelta(weeks=1)
-        elif periodicity == 'Monthly':
-            delta = timedelta(days=30)
-
-        if date2 - date1 == delta:
+    for i in range(len(periods) - 1):
+        if periods[i + 1] - periods[i] == 1:
             current_streak += 1
             longest_streak = max(longest_streak, current_streak)
         else:
@@ -83,6 +59,217 @@ def calculate_longest_streak(db, habit_name):
     return longest_streak
 
 
+class StreakCache:
+    """
+    Cache of the streaks of the habits of one database connection, a cached streak is recalculated as soon as the
+    change counter of its habit has increased. The least recently used streaks are evicted once max_size streaks are
+    cached.
+    """
+
+    def __init__(self, db, max_size=1024):
+        """
+        :param db: An initialized SQLite3 database connection
+        :param max_size: Maximum number of cached streaks
+        """
+        self.db = db
+        self.max_size = max_size
+        self._results = OrderedDict()
+
+    def _cached(self, function, habit_name):
+        # The version is read before calculating, so a change in between makes the cached result outdated, not wrong
+        version = get_habit_version(self.db, habit_name)
+        key = (function.__name__, habit_name)
+        cached = self._results.get(key)
+        if cached is not None and cached[0] == version:
+            self._results.move_to_end(key)
+            return cached[1]
+        result = function(self.db, habit_name)
+        self._results[key] = (version, result)
+        self._results.move_to_end(key)
+        if len(self._results) > self.max_size:
+            self._results.popitem(last=False)
+        return result
+
+    def calculate_current_streak(self, habit_name):
+        """
+        Cached version of calculate_current_streak
+        """
+        return self._cached(calculate_current_streak, habit_name)
+
+    def calculate_longest_streak(self, habit_name):
+        """
+        Cached version of calculate_longest_streak
+        """
+        return self._cached(calculate_longest_streak, habit_name)
+
+
+@profiled
+def calculate_bitmap_streaks(db, habit_name):
+    """
+    Calculate the current and the longest streak of a daily habit from its completion bitmap
+
+    :param db: An initialized SQLite3 database connection
+    :param habit_name: Name of the habit for which the streaks should be calculated
+    :return: Tuple of the current streak and the longest streak or None in the case the habit has no completion bitmap
+    """
+    bitmap = get_completion_bitmap(db, habit_name)
+    if bitmap is None:
+        return None
+    return bitmap.current_streak(), bitmap.longest_streak()
+
+
+@profiled
+def was_completed_on(db, habit_name, event_date):
+    """
+    Checks whether a habit was completed on a certain date, using the completion bitmap of the habit if it has one
+
+    :param db: An initialized SQLite3 database connection
+    :param habit_name: Name of the habit
+    :param event_date: Date as an ISO formatted string or datetime.date object
+    :return: True if the habit was completed on the date, False otherwise
+    """
+    day = day_number(event_date)
+    bitmap = get_completion_bitmap(db, habit_name)
+    if bitmap is not None:
+        return bitmap.is_completed(day)
+    return day in get_days_for_habit(db, habit_name)
+
+
+@profiled
+def count_completions(db, habit_name, start_date=None, end_date=None):
+    """
+    Counts the days within a window on which a habit was completed, using the completion bitmap of the habit if it
+    has one
+
+    :param db: An initialized SQLite3 database connection
+    :param habit_name: Name of the habit
+    :param start_date: First date of the window, None for no lower bound
+    :param end_date: Last date of the window, None for no upper bound
+    :return: Number of distinct completion days within the window
+    """
+    start_day = None if start_date is None else day_number(start_date)
+    end_day = None if end_date is None else day_number(end_date)
+    bitmap = get_completion_bitmap(db, habit_name)
+    if bitmap is not None:
+        return bitmap.count(start_day, end_day)
+    return len({day for day in get_days_for_habit(db, habit_name)
+                if (start_day is None or day >= start_day) and (end_day is None or day <= end_day)})
+
+
+def _streak_lengths(habit_codes, periods, steps, habit_count):
+    """
+    Calculate the current and the longest streak of several habits from their completed periods at once
+
+    :param habit_codes: Array with the index of the habit each completed period belongs to, grouped by habit
+    :param periods: Array with the distinct completed period numbers, sorted within each habit
+    :param steps: Array with the difference of period numbers that continues a streak for each habit
+    :param habit_count: Number of habits
+    :return: Tuple of two arrays holding the current and the longest streak of each habit
+    """
+    import numpy as np
+
+    current_streaks = np.zeros(habit_count, dtype=np.int64)
+    longest_streaks = np.zeros(habit_count, dtype=np.int64)
+    if len(periods) < 2:
+        return current_streaks, longest_streaks
+
+    # A pair of neighbouring completed periods continues a streak if both belong to the same habit and are consecutive
+    # periods. The length of the run of such pairs ending at each position is the number of continuing pairs
+    # since the last pair that broke the streak.
+    continues = (habit_codes[1:] == habit_codes[:-1]) & (np.diff(periods) == steps[habit_codes[1:]])
+    continued = np.cumsum(continues)
+    run_lengths = continued - np.maximum.accumulate(np.where(continues, 0, continued))
+
+    np.maximum.at(longest_streaks, habit_codes[1:], run_lengths)
+    last_completions = np.flatnonzero(np.append(habit_codes[1:] != habit_codes[:-1], True))
+    has_pair = last_completions > 0
+    current_streaks[habit_codes[last_completions[has_pair]]] = run_lengths[last_completions[has_pair] - 1]
+    return current_streaks, longest_streaks
+
+
+def _add_archived_periods(archive, periodicities, habit_names, habit_codes, periods):
+    """
+    Adds the completed periods of the completion archive to those read from the completion days table
+
+    :param archive: archive.CompletionArchive
+    :param periodicities: Dictionary mapping the habits whose archived completions are added to their periodicities
+    :param habit_names: List of the habit names the habit codes refer to
+    :param habit_codes: Array with the index of the habit each completed period belongs to, grouped by habit
+    :param periods: Array with the distinct completed period numbers, sorted within each habit
+    :return: Tuple of the combined habit names, habit codes and periods in the same form
+    """
+    import numpy as np
+    from archive import archived_periods
+
+    archive_ids, archive_periods = archived_periods(archive, periodicities)
+    names = habit_names + [habit_name for habit_name in periodicities.keys() - set(habit_names)]
+    positions = {habit_name: position for position, habit_name in enumerate(names)}
+    live_codes = np.array([positions[habit_name] for habit_name in habit_names], dtype=np.int64)
+    archive_codes = np.array([positions.get(habit_name, -1) for habit_name in archive.habit_names], dtype=np.int64)
+    habit_codes = np.concatenate((live_codes[habit_codes], archive_codes[archive_ids]))
+    periods = np.concatenate((periods, archive_periods))
+
+    # Both tiers are sorted by habit and period on their own, merging them may bring the same period together twice
+    order = np.lexsort((periods, habit_codes))
+    habit_codes, periods = habit_codes[order], periods[order]
+    distinct = np.ones(len(periods), dtype=bool)
+    distinct[1:] = (habit_codes[1:] != habit_codes[:-1]) | (periods[1:] != periods[:-1])
+    return names, habit_codes[distinct], periods[distinct]
+
+
+@profiled
+def calculate_all_streaks(db, habit_range=None):
+    """
+    Calculate the current and the longest streak of all habits at once from a single pass over the completed periods
+
+    :param db: An initialized SQLite3 database connection
+    :param habit_range: Tuple (first habit name, last habit name) restricting the calculation to an inclusive range
+    of names, None for all habits
+    :return: Dictionary mapping each habit name to a tuple of its current streak and its longest streak
+    """
+    import numpy as np
+
+    periodicities = get_all_periodicities(db, habit_range)
+    streaks = {habit_name: (0, 0) for habit_name in periodicities}
+    habit_counts, completion_periods = get_all_completion_periods(db, habit_range)
+    unique_names = [habit_name for habit_name, count in habit_counts]
+    counts = np.array([count for habit_name, count in habit_counts], dtype=np.int64)
+    habit_codes = np.repeat(np.arange(len(unique_names)), counts)
+    periods = np.array(completion_periods, dtype=np.int64)
+
+    archive = open_completion_archive(db)
+    if archive is not None:
+        unique_names, habit_codes, periods = _add_archived_periods(
+            archive, {habit_name: periodicities.get(habit_name) for habit_name in get_archived_habits(db, habit_range)},
+            unique_names, habit_codes, periods)
+    if not len(periods):
+        return streaks
+
+    # Completions of habits missing from the habit table or with an unknown periodicity never continue a streak
+    steps = np.array([1 if periodicities.get(habit_name) in PERIOD_LENGTHS else -1 for habit_name in unique_names])
+
+    current_streaks, longest_streaks = _streak_lengths(habit_codes, periods, steps, len(unique_names))
+    for habit_name, current_streak, longest_streak in zip(unique_names, current_streaks.tolist(),
+                                                          longest_streaks.tolist()):
+        if habit_name in streaks:
+            streaks[habit_name] = (current_streak, longest_streak)
+    return streaks
+
+
+def _print_table(rows, headers, index):
+    """
+    Prints rows as a psql formatted table with an index column in front of them
+
+    :param rows: List of tuples, one per table row
+    :param headers: Column headers of the table
+    :param index: Values of the index column, one per table row
+    """
+    from tabulate import tabulate
+
+    print(tabulate(rows, headers=headers, tablefmt='psql', showindex=index))
+
+
+@profiled
 def table_all_habits(db):
     """
     Returns a table including all habits and the information stored with the habits
@@ -90,168 +277,265 @@ def table_all_habits(db):
     :param db: An initialized SQLite3 database connection
     :return: Table of all habits
     """
-    all_habits_data = get_all_habits(db)
-    if not all_habits_data:
+    habit_rows = get_habit_rows(db)
+    if not habit_rows:
         print("No habits found.")
     else:
-        df = pd.DataFrame(all_habits_data)
-        print(tabulate(df, headers='keys', tablefmt='psql'))
+        _print_table(habit_rows, HABIT_HEADERS, range(len(habit_rows)))
 
 
-def table_sorted_alphabet(db):
+@profiled
+def table_sorted_habits(db, sort_by, descending=False, limit=None, offset=0):
     """
-    Returns a table including all habits and the information stored with the habits sorted by alphabet
+    Returns a table including the habits and the information stored with the habits sorted by one of their columns
 
     :param db: An initialized SQLite3 database connection
-    :return: Table of all habits sorted by alphabet
+    :param sort_by: Column of the habit table the habits should be sorted by, one of db.SORT_COLUMNS
+    :param descending: Whether the habits should be sorted in descending instead of ascending order
+    :param limit: Maximum number of habits that should be displayed, None displays all habits
+    :param offset: Number of habits at the start of the sort order that should be skipped
+    :return: Table of the habits, the index column holds the rank of each habit in the sort order
     """
-    all_habits_data = get_all_habits(db)
-    if not all_habits_data:
+    habit_rows = get_sorted_habits(db, sort_by, descending, limit, offset)
+    if not habit_rows:
         print("No habits found.")
     else:
-        df = pd.DataFrame(all_habits_data)
-        df_sorted = df.sort_values(by='habit name')
-        print(tabulate(df_sorted, headers='keys', tablefmt='psql'))
+        _print_table(habit_rows, HABIT_HEADERS, range(offset, offset + len(habit_rows)))
+
+
+@profiled
+def table_sorted_alphabet(db, descending=False, limit=None, offset=0):
+    """
+    Returns a table including all habits and the information stored with the habits sorted by alphabet
+
+    :param db: An initialized SQLite3 database connection
+    :param descending: Whether the habits should be sorted in descending instead of ascending order
+    :param limit: Maximum number of habits that should be displayed, None displays all habits
+    :param offset: Number of habits at the start of the sort order that should be skipped
+    :return: Table of all habits sorted by alphabet
+    """
+    table_sorted_habits(db, "habit_name", descending, limit, offset)
 
 
-def table_sorted_periodicity(db):
+@profiled
+def table_sorted_periodicity(db, descending=False, limit=None, offset=0):
     """
     Returns a table including all habits and the information stored with the habits sorted by periodicity
 
     :param db: An initialized SQLite3 database connection
+    :param descending: Whether the habits should be sorted in descending instead of ascending order
+    :param limit: Maximum number of habits that should be displayed, None displays all habits
+    :param offset: Number of habits at the start of the sort order that should be skipped
     :return: Table of all habits sorted by periodicity
     """
-    all_habits_data = get_all_habits(db)
-    if not all_habits_data:
-        print("No habits found.")
-    else:
-        df = pd.DataFrame(all_habits_data)
-        df_sorted = df.sort_values(by='periodicity')
-        print(tabulate(df_sorted, headers='keys', tablefmt='psql'))
+    table_sorted_habits(db, "periodicity", descending, limit, offset)
 
 
-def table_sorted_current_streak(db):
+@profiled
+def table_sorted_current_streak(db, descending=False, limit=None, offset=0):
     """
     Returns a table including all habits and the information stored with the habits sorted by current streak
 
     :param db: An initialized SQLite3 database connection
+    :param descending: Whether the habits should be sorted in descending instead of ascending order
+    :param limit: Maximum number of habits that should be displayed, None displays all habits
+    :param offset: Number of habits at the start of the sort order that should be skipped
     :return: Table of all habits sorted by current streak
     """
-    all_habits_data = get_all_habits(db)
-    if not all_habits_data:
-        print("No habits found.")
-    else:
-        df = pd.DataFrame(all_habits_data)
-        df_sorted = df.sort_values(by='current streak')
-        print(tabulate(df_sorted, headers='keys', tablefmt='psql'))
+    table_sorted_habits(db, "current_streak", descending, limit, offset)
 
 
-def table_sorted_longest_streak(db):
+@profiled
+def table_sorted_longest_streak(db, descending=False, limit=None, offset=0):
     """
     Returns a table including all habits and the information stored with the habits sorted by longest streak
 
     :param db: An initialized SQlite3 database connection
+    :param descending: Whether the habits should be sorted in descending instead of ascending order
+    :param limit: Maximum number of habits that should be displayed, None displays all habits
+    :param offset: Number of habits at the start of the sort order that should be skipped
     :return: Table of all habits sorted by longest streak
     """
-    all_habits_data = get_all_habits(db)
-    if not all_habits_data:
-        print("No habits found.")
-    else:
-        df = pd.DataFrame(all_habits_data)
-        df_sorted = df.sort_values(by='longest streak')
-        print(tabulate(df_sorted, headers='keys', tablefmt='psql'))
+    table_sorted_habits(db, "longest_streak", descending, limit, offset)
 
 
-def table_completion_dates(db, habit_name):
+# Number of completion dates per page when completion dates are displayed page by page
+PAGE_SIZE = 50
+
+# Column headers of the completion dates tables
+COMPLETION_HEADERS = ['habit name', 'completion date']
+
+
+@profiled
+def table_completion_dates(db, habit_name, page_size=None, start_date=None, end_date=None, limit=None):
     """
     Returns a table including all completion dates for a specific habit
 
+    Without any of the optional arguments the whole history is loaded and printed as one table. Otherwise the
+    completion dates are streamed from the database and printed page by page as soon as each page is complete.
+
     :param habit_name: Name of the habit for which completion dates should be retrieved
     :param db: An initialized SQlite3 database connection
+    :param page_size: Number of completion dates per printed table
+    :param start_date: Earliest completion date that should be displayed
+    :param end_date: Latest completion date that should be displayed
+    :param limit: Maximum number of completion dates that should be displayed
     :return: Table of all completion dates for a specific habit
     """
-    completion_dates = get_all_dates_for_habit(db, habit_name)
-    if not completion_dates:
+    if page_size is None and start_date is None and end_date is None and limit is None:
+        completion_dates = get_all_dates_for_habit(db, habit_name)
+        if not completion_dates:
+            print("There are currently no completion dates for this habit.")
+        else:
+            _print_table(completion_dates, COMPLETION_HEADERS, range(len(completion_dates)))
+        return
+
+    completion_dates = iter_completion_dates(db, habit_name, start_date, end_date, limit)
+    page_size = page_size or PAGE_SIZE
+    row_number = 0
+    while True:
+        page = list(islice(completion_dates, page_size))
+        if not page:
+            break
+        _print_table(page, COMPLETION_HEADERS, range(row_number, row_number + len(page)))
+        row_number += len(page)
+    if row_number == 0:
         print("There are currently no completion dates for this habit.")
+
+
+def _display_habits_by_partition(db, partition_by, partition_value, description):
+    """
+    Displays the summary and the list of habits with a certain habit group or periodicity
+
+    :param db: An initialized SQlite3 database connection
+    :param partition_by: Column of the habit table, one of db.SUMMARY_PARTITIONS
+    :param partition_value: Value of the column the displayed habits have
+    :param description: Description of the habits used in the printed statements
+    """
+    summary = get_summary(db, partition_by, partition_value)
+    if not summary:
+        print(f"There are no habits with {description}.")
     else:
-        df = pd.DataFrame(completion_dates)
-        df.rename(columns={0: 'habit name', 1: 'completion date'}, inplace=True)
-        print(tabulate(df, headers='keys', tablefmt='psql'))
+        _, habit_count, total_completions, average_current_streak, max_longest_streak, last_activity = summary[0]
+        print(f"Habits with {description}:")
+        print(f"Habits: {habit_count}, Completions: {total_completions}, Average Current Streak: "
+              f"{average_current_streak}, Longest Streak: {max_longest_streak}, Last Activity: {last_activity}")
+        for habit in get_habits_by_partition(db, partition_by, partition_value):
+            print(f"Name: {habit[0]}, Current Streak: {habit[5]}, Longest Streak: {habit[6]}")
 
 
+@profiled
 def display_habit_by_periodicity(db):
     """
     Displays a list of habits with the same periodicity
 
     :param db: An initialized SQlite3 database connection
-    :return: Returns a statement including the habit name, the current streak, and the longest streak for all habits
-    with the same periodicity
+    :return: Returns a summary of all habits with the same periodicity and a statement including the habit name, the
+    current streak, and the longest streak for each of them
     """
+    import questionary
+
     chosen_periodicity = questionary.select("For which periodicity do you want to display your habits?",
                                             choices=["Daily", "Weekly", "Monthly"]
                                             ).ask()
-    user_habits = get_all_habits(db)
-    filtered_habits = [habit for habit in user_habits if habit["periodicity"] == chosen_periodicity]
-    if not user_habits:
-        print("There are no existing habits.")
-    else:
-        print(f"Habits with {chosen_periodicity} periodicity:")
-        for habit in filtered_habits:
-            print(f"Name: {habit['habit name']}, Current Streak: {habit['current streak']}, "
-                  f"Longest Streak: {habit['longest streak']}")
+    _display_habits_by_partition(db, "periodicity", chosen_periodicity, f"{chosen_periodicity} periodicity")
 
 
+@profiled
 def display_habit_by_group(db):
     """
     Displays a list of habits within the same group
 
     :param db: An initialized SQlite3 database connection
-    :return: Returns a statement including the habit name, the current streak, and the longest streak for all habits
-    with the same group
+    :return: Returns a summary of all habits within the same group and a statement including the habit name, the
+    current streak, and the longest streak for each of them
     """
+    import questionary
+
     chosen_group = questionary.select("Which group does your habit belong to?",
                                       choices=["Health", "Education", "Food", "Sports", "Living"]
                                       ).ask()
-    user_habits = get_all_habits(db)
-    filtered_habits = [habit for habit in user_habits if habit["habit group"] == chosen_group]
-    if not user_habits:
-        print("There are no existing habits.")
+    _display_habits_by_partition(db, "habit_group", chosen_group, f"{chosen_group} group")
+
+
+@profiled
+def table_summary(db, partition_by):
+    """
+    Returns a table with the aggregated values of all habits per habit group or periodicity
+
+    :param db: An initialized SQlite3 database connection
+    :param partition_by: Column of the habit table the habits are aggregated by, one of db.SUMMARY_PARTITIONS
+    :return: Table with one row per habit group or periodicity
+    """
+    summary = get_summary(db, partition_by)
+    if not summary:
+        print("No habits found.")
     else:
-        print(f"Habits with {chosen_group} group:")
-        for habit in filtered_habits:
-            print(f"Name: {habit['habit name']}, Current Streak: {habit['current streak']},"
-                  f"Longest Streak: {habit['longest streak']}")
+        _print_table(summary, [partition_by.replace("_", " "), "habits", "completions", "average current streak",
+                               "longest streak", "last activity"], range(len(summary)))
+
 
+def _print_streak_leaders(db, column, description):
+    """
+    Prints all habits that share the highest value of a streak column
 
+    :param db: An initialized SQlite3 database connection
+    :param column: Streak column of the habit table
+    :param description: Description of the streak used in the printed statement
+    """
+    leaders = get_streak_leaders(db, column)
+    if not leaders:
+        print("No habits found.")
+    elif len(leaders) == 1:
+        print(f"Habit with the {description} ({leaders[0][1]}): {leaders[0][0]}")
+    else:
+        print(f"Habits with the {description} ({leaders[0][1]}): {', '.join(leader[0] for leader in leaders)}")
+
+
+@profiled
 def habit_with_longest_current_streak(db):
     """
     Display the habit with the longest current streak among all habits
 
     :param db: An initialized SQlite3 database connection
     :return: Returns a statement including the habit name and the current streak for the habit with the
-    longest current streak
+    longest current streak, or all habits that share the longest current streak
     """
-    habit_list = get_all_habits(db)
-    if not habit_list:
-        print("No habits found.")
-    else:
-        habit_with_max_current_streak = max(habit_list, key=lambda habit: habit['current streak'])
-        print(f"Habit with the longest current streak ({habit_with_max_current_streak['current streak']}): "
-              f"{habit_with_max_current_streak['habit name']}")
+    _print_streak_leaders(db, "current_streak", "longest current streak")
 
 
+@profiled
 def habit_with_longest_streak(db):
     """
     Display the habit with the longest streak among all habits
 
     :param db: An initialized SQlite3 database connection
     :return: Returns a statement including the habit name and the longest streak for the habit with the
-    longest streak
+    longest streak, or all habits that share the longest streak
+    """
+    _print_streak_leaders(db, "longest_streak", "longest streak")
+
+
+@profiled
+def table_leaderboard(db, column="longest_streak", limit=10, partition_by=None):
+    """
+    Returns a table with the ranking of the habits with the highest streaks
+
+    :param db: An initialized SQlite3 database connection
+    :param column: Streak column the habits are ranked by, one of db.LEADERBOARD_COLUMNS
+    :param limit: Number of places of the leaderboard, habits that tie with the last place are included
+    :param partition_by: Column with a separate ranking for each of its values, one of db.LEADERBOARD_PARTITIONS
+    :return: Table of the leaderboard
     """
-    habit_list = get_all_habits(db)
-    if not habit_list:
+    leaderboard = get_leaderboard(db, column, limit, partition_by)
+    if not leaderboard:
         print("No habits found.")
+    elif partition_by is None:
+        _print_table([(place, dense_place, habit_name, streak)
+                      for habit_name, partition, streak, place, dense_place in leaderboard],
+                     ["rank", "dense rank", "habit name", column.replace("_", " ")], range(len(leaderboard)))
     else:
-        habit_with_max_longest_streak = max(habit_list, key=lambda habit: habit['longest streak'])
-        print(f"Habit with the longest streak ({habit_with_max_longest_streak['longest streak']}): "
-              f"{habit_with_max_longest_streak['habit name']}")
+        _print_table([(partition, place, dense_place, habit_name, streak)
+                      for habit_name, partition, streak, place, dense_place in leaderboard],
+                     [partition_by.replace("_", " "), "rank", "dense rank", "habit name", column.replace("_", " ")],
+                     range(len(leaderboard)))
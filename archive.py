@@ -0,0 +1,195 @@
+import json
+import mmap
+import os
+import struct
+import threading
+
+import numpy as np
+
+from db import EPOCH_ORDINAL
+
+# Marks completion archive files and the version of their layout
+MAGIC = b"HTARCH01"
+
+# Header of an archive file: magic, number of habits, number of completion days and length of the habit names. It is
+# followed by the columns, the int64 offsets of the first completion day of each habit (plus one past the last one),
+# the int32 completion days as days since 1970-01-01 grouped by habit and sorted within each habit, and the habit names
+# as UTF-8 encoded JSON list sorted by name. A habit's ID is its index in the list of names.
+_HEADER = struct.Struct("<8sQQQ")
+
+# Open archives by path, archive files are never changed after they have been written
+_archives = {}
+_archives_lock = threading.Lock()
+
+
+class CompletionArchive:
+    """
+    Read-only completion archive file. The file is memory-mapped and its columns are NumPy arrays backed directly by
+    the mapping, so reading them copies nothing and only the pages that are accessed are loaded from disk.
+    """
+
+    def __init__(self, path):
+        """
+        :param path: Path of the archive file
+        """
+        self.path = path
+        with open(path, "rb") as file:
+            self._buffer = buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, habit_count, day_count, names_length = _HEADER.unpack_from(buffer)
+        if magic != MAGIC:
+            raise Exception(f"'{path}' is not a completion archive.")
+        days_offset = _HEADER.size + 8 * (habit_count + 1)
+        names_offset = days_offset + 4 * day_count
+        # The arrays keep the mapping alive for as long as any view of them exists
+        self.offsets = np.frombuffer(buffer, dtype="<i8", count=habit_count + 1, offset=_HEADER.size)
+        self.days = np.frombuffer(buffer, dtype="<i4", count=day_count, offset=days_offset)
+        self.habit_names = json.loads(buffer[names_offset:names_offset + names_length].decode())
+        self._habit_ids = {habit_name: habit_id for habit_id, habit_name in enumerate(self.habit_names)}
+
+    def __len__(self):
+        return len(self.days)
+
+    def habit_days(self, habit_name):
+        """
+        :param habit_name: Name of the habit
+        :return: View of the archived completion days of the habit in ascending order, empty for habits that are not
+        archived
+        """
+        habit_id = self._habit_ids.get(habit_name)
+        if habit_id is None:
+            return self.days[:0]
+        return self.days[self.offsets[habit_id]:self.offsets[habit_id + 1]]
+
+    def close(self):
+        """
+        Releases the columns and unmaps the file. Views of the columns that are still used elsewhere keep the mapping
+        open until they are released as well.
+        """
+        self.offsets = self.days = None
+        try:
+            self._buffer.close()
+        except BufferError:
+            pass
+
+    def habit_ids(self):
+        """
+        :return: Array with the ID of the habit each archived completion day belongs to
+        """
+        return np.repeat(np.arange(len(self.habit_names)), np.diff(self.offsets))
+
+
+def open_archive(path):
+    """
+    Opens an archive file, files that have been opened before are mapped only once
+
+    :param path: Path of the archive file
+    :return: CompletionArchive
+    """
+    with _archives_lock:
+        archive = _archives.get(path)
+        if archive is None:
+            archive = _archives[path] = CompletionArchive(path)
+        return archive
+
+
+def close_archive(path):
+    """
+    Closes an archive file that has been opened with open_archive, e.g. before it is removed
+
+    :param path: Path of the archive file
+    """
+    with _archives_lock:
+        archive = _archives.pop(path, None)
+    if archive is not None:
+        archive.close()
+
+
+def write_archive(path, habit_names, offsets, days):
+    """
+    Writes an archive file and flushes it to disk
+
+    :param path: Path of the archive file, an existing file is replaced
+    :param habit_names: List of the habit names in ascending order
+    :param offsets: Array with the position of the first completion day of each habit, plus the number of days
+    :param days: Array with the completion days grouped like the habit names and sorted within each habit
+    """
+    names = json.dumps(habit_names).encode()
+    days = np.asarray(days, dtype="<i4")
+    with _archives_lock:
+        _archives.pop(path, None)
+    with open(path, "wb") as file:
+        file.write(_HEADER.pack(MAGIC, len(habit_names), len(days), len(names)))
+        file.write(np.asarray(offsets, dtype="<i8").tobytes())
+        file.write(days.tobytes())
+        file.write(names)
+        file.flush()
+        os.fsync(file.fileno())
+
+
+def merge_archive(archive, archived_habits, moved_habits, moved_days):
+    """
+    Combines the completion days of an archive with completion days that are moved into the archive
+
+    :param archive: CompletionArchive holding the previously archived completion days, None if there is none
+    :param archived_habits: Collection of the habits of the archive whose completion days are kept
+    :param moved_habits: List of tuples (habit name, number of moved completion days) sorted by habit name
+    :param moved_days: Array with the moved completion days grouped like moved_habits
+    :return: Tuple of the habit names, offsets and days of the combined archive, see write_archive
+    """
+    moved_offsets = np.cumsum([0] + [count for habit_name, count in moved_habits])
+    moved = {habit_name: moved_days[moved_offsets[i]:moved_offsets[i + 1]]
+             for i, (habit_name, count) in enumerate(moved_habits)}
+    kept = set(archived_habits) if archive is not None else set()
+    habit_names = sorted(kept | moved.keys())
+    habit_days = []
+    for habit_name in habit_names:
+        days = moved.get(habit_name, moved_days[:0])
+        if habit_name in kept:
+            days = np.sort(np.concatenate((archive.habit_days(habit_name), days)), kind="stable")
+        habit_days.append(days)
+    offsets = np.cumsum([0] + [len(days) for days in habit_days])
+    return habit_names, offsets, np.concatenate(habit_days) if habit_days else np.empty(0, dtype=np.int32)
+
+
+def period_numbers(periodicity, days):
+    """
+    Converts an array of day numbers into the numbers of the periods they belong to, the NumPy counterpart of
+    db.period_number
+
+    :param periodicity: Periodicity of the habits, unknown periodicities are handled like Daily
+    :param days: Array of days since 1970-01-01
+    :return: Array of the period numbers
+    """
+    days = days.astype(np.int64)
+    if periodicity == 'Weekly':
+        return (days + EPOCH_ORDINAL - 1) // 7
+    if periodicity == 'Monthly':
+        return days.astype("datetime64[D]").astype("datetime64[M]").astype(np.int64) + 1970 * 12
+    return days
+
+
+def archived_periods(archive, periodicities):
+    """
+    Calculates the period numbers of the archived completion days of several habits from the columns of the archive
+
+    :param archive: CompletionArchive
+    :param periodicities: Dictionary mapping the names of the habits whose completion days should be included to their
+    periodicities
+    :return: Tuple of an array with the ID of the habit each period belongs to and an array with the period numbers,
+    grouped by habit ID and sorted within each habit, a period with several completions is listed once per completion
+    """
+    included = np.array([habit_name in periodicities for habit_name in archive.habit_names], dtype=bool)
+    habit_periodicities = np.array([periodicities.get(habit_name) for habit_name in archive.habit_names], dtype=object)
+    habit_ids = archive.habit_ids()
+    days = archive.days
+    # Habits that have been deleted since they were archived or are outside the requested habits are skipped
+    if not included.all():
+        rows = included[habit_ids]
+        habit_ids = habit_ids[rows]
+        days = days[rows]
+    periods = np.empty(len(days), dtype=np.int64)
+    row_periodicities = habit_periodicities[habit_ids]
+    for periodicity in set(habit_periodicities[included].tolist()):
+        rows = row_periodicities == periodicity
+        periods[rows] = period_numbers(periodicity, days[rows])
+    return habit_ids, periods
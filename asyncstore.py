@@ -0,0 +1,128 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from db import ConnectionPool, add_habit, increment_habit, get_all_habits
+from analyze import calculate_current_streak, calculate_longest_streak, calculate_all_streaks
+
+
+class AsyncHabitStore:
+    """
+    Asyncio interface to the habit database that never blocks the event loop
+
+    Writes run one after another on a dedicated writer thread and reads run on a pool of reader threads, each using
+    its own connection of a ConnectionPool. At most max_pending operations are queued or running at the same time,
+    further calls wait until a slot becomes free. Cancelling a call that has not started yet removes it from the
+    queue, a call that is already running on a thread is completed but its result is discarded and it keeps its slot
+    until then.
+    """
+
+    def __init__(self, name='main.db', readers=4, max_pending=100, busy_timeout=5000):
+        """
+        Opens the connections and threads of the store
+
+        :param name: Name of the SQlite3 database file
+        :param readers: Number of reader threads and read-only connections
+        :param max_pending: Maximum number of operations that are queued or running at the same time
+        :param busy_timeout: Milliseconds to wait for a lock held by another connection before giving up
+        """
+        self._pool = ConnectionPool(name, readers, busy_timeout)
+        self._writer_thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix='habit-writer')
+        self._reader_threads = ThreadPoolExecutor(max_workers=readers, thread_name_prefix='habit-reader')
+        self._pending = asyncio.Semaphore(max_pending)
+
+    async def _write(self, function, *args):
+        """
+        Runs a database function with the write connection on the writer thread
+
+        :param function: Function of the db or analyze module taking a database connection as first argument
+        :return: Result of the function
+        """
+        return await self._submit(self._writer_thread, self._pool.writer, function, args)
+
+    async def _read(self, function, *args):
+        """
+        Runs a database function with a read-only connection on one of the reader threads
+
+        :param function: Function of the db or analyze module taking a database connection as first argument
+        :return: Result of the function
+        """
+        return await self._submit(self._reader_threads, self._pool.reader, function, args)
+
+    async def _submit(self, threads, checkout, function, args):
+        """
+        Runs a database function on a thread once a slot is free. The slot is released when the thread has finished
+        the function or the function has been removed from the queue, not when a waiting caller is cancelled.
+
+        :param threads: Executor the function should run on
+        :param checkout: Context manager of the connection pool checking out the connection for the function
+        :param function: Function of the db or analyze module taking a database connection as first argument
+        :param args: Further arguments of the function
+        :return: Result of the function
+        """
+        await self._pending.acquire()
+        try:
+            future = threads.submit(self._call, checkout, function, args)
+        except BaseException:
+            self._pending.release()
+            raise
+        loop = asyncio.get_running_loop()
+        future.add_done_callback(lambda _: loop.call_soon_threadsafe(self._pending.release))
+        return await asyncio.wrap_future(future)
+
+    @staticmethod
+    def _call(checkout, function, args):
+        with checkout() as db:
+            return function(db, *args)
+
+    async def add_habit(self, habit_name, description, periodicity, habit_group, creation_date, current_streak,
+                        longest_streak):
+        """
+        Adds a new habit to the database, see db.add_habit
+        """
+        await self._write(add_habit, habit_name, description, periodicity, habit_group, creation_date,
+                          current_streak, longest_streak)
+
+    async def increment_habit(self, habit_name, event_date=None, incremental=False):
+        """
+        Stores a completion date of a habit in the database, see db.increment_habit
+        """
+        await self._write(increment_habit, habit_name, event_date, incremental)
+
+    async def get_all_habits(self):
+        """
+        Retrieves all habits from the database, see db.get_all_habits
+        """
+        return await self._read(get_all_habits)
+
+    async def calculate_current_streak(self, habit_name):
+        """
+        Calculates the length of the current streak of a habit, see analyze.calculate_current_streak
+        """
+        return await self._read(calculate_current_streak, habit_name)
+
+    async def calculate_longest_streak(self, habit_name):
+        """
+        Calculates the length of the longest streak of a habit, see analyze.calculate_longest_streak
+        """
+        return await self._read(calculate_longest_streak, habit_name)
+
+    async def calculate_all_streaks(self):
+        """
+        Calculates the current and the longest streak of all habits, see analyze.calculate_all_streaks
+        """
+        return await self._read(calculate_all_streaks)
+
+    async def close(self):
+        """
+        Waits for all running operations and closes the threads and connections of the store
+        """
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._writer_thread.shutdown)
+        await loop.run_in_executor(None, self._reader_threads.shutdown)
+        await loop.run_in_executor(None, self._pool.close)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
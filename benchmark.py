@@ -0,0 +1,209 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import statistics
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+from db import get_db, add_habits_bulk, increment_habits_bulk, increment_habit, get_all_habits, delete_habit_from_db
+from analyze import (calculate_current_streak, calculate_longest_streak, calculate_all_streaks, table_all_habits,
+                     table_sorted_alphabet, table_sorted_periodicity, table_sorted_current_streak,
+                     table_sorted_longest_streak, table_completion_dates)
+from generatetestdata import (generate_habits, generate_completions, DEFAULT_PERIODICITY_MIX,
+                              DEFAULT_COMPLETION_PROBABILITY, DEFAULT_MEAN_STREAK)
+
+# Number of habits and days of history that produce roughly the named number of completion dates
+DATASET_SIZES = {
+    "1k": (10, 200),
+    "100k": (270, 730),
+    "10M": (13400, 1460),
+}
+
+# Completion date of the generated datasets, fixed so that results are comparable between runs
+END_DATE = date(2024, 12, 31)
+
+# Positions in the habits ordered by number of completion dates whose streaks are timed, so that the streak scenarios
+# cover short as well as long histories
+HISTORY_QUANTILES = {"shortest": 0.0, "median": 0.5, "longest": 1.0}
+
+
+def build_dataset(path, size, seed):
+    """
+    Generates the dataset of a benchmark size unless it already exists
+
+    :param path: Database file of the dataset
+    :param size: Name of the dataset size, one of DATASET_SIZES
+    :param seed: Seed of the random number generator
+    """
+    if os.path.exists(path):
+        return
+    # A dataset left behind by an interrupted run is incomplete
+    for suffix in (".tmp", ".tmp-wal", ".tmp-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    habit_count, days = DATASET_SIZES[size]
+    rng = random.Random(seed)
+    habits = generate_habits(rng, habit_count, END_DATE - timedelta(days=days - 1), DEFAULT_PERIODICITY_MIX)
+    completions = generate_completions(rng, habits, END_DATE, DEFAULT_COMPLETION_PROBABILITY, DEFAULT_MEAN_STREAK)
+    db = get_db(path + ".tmp")
+    add_habits_bulk(db, habits)
+    increment_habits_bulk(db, completions, 50000)
+    db.close()
+    os.replace(path + ".tmp", path)
+
+
+def measure(function, repeat, warm_up=True):
+    """
+    Measures the wall time of a function, discarding everything it prints
+
+    :param function: Function without arguments
+    :param repeat: Number of measurements
+    :param warm_up: Whether the function is called once before the measurements, so that importing modules and filling
+    caches is not measured, False for functions that change the database
+    :return: Median wall time in seconds
+    """
+    timings = []
+    if warm_up:
+        with contextlib.redirect_stdout(io.StringIO()):
+            function()
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            function()
+            timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def run_benchmarks(path, repeat, increments):
+    """
+    Runs all benchmark scenarios against one dataset
+
+    :param path: Database file of the dataset, it is not modified
+    :param repeat: Number of measurements per scenario
+    :param increments: Number of single completion dates inserted by the increment_habit scenario
+    :return: Dictionary with the median wall time in seconds per scenario and the number of completion dates of the
+    habits the streaks were calculated for
+    """
+    work_path = path + ".work"
+    shutil.copyfile(path, work_path)
+    db = get_db(work_path)
+    try:
+        histories = db.execute("SELECT habit_name, COUNT(*) FROM completion_days GROUP BY habit_name "
+                               "ORDER BY COUNT(*), habit_name").fetchall()
+        results = {"history_lengths": {}, "get_all_habits": measure(lambda: get_all_habits(db), repeat)}
+        for label, quantile in HISTORY_QUANTILES.items():
+            habit_name, history_length = histories[round(quantile * (len(histories) - 1))]
+            results["history_lengths"][label] = history_length
+            results[f"calculate_current_streak_{label}"] = measure(lambda: calculate_current_streak(db, habit_name),
+                                                                   repeat)
+            results[f"calculate_longest_streak_{label}"] = measure(lambda: calculate_longest_streak(db, habit_name),
+                                                                   repeat)
+        results["calculate_all_streaks"] = measure(lambda: calculate_all_streaks(db), repeat)
+        # The remaining scenarios use the habit with the longest history
+        habit_name = histories[-1][0]
+        for table in (table_all_habits, table_sorted_alphabet, table_sorted_periodicity, table_sorted_current_streak,
+                      table_sorted_longest_streak):
+            results[table.__name__] = measure(lambda: table(db), repeat)
+        results["table_completion_dates"] = measure(lambda: table_completion_dates(db, habit_name), repeat)
+
+        event_date = str(END_DATE + timedelta(days=1))
+        results["increment_habit"] = measure(
+            lambda: [increment_habit(db, habit_name, event_date) for _ in range(increments)], 1, False) / increments
+        results["delete_habit_from_db"] = measure(lambda: delete_habit_from_db(db, habit_name), 1, False)
+    finally:
+        db.close()
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(work_path + suffix):
+                os.remove(work_path + suffix)
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """
+    Compares benchmark results with a stored baseline
+
+    :param results: Benchmark results as returned by main
+    :param baseline: Benchmark results of an earlier run
+    :param tolerance: Allowed relative slowdown before a scenario counts as regression, e.g. 0.25 for 25 %
+    :return: List of tuples (size, scenario, baseline seconds, current seconds) of all regressions
+    """
+    regressions = []
+    for size, scenarios in results["sizes"].items():
+        for scenario, seconds in scenarios.items():
+            if scenario == "history_lengths":
+                continue
+            baseline_seconds = baseline.get("sizes", {}).get(size, {}).get(scenario)
+            if baseline_seconds is None:
+                continue
+            status = "ok"
+            if seconds > baseline_seconds * (1 + tolerance):
+                status = "REGRESSION"
+                regressions.append((size, scenario, baseline_seconds, seconds))
+            print(f"{size:>5} {scenario:<34} {baseline_seconds * 1000:12.3f} ms {seconds * 1000:12.3f} ms "
+                  f"{seconds / max(baseline_seconds, 1e-12):7.2f}x {status}")
+    return regressions
+
+
+def main(argv=None):
+    """
+    Runs the benchmark suite, stores the results as JSON and compares them with a baseline
+
+    :param argv: List of command line arguments, None uses the arguments the program was started with
+    :return: Exit status of the program, 1 if a regression was found
+    """
+    parser = argparse.ArgumentParser(description="Benchmark the hot paths of the db and analyze modules.")
+    parser.add_argument("--sizes", nargs="+", choices=list(DATASET_SIZES), default=["1k", "100k"],
+                        help="dataset sizes in completion dates (default: 1k 100k)")
+    parser.add_argument("--data-dir", default="benchmark_data", help="directory of the generated datasets")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the generated datasets (default: 0)")
+    parser.add_argument("--repeat", type=int, default=5, help="measurements per scenario (default: 5)")
+    parser.add_argument("--increments", type=int, default=100,
+                        help="completion dates inserted by the increment_habit scenario (default: 100)")
+    parser.add_argument("--output", default="benchmark_results.json", help="file the results are written to")
+    parser.add_argument("--baseline", help="results of an earlier run to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed relative slowdown compared with the baseline (default: 0.25)")
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.data_dir, exist_ok=True)
+    results = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "sizes": {},
+    }
+    for size in args.sizes:
+        path = os.path.join(args.data_dir, f"benchmark_{size}_{args.seed}.db")
+        print(f"Preparing dataset {size} ...", file=sys.stderr)
+        build_dataset(path, size, args.seed)
+        print(f"Running benchmarks on dataset {size} ...", file=sys.stderr)
+        results["sizes"][size] = run_benchmarks(path, args.repeat, args.increments)
+
+    with open(args.output, "w") as output:
+        json.dump(results, output, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            regressions = compare(results, json.load(baseline_file), args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} scenario(s) slower than the baseline.")
+            return 1
+    else:
+        for size, scenarios in results["sizes"].items():
+            for scenario, seconds in scenarios.items():
+                if scenario != "history_lengths":
+                    print(f"{size:>5} {scenario:<34} {seconds * 1000:12.3f} ms")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
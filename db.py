@@ -1,103 +1,1588 @@
+import heapq
+import os
+import queue
+import re
 import sqlite3
-from datetime import date
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime
+from functools import lru_cache
+from itertools import islice
 
+from instrumentation import InstrumentedConnection, is_enabled, profiled
 
-def get_db(name='main.db'):
+# Approximate number of days in one period of each periodicity. Streaks are not calculated from these lengths but from
+# the calendar period numbers of the completion dates, see period_number.
+PERIOD_LENGTHS = {'Daily': 1, 'Weekly': 7, 'Monthly': 30}
+
+# Ordinal of 1970-01-01, completion dates are stored and compared as days since this date
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+# SQL expressions converting an ISO date string into a day number and back, 2440587.5 is the Julian day of 1970-01-01
+_ISO_TO_DAY = "CAST(julianday(date({})) - 2440587.5 AS INTEGER)"
+_DAY_TO_ISO = "date({} + 2440587.5)"
+
+# Number of distinct date strings whose parsed dates are kept, enough for every day of more than ten years
+DATE_CACHE_SIZE = 4096
+
+# Name of the sqlite3 converter that turns completion date columns into datetime.date objects on connections opened
+# with date_objects=True. Queries mark such columns with an alias of the form "name [isodate]".
+DATE_CONVERTER = "isodate"
+
+
+def _period_sql(periodicity, day):
+    """
+    Builds an SQL expression for the period number of a day number, the SQL counterpart of period_number
+
+    :param periodicity: SQL expression of the periodicity
+    :param day: SQL expression of the day number
+    :return: SQL expression
+    """
+    return (f"CASE {periodicity} WHEN 'Weekly' THEN ({day} + {EPOCH_ORDINAL - 1}) / 7 "
+            f"WHEN 'Monthly' THEN CAST(strftime('%Y', {_DAY_TO_ISO.format(day)}) AS INTEGER) * 12 "
+            f"+ CAST(strftime('%m', {_DAY_TO_ISO.format(day)}) AS INTEGER) - 1 ELSE {day} END")
+
+
+# Inserts a completion day of a habit together with its period number, parameters are the habit name and day number
+_INSERT_COMPLETION = (f"INSERT INTO completion_days (habit_name, day, period) SELECT ?1, ?2, "
+                      f"{_period_sql('(SELECT periodicity FROM habit WHERE habit_name = ?1)', '?2')}")
+
+
+@profiled
+def get_db(name='main.db', busy_timeout=5000, date_objects=False):
+    """
+    Initializes SQlite3 database connection
+
+    :param name: Name of the SQlite3 database
+    :param busy_timeout: Milliseconds to wait for a lock held by another connection before giving up
+    :param date_objects: Whether completion dates should be returned as datetime.date objects instead of ISO strings
+    :return: Allows access to database
+    """
+    db = _connect(name, busy_timeout, date_objects=date_objects)
+    create_tables(db)
+    return db
+
+
+def _connect(name, busy_timeout, read_only=False, date_objects=False):
+    """
+    Opens an SQLite3 database connection in WAL mode, so readers and a writer do not block each other
+
+    :param name: Name of the SQlite3 database
+    :param busy_timeout: Milliseconds to wait for a lock held by another connection before giving up
+    :param read_only: Whether the connection should only be allowed to read from the database
+    :param date_objects: Whether completion dates should be returned as datetime.date objects instead of ISO strings
+    :return: An SQLite3 database connection that may be used by any thread, but only by one at a time
+    """
+    factory = InstrumentedConnection if is_enabled() else sqlite3.Connection
+    detect_types = sqlite3.PARSE_COLNAMES if date_objects else 0
+    if read_only:
+        # Imported here, so that starting the program for a single command does not load pathlib
+        from pathlib import Path
+
+        db = sqlite3.connect(Path(name).absolute().as_uri() + '?mode=ro', uri=True, check_same_thread=False,
+                             factory=factory, detect_types=detect_types)
+    else:
+        db = sqlite3.connect(name, check_same_thread=False, factory=factory, detect_types=detect_types)
+        db.execute("PRAGMA journal_mode = WAL")
+    db.execute(f"PRAGMA busy_timeout = {int(busy_timeout)}")
+    return db
+
+
+def get_read_only_db(name='main.db', busy_timeout=5000):
+    """
+    Opens a connection that can only read from an existing SQlite3 database file, e.g. for worker processes
+
+    :param name: Name of the SQlite3 database file
+    :param busy_timeout: Milliseconds to wait for a lock held by another connection before giving up
+    :return: A read-only SQLite3 database connection
+    """
+    return _connect(name, busy_timeout, read_only=True)
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of connections to one database file with a single write connection and several read-only
+    connections
+    """
+
+    def __init__(self, name='main.db', readers=4, busy_timeout=5000):
+        """
+        Opens the connections of the pool and brings the database schema up to date
+
+        :param name: Name of the SQlite3 database file, in-memory databases cannot be shared between connections
+        :param readers: Number of read-only connections
+        :param busy_timeout: Milliseconds to wait for a lock held by another connection before giving up
+        """
+        if name == ':memory:':
+            raise Exception("A connection pool requires a database file.")
+        self.name = name
+        self._writer = get_db(name, busy_timeout)
+        self._write_lock = threading.Lock()
+        self._readers = queue.LifoQueue()
+        for _ in range(readers):
+            self._readers.put(_connect(name, busy_timeout, read_only=True))
+        self._reader_count = readers
+
+    @contextmanager
+    def writer(self):
+        """
+        Checks out the write connection, waiting until no other thread is using it
+
+        :return: The write connection; open transactions are committed on success and rolled back on errors
+        """
+        with self._write_lock:
+            try:
+                yield self._writer
+            except BaseException:
+                self._writer.rollback()
+                raise
+            else:
+                if self._writer.in_transaction:
+                    self._writer.commit()
+
+    @contextmanager
+    def reader(self, timeout=None):
+        """
+        Checks out a read-only connection, waiting until one is available
+
+        :param timeout: Seconds to wait for a free read-only connection, None waits forever
+        :return: A read-only connection
+        """
+        try:
+            db = self._readers.get(timeout=timeout)
+        except queue.Empty:
+            raise Exception("No read-only database connection became available in time.") from None
+        try:
+            yield db
+        finally:
+            if db.in_transaction:
+                db.rollback()
+            self._readers.put(db)
+
+    def close(self):
+        """
+        Closes all connections of the pool, waiting until every read-only connection has been returned
+        """
+        with self._write_lock:
+            self._writer.close()
+        for _ in range(self._reader_count):
+            self._readers.get().close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+@profiled
+def create_tables(db):
+    """
+    Creates tables for habits and completion dates
+
+    :param db: An initialized SQLite3 database connection
+    :return: The tables habit and completion dates are created in the database
+    """
+    cursor = db.cursor()
+
+    cursor.execute('''CREATE TABLE IF NOT EXISTS habit (
+    habit_name VARCHAR(20) PRIMARY KEY,
+    description TEXT NOT NULL, 
+    periodicity VARCHAR(20) NOT NULL,
+    habit_group VARCHAR(20), 
+    creation_date DATE NOT NULL,
+    current_streak INT,
+    longest_streak INT
+    )''')
+
+    cursor.execute('''CREATE TABLE IF NOT EXISTS completion_dates (
+    habit_name VARCHAR(20),
+    event_date DATETIME,
+    FOREIGN KEY (habit_name) REFERENCES habit(habit_name)
+    )''')
+
+    db.commit()
+    migrate_schema(db)
+
+
+def _migration_1_completion_index(cursor):
+    """
+    Adds a covering index on the completion dates so that lookups by habit no longer scan the whole table
+
+    :param cursor: Cursor of an SQLite3 database connection with an open transaction
+    """
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_completion_dates_habit_date "
+                   "ON completion_dates (habit_name, event_date)")
+
+
+def _migration_2_streak_state(cursor):
+    """
+    Adds the table holding the last completion day of each habit whose streaks are maintained incrementally
+
+    :param cursor: Cursor of an SQLite3 database connection with an open transaction
+    """
+    cursor.execute('''CREATE TABLE IF NOT EXISTS habit_streak_state (
+    habit_name VARCHAR(20) PRIMARY KEY,
+    last_day INTEGER NOT NULL,
+    FOREIGN KEY (habit_name) REFERENCES habit(habit_name)
+    )''')
+
+
+def _migration_3_habit_sort_indexes(cursor):
+    """
+    Adds indexes that serve the sorted habit queries, so that the first rows of a sort order are read directly
+
+    :param cursor: Cursor of an SQLite3 database connection with an open transaction
+    """
+    for column in ("periodicity", "current_streak", "longest_streak"):
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_habit_{column} ON habit ({column}, habit_name)")
+
+
+def _migration_4_leaderboards(cursor):
+    """
+    Adds the indexes of the per-group and per-periodicity leaderboards and a version counter of the streak columns
+    that triggers increase whenever a habit's streaks, group or periodicity change
+
+    :param cursor: Cursor of an SQLite3 database connection with an open transaction
+    """
+    for partition in ("habit_group", "periodicity"):
+        for column in ("current_streak", "longest_streak"):
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_habit_{partition}_{column} "
+                           f"ON habit ({partition}, {column})")
+    cursor.execute("CREATE TABLE IF NOT EXISTS streak_version (version INTEGER NOT NULL)")
+    cursor.execute("INSERT INTO streak_version SELECT 0 WHERE NOT EXISTS (SELECT 1 FROM streak_version)")
+    for name, event in (("insert", "INSERT"), ("delete", "DELETE"),
+                        ("update", "UPDATE OF current_streak, longest_streak, habit_group, periodicity")):
+        cursor.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_streak_version_{name} AFTER {event} ON habit
+        BEGIN
+            UPDATE streak_version SET version = version + 1;
+        END""")
+
+
+def _latest(first, second):
+    """
+    Builds an SQL expression for the later of two dates that may be NULL
+
+    :param first: SQL expression of the first date
+    :param second: SQL expression of the second date
+    :return: SQL expression
+    """
+    return f"COALESCE(MAX({first}, {second}), {first}, {second})"
+
+
+def _summary_habit_delete_sql(partition, completions, last_activity):
+    """
+    Builds the statements of a trigger that removes a deleted habit from the summary table of a partition
+
+    :param partition: Column the summary table is partitioned by
+    :param completions: SQL expression template of the number of completions of the habit {habit}
+    :param last_activity: SQL expression template of the latest completion date in the partition of the habit {habit}
+    :return: SQL statements
+    """
+    table = f"{partition}_summary"
+    max_longest_streak = f"(SELECT MAX(longest_streak) FROM habit WHERE {partition} = OLD.{partition})"
+    return f"""
+            UPDATE {table} SET habit_count = habit_count - 1,
+            total_completions = total_completions - {completions.format(habit='OLD')},
+            current_streak_sum = current_streak_sum - IFNULL(OLD.current_streak, 0),
+            max_longest_streak = {max_longest_streak},
+            last_activity = {last_activity.format(habit='OLD')}
+            WHERE {partition} = OLD.{partition};
+            DELETE FROM {table} WHERE {partition} = OLD.{partition} AND habit_count = 0;"""
+
+
+def _create_summary_habit_update_trigger(cursor, partition, completions, last_completion, last_activity):
+    """
+    Creates the trigger that updates the summary table of a partition when the streaks or the partition of a habit
+    change. A change of the streaks is handled as removing the old and adding the new values, a change of the
+    partition additionally moves the habit with its completions from the old to the new summary row.
+
+    :param cursor: Cursor of an SQLite3 database connection with an open transaction
+    :param partition: Column the summary table is partitioned by
+    :param completions: SQL expression template of the number of completions of the habit {habit}
+    :param last_completion: SQL expression template of the latest completion date of the habit {habit}
+    :param last_activity: SQL expression template of the latest completion date in the partition of the habit {habit}
+    """
+    table = f"{partition}_summary"
+    max_longest_streak = f"(SELECT MAX(longest_streak) FROM habit WHERE {partition} = {{habit}}.{partition})"
+    moved = f"OLD.{partition} IS NOT NEW.{partition}"
+    cursor.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_{table}_habit_update
+    AFTER UPDATE OF {partition}, current_streak, longest_streak ON habit
+    BEGIN
+        UPDATE {table} SET habit_count = habit_count - ({moved}),
+        total_completions = total_completions - CASE WHEN {moved} THEN {completions.format(habit='OLD')} ELSE 0 END,
+        current_streak_sum = current_streak_sum - IFNULL(OLD.current_streak, 0),
+        max_longest_streak = {max_longest_streak.format(habit='OLD')},
+        last_activity = CASE WHEN {moved} THEN {last_activity.format(habit='OLD')} ELSE last_activity END
+        WHERE {partition} = OLD.{partition};
+        INSERT OR IGNORE INTO {table} SELECT NEW.{partition}, 0, 0, 0, NULL, NULL WHERE NEW.{partition} IS NOT NULL;
+        UPDATE {table} SET habit_count = habit_count + ({moved}),
+        total_completions = total_completions + CASE WHEN {moved} THEN {completions.format(habit='NEW')} ELSE 0 END,
+        current_streak_sum = current_streak_sum + IFNULL(NEW.current_streak, 0),
+        max_longest_streak = {max_longest_streak.format(habit='NEW')},
+        last_activity = CASE WHEN {moved} THEN {_latest('last_activity', last_completion.format(habit='NEW'))}
+        ELSE last_activity END
+        WHERE {partition} = NEW.{partition};
+        DELETE FROM {table} WHERE {partition} = OLD.{partition} AND habit_count = 0;
+    END""")
+
+
+def _migration_5_summaries(cursor):
+    """
+    Adds summary tables per habit group and per periodicity that triggers on the habit and completion dates tables
+    keep up to date, and fills them from the existing habits
+
+    :param cursor: Cursor of an SQLite3 database connection with an open transaction
+    """
+    for partition in SUMMARY_PARTITIONS:
+        table = f"{partition}_summary"
+        completions = "(SELECT COUNT(*) FROM completion_dates WHERE habit_name = {habit}.habit_name)"
+        last_completion = "(SELECT MAX(event_date) FROM completion_dates WHERE habit_name = {habit}.habit_name)"
+        max_longest_streak = f"(SELECT MAX(longest_streak) FROM habit WHERE {partition} = {{habit}}.{partition})"
+        last_activity = (f"(SELECT MAX(c.event_date) FROM habit h JOIN completion_dates c ON c.habit_name = "
+                         f"h.habit_name WHERE h.{partition} = {{habit}}.{partition})")
+
+        cursor.execute(f'''CREATE TABLE IF NOT EXISTS {table} (
+        {partition} VARCHAR(20) PRIMARY KEY,
+        habit_count INT NOT NULL,
+        total_completions INT NOT NULL,
+        current_streak_sum INT NOT NULL,
+        max_longest_streak INT,
+        last_activity DATE
+        )''')
+        cursor.execute(f"""INSERT OR IGNORE INTO {table}
+        SELECT {partition}, COUNT(*), SUM(completions), SUM(IFNULL(current_streak, 0)), MAX(longest_streak),
+        MAX(last_completion) FROM (SELECT {partition}, current_streak, longest_streak,
+        {completions.format(habit='habit')} AS completions, {last_completion.format(habit='habit')} AS last_completion
+        FROM habit WHERE {partition} IS NOT NULL) GROUP BY {partition}""")
+
+        cursor.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_{table}_habit_insert AFTER INSERT ON habit
+        WHEN NEW.{partition} IS NOT NULL
+        BEGIN
+            INSERT OR IGNORE INTO {table} VALUES (NEW.{partition}, 0, 0, 0, NULL, NULL);
+            UPDATE {table} SET habit_count = habit_count + 1,
+            total_completions = total_completions + {completions.format(habit='NEW')},
+            current_streak_sum = current_streak_sum + IFNULL(NEW.current_streak, 0),
+            max_longest_streak = {max_longest_streak.format(habit='NEW')},
+            last_activity = {_latest('last_activity', last_completion.format(habit='NEW'))}
+            WHERE {partition} = NEW.{partition};
+        END""")
+        cursor.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_{table}_habit_delete AFTER DELETE ON habit
+        WHEN OLD.{partition} IS NOT NULL
+        BEGIN{_summary_habit_delete_sql(partition, completions, last_activity)}
+        END""")
+        _create_summary_habit_update_trigger(cursor, partition, completions, last_completion, last_activity)
+
+        # Completions of habits that do not exist are not part of any summary row
+        cursor.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_{table}_completion_insert AFTER INSERT ON completion_dates
+        BEGIN
+            UPDATE {table} SET total_completions = total_completions + 1,
+            last_activity = {_latest('last_activity', 'NEW.event_date')}
+            WHERE {partition} = (SELECT {partition} FROM habit WHERE habit_name = NEW.habit_name);
+        END""")
+        # Only deleting the latest completion of a partition requires to search for the new latest one
+        cursor.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_{table}_completion_delete AFTER DELETE ON completion_dates
+        BEGIN
+            UPDATE {table} SET total_completions = total_completions - 1,
+            last_activity = CASE WHEN OLD.event_date < last_activity THEN last_activity
+            ELSE {last_activity.format(habit=table)} END
+            WHERE {partition} = (SELECT {partition} FROM habit WHERE habit_name = OLD.habit_name);
+        END""")
+
+
+def _create_summary_completion_delete_trigger(cursor, partition, last_activity):
+    """
+    Creates the trigger that updates the summary table of a partition when a completion day is deleted, only deleting
+    the latest completion of a partition requires to search for the new latest one
+
+    :param cursor: Cursor of an SQLite3 database connection with an open transaction
+    :param partition: Column the summary table is partitioned by
+    :param last_activity: SQL expression of the latest completion date in the partition of the summary row
+    """
+    table = f"{partition}_summary"
+    cursor.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_{table}_completion_delete AFTER DELETE ON completion_days
+    BEGIN
+        UPDATE {table} SET total_completions = total_completions - 1,
+        last_activity = CASE WHEN {_DAY_TO_ISO.format('OLD.day')} < last_activity THEN last_activity
+        ELSE {last_activity} END
+        WHERE {partition} = (SELECT {partition} FROM habit WHERE habit_name = OLD.habit_name);
+    END""")
+
+
+def _migration_6_completion_days(cursor):
+    """
+    Moves the completion dates into a table that stores them as integer day numbers since 1970-01-01, which is more
+    compact than ISO date strings and needs no parsing. The completion dates table is replaced by a view with the
+    same columns that converts the day numbers back into ISO date strings and accepts inserts and deletes.
+
+    :param cursor: Cursor of an SQLite3 database connection with an open transaction
+    """
+    cursor.execute("SELECT COUNT(*) FROM completion_dates WHERE julianday(date(event_date)) IS NULL")
+    invalid_dates = cursor.fetchone()[0]
+    if invalid_dates:
+        raise Exception(f"{invalid_dates} completion date(s) are not valid dates and cannot be converted.")
+
+    cursor.execute('''CREATE TABLE IF NOT EXISTS completion_days (
+    habit_name VARCHAR(20),
+    day INTEGER NOT NULL,
+    FOREIGN KEY (habit_name) REFERENCES habit(habit_name)
+    )''')
+    cursor.execute(f"INSERT INTO completion_days SELECT habit_name, {_ISO_TO_DAY.format('event_date')} "
+                   f"FROM completion_dates ORDER BY habit_name, event_date")
+    # Dropping the table also drops its index and the summary triggers on it
+    cursor.execute("DROP TABLE completion_dates")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_completion_days_habit_day ON completion_days (habit_name, day)")
+
+    cursor.execute(f"""CREATE VIEW completion_dates AS
+    SELECT habit_name, {_DAY_TO_ISO.format('day')} AS event_date FROM completion_days""")
+    cursor.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_completion_dates_insert INSTEAD OF INSERT ON completion_dates
+    BEGIN
+        INSERT INTO completion_days VALUES (NEW.habit_name, {_ISO_TO_DAY.format('NEW.event_date')});
+    END""")
+    cursor.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_completion_dates_delete INSTEAD OF DELETE ON completion_dates
+    BEGIN
+        DELETE FROM completion_days WHERE habit_name = OLD.habit_name
+        AND day = {_ISO_TO_DAY.format('OLD.event_date')};
+    END""")
+
+    for partition in SUMMARY_PARTITIONS:
+        table = f"{partition}_summary"
+        last_activity = (f"(SELECT {_DAY_TO_ISO.format('MAX(c.day)')} FROM habit h JOIN completion_days c "
+                         f"ON c.habit_name = h.habit_name WHERE h.{partition} = {table}.{partition})")
+        cursor.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_{table}_completion_insert AFTER INSERT ON completion_days
+        BEGIN
+            UPDATE {table} SET total_completions = total_completions + 1,
+            last_activity = {_latest('last_activity', _DAY_TO_ISO.format('NEW.day'))}
+            WHERE {partition} = (SELECT {partition} FROM habit WHERE habit_name = NEW.habit_name);
+        END""")
+        _create_summary_completion_delete_trigger(cursor, partition, last_activity)
+
+
+def _migration_7_completion_bitmaps(cursor):
+    """
+    Adds the table holding the completion bitmaps of the daily habits that store their history as one bit per day
+
+    :param cursor: Cursor of an SQLite3 database connection with an open transaction
+    """
+    cursor.execute('''CREATE TABLE IF NOT EXISTS habit_bitmap (
+    habit_name VARCHAR(20) PRIMARY KEY,
+    first_day INTEGER NOT NULL,
+    bits BLOB NOT NULL,
+    FOREIGN KEY (habit_name) REFERENCES habit(habit_name)
+    )''')
+
+
+def _migration_8_completion_periods(cursor):
+    """
+    Adds the period number of each completion date for the periodicity of its habit, so that streaks of every
+    periodicity are runs of consecutive integers and calendar months of different lengths are handled correctly.
+    Triggers recalculate the period numbers of a habit when it is added or its periodicity changes. The last
+    completion day kept for the incremental streaks is replaced by the last completed period.
+
+    :param cursor: Cursor of an SQLite3 database connection with an open transaction
+    """
+    periodicity = "(SELECT periodicity FROM habit WHERE habit_name = {})"
+    cursor.execute("ALTER TABLE completion_days ADD COLUMN period INTEGER")
+    cursor.execute(f"UPDATE completion_days SET period = "
+                   f"{_period_sql(periodicity.format('completion_days.habit_name'), 'day')}")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_completion_days_habit_period "
+                   "ON completion_days (habit_name, period)")
+
+    cursor.execute("DROP TRIGGER trg_completion_dates_insert")
+    cursor.execute(f"""CREATE TRIGGER trg_completion_dates_insert INSTEAD OF INSERT ON completion_dates
+    BEGIN
+        INSERT INTO completion_days (habit_name, day, period)
+        SELECT NEW.habit_name, day, {_period_sql(periodicity.format('NEW.habit_name'), 'day')}
+        FROM (SELECT {_ISO_TO_DAY.format('NEW.event_date')} AS day);
+    END""")
+    cursor.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_completion_periods_habit_insert AFTER INSERT ON habit
+    BEGIN
+        UPDATE completion_days SET period = {_period_sql('NEW.periodicity', 'day')} WHERE habit_name = NEW.habit_name;
+    END""")
+    cursor.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_completion_periods_habit_update
+    AFTER UPDATE OF periodicity ON habit WHEN OLD.periodicity IS NOT NEW.periodicity
+    BEGIN
+        UPDATE completion_days SET period = {_period_sql('NEW.periodicity', 'day')} WHERE habit_name = NEW.habit_name;
+        DELETE FROM habit_streak_state WHERE habit_name = NEW.habit_name;
+    END""")
+
+    cursor.execute("DROP TABLE habit_streak_state")
+    cursor.execute('''CREATE TABLE habit_streak_state (
+    habit_name VARCHAR(20) PRIMARY KEY,
+    last_period INTEGER NOT NULL,
+    FOREIGN KEY (habit_name) REFERENCES habit(habit_name)
+    )''')
+
+
+def _migration_9_habit_versions(cursor):
+    """
+    Adds a change counter per habit that triggers increase whenever a completion date of the habit is added or deleted
+    or the habit itself is added, deleted or changes its periodicity, so that cached streaks can be validated cheaply.
+    The counter of a deleted habit is kept, so that a new habit with the same name never reuses a version.
+
+    :param cursor: Cursor of an SQLite3 database connection with an open transaction
+    """
+    cursor.execute('''CREATE TABLE IF NOT EXISTS habit_version (
+    habit_name VARCHAR(20) PRIMARY KEY,
+    version INTEGER NOT NULL
+    )''')
+    for name, event, row in (("completion_insert", "INSERT ON completion_days", "NEW"),
+                             ("completion_delete", "DELETE ON completion_days", "OLD"),
+                             ("habit_insert", "INSERT ON habit", "NEW"),
+                             ("habit_delete", "DELETE ON habit", "OLD"),
+                             ("habit_update", "UPDATE OF periodicity ON habit", "NEW")):
+        cursor.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_habit_version_{name} AFTER {event}
+        BEGIN
+            INSERT INTO habit_version VALUES ({row}.habit_name, 1)
+            ON CONFLICT(habit_name) DO UPDATE SET version = version + 1;
+        END""")
+
+
+def _migration_10_import_progress(cursor):
+    """
+    Adds the table holding the number of records of each imported file that have been stored, so that an interrupted
+    import can be resumed
+
+    :param cursor: Cursor of an SQLite3 database connection with an open transaction
+    """
+    cursor.execute('''CREATE TABLE IF NOT EXISTS import_progress (
+    source TEXT PRIMARY KEY,
+    records INTEGER NOT NULL
+    )''')
+
+
+def _migration_11_completion_archive(cursor):
+    """
+    Adds the tables describing the completion archive, a file holding completion dates that have been moved out of the
+    completion days table, see archive_completions. Archived completions keep counting in the summary tables, so the
+    summary triggers that count the completions of a habit or search the latest completion of a partition are
+    replaced by ones that also read the archived habits. The archived completions of a deleted habit are ignored from
+    then on.
+
+    :param cursor: Cursor of an SQLite3 database connection with an open transaction
+    """
+    cursor.execute('''CREATE TABLE IF NOT EXISTS completion_archive (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    path TEXT NOT NULL,
+    generation INTEGER NOT NULL,
+    cutoff_day INTEGER NOT NULL
+    )''')
+    cursor.execute('''CREATE TABLE IF NOT EXISTS archived_habit (
+    habit_name VARCHAR(20) PRIMARY KEY,
+    completions INTEGER NOT NULL,
+    last_day INTEGER NOT NULL,
+    FOREIGN KEY (habit_name) REFERENCES habit(habit_name)
+    )''')
+    # The summary triggers that count or search the completions of a habit or partition are replaced by ones that
+    # include the archived completions
+    completions = ("((SELECT COUNT(*) FROM completion_days WHERE habit_name = {habit}.habit_name) "
+                   "+ IFNULL((SELECT completions FROM archived_habit WHERE habit_name = {habit}.habit_name), 0))")
+    last_completion = _latest(
+        f"(SELECT {_DAY_TO_ISO.format('MAX(day)')} FROM completion_days WHERE habit_name = {{habit}}.habit_name)",
+        f"(SELECT {_DAY_TO_ISO.format('last_day')} FROM archived_habit WHERE habit_name = {{habit}}.habit_name)")
+    summary_deletes = ""
+    for partition in SUMMARY_PARTITIONS:
+        table = f"{partition}_summary"
+        last_activity = _latest(f"(SELECT {_DAY_TO_ISO.format('MAX(c.day)')} FROM habit h JOIN completion_days c "
+                                f"ON c.habit_name = h.habit_name WHERE h.{partition} = {{habit}}.{partition})",
+                                f"(SELECT {_DAY_TO_ISO.format('MAX(a.last_day)')} FROM habit h JOIN archived_habit a "
+                                f"ON a.habit_name = h.habit_name WHERE h.{partition} = {{habit}}.{partition})")
+        for trigger in ("habit_delete", "habit_update", "completion_delete"):
+            cursor.execute(f"DROP TRIGGER trg_{table}_{trigger}")
+        _create_summary_habit_update_trigger(cursor, partition, completions, last_completion, last_activity)
+        _create_summary_completion_delete_trigger(cursor, partition, last_activity.format(habit=table))
+        summary_deletes += f"""
+        {_summary_habit_delete_sql(partition, completions, last_activity)}"""
+    # A single trigger for all summary tables, so that the archived completions are counted before the row holding
+    # their number is deleted
+    cursor.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_summary_habit_delete AFTER DELETE ON habit
+    BEGIN{summary_deletes}
+        DELETE FROM archived_habit WHERE habit_name = OLD.habit_name;
+    END""")
+
+
+def _migration_12_bulk_maintenance(cursor):
+    """
+    Adds a guard table that suspends the per-row triggers on the completion days table while it holds a row, so that
+    bulk inserts and deletes can maintain the summaries and habit versions with one aggregated update per habit
+    instead, see _bulk_maintenance
+
+    :param cursor: Cursor of an SQLite3 database connection with an open transaction
+    """
+    cursor.execute("CREATE TABLE IF NOT EXISTS bulk_maintenance (id INTEGER PRIMARY KEY CHECK (id = 1))")
+    cursor.execute("SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'completion_days'")
+    for name, sql in cursor.fetchall():
+        cursor.execute(f"DROP TRIGGER {name}")
+        cursor.execute(re.sub(r"\s+BEGIN\b", "\n    WHEN NOT EXISTS (SELECT 1 FROM bulk_maintenance)\n    BEGIN",
+                              sql, count=1))
+
+
+def _migration_13_bitmap_invalidation(cursor):
+    """
+    Lets the triggers that increase the version of a habit also delete its completion bitmap, so that a bitmap never
+    misses changes made without increment_habit, e.g. completion dates deleted through the completion dates view or a
+    changed periodicity. The functions of this module that insert completion dates keep the bitmap up to date instead.
+
+    :param cursor: Cursor of an SQLite3 database connection with an open transaction
+    """
+    cursor.execute("SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'trg_habit_version_%'")
+    for name, sql in cursor.fetchall():
+        row = "OLD" if name.endswith("_delete") else "NEW"
+        bitmap_delete = f"DELETE FROM habit_bitmap WHERE habit_name = {row}.habit_name;"
+        cursor.execute(f"DROP TRIGGER {name}")
+        cursor.execute(re.sub(r";\s*END$", f";\n            {bitmap_delete}\n        END", sql, count=1))
+
+
+def _migration_14_streak_state_invalidation(cursor):
+    """
+    Deletes the last completed period stored for the incremental streaks of a habit whenever one of its completion days
+    is deleted, e.g. through the completion dates view, so that the next incremental update rebuilds the streaks from
+    the history instead of extending them from a period that may no longer be completed
+
+    :param cursor: Cursor of an SQLite3 database connection with an open transaction
+    """
+    cursor.execute("""CREATE TRIGGER IF NOT EXISTS trg_habit_streak_state_completion_delete
+    AFTER DELETE ON completion_days WHEN NOT EXISTS (SELECT 1 FROM bulk_maintenance)
+    BEGIN
+        DELETE FROM habit_streak_state WHERE habit_name = OLD.habit_name;
+    END""")
+
+
+# Ordered list of schema migrations. The schema version stored in PRAGMA user_version is the number of migrations
+# that have been applied, so new migrations must only ever be appended to this list.
+MIGRATIONS = [
+    _migration_1_completion_index,
+    _migration_2_streak_state,
+    _migration_3_habit_sort_indexes,
+    _migration_4_leaderboards,
+    _migration_5_summaries,
+    _migration_6_completion_days,
+    _migration_7_completion_bitmaps,
+    _migration_8_completion_periods,
+    _migration_9_habit_versions,
+    _migration_10_import_progress,
+    _migration_11_completion_archive,
+    _migration_12_bulk_maintenance,
+    _migration_13_bitmap_invalidation,
+    _migration_14_streak_state_invalidation,
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+@profiled
+def get_schema_version(db):
+    """
+    Retrieves the schema version of the database
+
+    :param db: An initialized SQLite3 database connection
+    :return: Number of migrations that have been applied to the database
+    """
+    cur = db.cursor()
+    cur.execute("PRAGMA user_version")
+    return cur.fetchone()[0]
+
+
+@profiled
+def migrate_schema(db):
+    """
+    Upgrades an existing database in place by applying all migrations that have not been applied yet
+
+    :param db: An initialized SQLite3 database connection
+    :return: Schema version of the database after the upgrade
+    """
+    version = get_schema_version(db)
+    if version > SCHEMA_VERSION:
+        raise Exception(f"The database schema version ({version}) is newer than this program supports "
+                        f"({SCHEMA_VERSION}).")
+    if version == SCHEMA_VERSION:
+        return version
+
+    if db.in_transaction:
+        db.commit()
+    cur = db.cursor()
+    for number in range(version + 1, SCHEMA_VERSION + 1):
+        # Each migration runs in its own transaction together with the version bump, so an interrupted upgrade
+        # leaves the database at the last fully applied version
+        cur.execute("BEGIN")
+        try:
+            MIGRATIONS[number - 1](cur)
+            cur.execute(f"PRAGMA user_version = {number}")
+        except Exception:
+            db.rollback()
+            raise
+        db.commit()
+    return SCHEMA_VERSION
+
+
+@profiled
+def add_habit(db, habit_name, description, periodicity, habit_group, creation_date, current_streak, longest_streak):
+    """
+    Adding a new habit with its corresponding attributes defined as in the class to the database
+
+    :param db: An initialized SQLite3 database connection
+    :param habit_name: Name of the habit that should be added to the database
+    :param description: Description of the habit that should be added to the database
+    :param periodicity: Periodicity of the habit that should be added to the database
+    :param habit_group: Group of the habit that should be added to the database
+    :param creation_date: Creation date of the habit that should be added to the database
+    :param longest_streak: Longest streak of the habit that should be added to the database
+    :param current_streak: Current streak of the habit that should be added to the database
+    :return: An entry with the columns displayed above for the new habit is added to the database
+    """
+    cur = db.cursor()
+    cur.execute("SELECT habit_name FROM habit WHERE habit_name=?", (habit_name,))
+    existing_habit = cur.fetchone()
+
+    if existing_habit:
+        raise Exception(f"The habit with the name '{habit_name}' already exists.")
+    else:
+        cur.execute("INSERT INTO habit VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (habit_name, description, periodicity, habit_group, creation_date, current_streak, longest_streak))
+        db.commit()
+
+
+@profiled
+def add_habits_bulk(db, habits):
+    """
+    Adding many new habits to the database within a single transaction
+
+    :param db: An initialized SQLite3 database connection
+    :param habits: Iterable of tuples with the columns of each habit in the order of HABIT_COLUMNS
+    :return: Number of habits that have been added, habits whose name already exists are skipped
+    """
+    cur = db.cursor()
+    try:
+        cur.executemany(f"INSERT OR IGNORE INTO habit ({HABIT_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?)", habits)
+    except Exception:
+        db.rollback()
+        raise
+    db.commit()
+    return cur.rowcount
+
+
+@profiled
+def increment_habit(db, habit_name, event_date=None, incremental=False):
+    """
+    Store the dates on which a habit was executed in the database
+
+    :param db: An initialized SQLite3 database connection
+    :param habit_name: Name of the habit for which an additional completion date should be stored
+    :param event_date: Date the respective habit was executed
+    :param incremental: Whether the current and longest streak of the habit should be updated in the same transaction
+    :return: Table completion dates is appended by respective date
+    """
+    cur = db.cursor()
+    if not event_date:
+        event_date = date.today()
+    day = day_number(event_date)
+    # The insert triggers delete the bitmap, it is stored again with the new day
+    bitmap = get_completion_bitmap(cur, habit_name)
+    cur.execute(_INSERT_COMPLETION, (habit_name, day))
+    _add_to_bitmap(cur, habit_name, [day], bitmap)
+    if incremental:
+        _advance_streaks(cur, habit_name, day)
+    else:
+        # The stored last completion day no longer describes the history of the habit
+        cur.execute("DELETE FROM habit_streak_state WHERE habit_name=?", (habit_name,))
+    db.commit()
+
+
+@profiled
+def increment_habits_bulk(db, completions, chunk_size=10000):
+    """
+    Store many completion dates in the database within a single transaction
+
+    :param db: An initialized SQLite3 database connection
+    :param completions: Iterable of tuples (habit name, completion date), a missing date stands for today
+    :param chunk_size: Number of completion dates that are inserted per batch
+    :return: List with one tuple (number of inserted completion dates, number of skipped completion dates) per batch,
+    completion dates of habits that do not exist are skipped
+    """
+    cur = db.cursor()
+    periodicities, bitmap_habits = _completion_targets(cur)
+    completions = iter(completions)
+    batch_counts = []
+
+    try:
+        while True:
+            batch = list(islice(completions, chunk_size))
+            if not batch:
+                break
+            inserted = _insert_completions(cur, batch, periodicities, bitmap_habits)
+            batch_counts.append((inserted, len(batch) - inserted))
+    except Exception:
+        db.rollback()
+        raise
+    db.commit()
+    return batch_counts
+
+
+def _completion_targets(cur):
+    """
+    Retrieves what _insert_completions needs to know about the existing habits
+
+    :param cur: Cursor of an SQLite3 database connection
+    :return: Tuple of a dictionary mapping each habit name to its periodicity and the set of habits with a completion
+    bitmap
+    """
+    cur.execute("SELECT habit_name, periodicity FROM habit")
+    periodicities = dict(cur.fetchall())
+    cur.execute("SELECT habit_name FROM habit_bitmap")
+    bitmap_habits = {habit_row[0] for habit_row in cur.fetchall()}
+    return periodicities, bitmap_habits
+
+
+@contextmanager
+def _bulk_maintenance(cur):
+    """
+    Suspends the per-row triggers on the completion days table, the caller has to maintain the summaries and habit
+    versions of the rows it inserts or deletes itself, see _migration_12_bulk_maintenance
+
+    :param cur: Cursor of an SQLite3 database connection with an open transaction
+    """
+    cur.execute("INSERT INTO bulk_maintenance VALUES (1)")
+    try:
+        yield
+    finally:
+        cur.execute("DELETE FROM bulk_maintenance")
+
+
+def _insert_completions(cur, batch, periodicities, bitmap_habits):
+    """
+    Inserts a batch of completion dates together with their period numbers and updates the completion bitmaps and the
+    incremental streak state of the completed habits
+
+    :param cur: Cursor of an SQLite3 database connection with an open transaction
+    :param batch: List of tuples (habit name, completion date), a missing date stands for today
+    :param periodicities: Dictionary mapping each existing habit name to its periodicity
+    :param bitmap_habits: Set of the habits with a completion bitmap
+    :return: Number of inserted completion dates, completion dates of habits that do not exist are skipped
+    """
+    today = day_number(date.today())
+    completed_days = {}
+    rows = []
+    for habit_name, event_date in batch:
+        if habit_name in periodicities:
+            day = day_number(event_date) if event_date else today
+            rows.append((habit_name, day, period_number(periodicities[habit_name], day)))
+            completed_days.setdefault(habit_name, []).append(day)
+    # One aggregated update per habit instead of the per-row triggers
+    # Rows in index order touch each index page once
+    rows.sort()
+    with _bulk_maintenance(cur):
+        cur.executemany("INSERT INTO completion_days (habit_name, day, period) VALUES (?, ?, ?)", rows)
+    habit_counts = [(habit_name, len(days), max(days)) for habit_name, days in completed_days.items()]
+    for partition in SUMMARY_PARTITIONS:
+        cur.executemany(f"UPDATE {partition}_summary SET total_completions = total_completions + ?2, "
+                        f"last_activity = {_latest('last_activity', _DAY_TO_ISO.format('?3'))} "
+                        f"WHERE {partition} = (SELECT {partition} FROM habit WHERE habit_name = ?1)", habit_counts)
+    cur.executemany("INSERT INTO habit_version VALUES (?, 1) "
+                    "ON CONFLICT(habit_name) DO UPDATE SET version = version + 1",
+                    [(habit_name,) for habit_name in completed_days])
+    for habit_name in completed_days.keys() & bitmap_habits:
+        _add_to_bitmap(cur, habit_name, completed_days[habit_name])
+    # The stored last completed period no longer describes the history of the habits
+    cur.executemany("DELETE FROM habit_streak_state WHERE habit_name=?",
+                    [(habit_name,) for habit_name in completed_days])
+    return len(rows)
+
+
+@profiled
+def get_import_progress(db, source):
+    """
+    Retrieves the number of records of an import source that have already been stored
+
+    :param db: An initialized SQLite3 database connection
+    :param source: Name identifying the imported file
+    :return: Number of stored records, 0 for a source that has not been imported yet
+    """
+    cur = db.cursor()
+    cur.execute("SELECT records FROM import_progress WHERE source=?", (source,))
+    progress_row = cur.fetchone()
+    return progress_row[0] if progress_row else 0
+
+
+@profiled
+def reset_import_progress(db, source):
+    """
+    Forgets the progress of an import source, so that the next import starts from its first record
+
+    :param db: An initialized SQLite3 database connection
+    :param source: Name identifying the imported file
+    """
+    db.execute("DELETE FROM import_progress WHERE source=?", (source,))
+    db.commit()
+
+
+def _import_chunks(db, records, source, chunk_size, store, progress):
+    """
+    Stores records in chunks of one transaction each, continuing after the records a previous import of the same
+    source has already stored. The progress is saved in the same transaction as each chunk, so an interrupted import
+    neither loses nor duplicates records.
+
+    :param db: An initialized SQLite3 database connection
+    :param records: Iterable of records, read lazily
+    :param source: Name identifying the imported file, None for an import that cannot be resumed
+    :param chunk_size: Number of records per transaction
+    :param store: Function storing a list of records with a cursor that returns the number of stored records
+    :param progress: Function called with the number of records of the source that have been read so far after each
+    chunk, None for no progress reports
+    :return: List with one tuple (number of stored records, number of conflicting records) per chunk
+    """
+    records = iter(records)
+    done = 0
+    if source is not None:
+        done = get_import_progress(db, source)
+        # Skipping the stored records reads them without storing them again
+        for _ in islice(records, done):
+            pass
+    cur = db.cursor()
+    chunk_counts = []
+    while True:
+        chunk = list(islice(records, chunk_size))
+        if not chunk:
+            break
+        try:
+            stored = store(cur, chunk)
+            done += len(chunk)
+            if source is not None:
+                cur.execute("INSERT INTO import_progress VALUES (?, ?) ON CONFLICT(source) DO UPDATE SET "
+                            "records = excluded.records", (source, done))
+        except Exception:
+            db.rollback()
+            raise
+        db.commit()
+        chunk_counts.append((stored, len(chunk) - stored))
+        if progress is not None:
+            progress(done)
+    return chunk_counts
+
+
+@profiled
+def import_habits(db, habits, source=None, chunk_size=10000, conflicts=None, progress=None):
+    """
+    Stores a stream of habits in chunked transactions, habits whose name already exists are not changed
+
+    :param db: An initialized SQLite3 database connection
+    :param habits: Iterable of tuples with the columns of each habit in the order of HABIT_COLUMNS
+    :param source: Name identifying the imported file for resuming an interrupted import, None to always start over
+    :param chunk_size: Number of habits per transaction
+    :param conflicts: List the names of the habits that already exist are appended to, None to not collect them
+    :param progress: Function called with the number of habits read so far after each chunk
+    :return: List with one tuple (number of stored habits, number of conflicting habits) per chunk
+    """
+    def store(cur, chunk):
+        stored = 0
+        for habit in chunk:
+            cur.execute(f"INSERT OR IGNORE INTO habit ({HABIT_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?)", habit)
+            stored += cur.rowcount
+            if cur.rowcount == 0 and conflicts is not None:
+                conflicts.append(habit[0])
+        return stored
+
+    return _import_chunks(db, habits, source, chunk_size, store, progress)
+
+
+@profiled
+def import_completions(db, completions, source=None, chunk_size=10000, conflicts=None, progress=None,
+                       duplicates=None):
+    """
+    Stores a stream of completion dates in chunked transactions, completion dates of habits that do not exist and
+    completion dates that are already stored or archived are skipped
+
+    :param db: An initialized SQLite3 database connection
+    :param completions: Iterable of tuples (habit name, completion date), a missing completion date is an error
+    :param source: Name identifying the imported file for resuming an interrupted import, None to always start over
+    :param chunk_size: Number of completion dates per transaction
+    :param conflicts: Set the names of the habits that do not exist are added to, None to not collect them
+    :param progress: Function called with the number of completion dates read so far after each chunk
+    :param duplicates: Set the names of the habits with completion dates that are already stored are added to, None to
+    not collect them
+    :return: List with one tuple (number of stored completion dates, number of skipped completion dates) per chunk
+    """
+    periodicities, bitmap_habits = _completion_targets(db.cursor())
+
+    def store(cur, chunk):
+        habit_days = {}
+        duplicate_habits = set()
+        for habit_name, event_date in chunk:
+            if habit_name not in periodicities:
+                if conflicts is not None:
+                    conflicts.add(habit_name)
+                continue
+            if not event_date:
+                raise Exception(f"A completion date of the habit '{habit_name}' is missing.")
+            days = habit_days.setdefault(habit_name, {})
+            day = day_number(event_date)
+            if day in days:
+                duplicate_habits.add(habit_name)
+            else:
+                days[day] = event_date
+        new_completions = []
+        for habit_name, days in habit_days.items():
+            first_day, last_day = min(days), max(days)
+            cur.execute("SELECT day FROM completion_days WHERE habit_name=? AND day BETWEEN ? AND ?",
+                        (habit_name, first_day, last_day))
+            stored_days = {day_row[0] for day_row in cur.fetchall()}
+            archived_days = _archived_days(cur, habit_name)
+            if archived_days is not None:
+                stored_days.update(archived_days[archived_days.searchsorted(first_day):
+                                                 archived_days.searchsorted(last_day, "right")].tolist())
+            for day, event_date in days.items():
+                if day in stored_days:
+                    duplicate_habits.add(habit_name)
+                else:
+                    new_completions.append((habit_name, event_date))
+        if duplicates is not None:
+            duplicates.update(duplicate_habits)
+        return _insert_completions(cur, new_completions, periodicities, bitmap_habits)
+
+    return _import_chunks(db, completions, source, chunk_size, store, progress)
+
+
+@lru_cache(maxsize=DATE_CACHE_SIZE)
+def parse_date(text):
+    """
+    Parses an ISO formatted date, a time following the date is ignored. The results of the most recently parsed
+    strings are cached, so that a history that is analyzed repeatedly is only parsed once.
+
+    :param text: Date as an ISO formatted string
+    :return: datetime.date object
+    """
+    return date.fromisoformat(text[:10])
+
+
+def normalize_date(event_date):
+    """
+    Converts a date in any of the accepted forms into a datetime.date object
+
+    :param event_date: Date as an ISO formatted string, datetime.date or datetime.datetime object
+    :return: datetime.date object
+    """
+    if isinstance(event_date, str):
+        return parse_date(event_date)
+    if isinstance(event_date, datetime):
+        return event_date.date()
+    return event_date
+
+
+def day_number(event_date):
+    """
+    Converts a completion date into the number of days since 1970-01-01, the form completion dates are stored in
+
+    :param event_date: Completion date as an ISO formatted string, datetime.date or datetime.datetime object
+    :return: Day number of the completion date
+    """
+    return normalize_date(event_date).toordinal() - EPOCH_ORDINAL
+
+
+# Completion date columns are converted from the ISO strings SQLite returns, which are parsed once thanks to the cache
+sqlite3.register_converter(DATE_CONVERTER, lambda value: parse_date(value.decode()))
+
+
+def period_number(periodicity, day):
+    """
+    Converts a day number into the number of the period it belongs to, completions in consecutive periods have
+    consecutive period numbers
+
+    :param periodicity: Periodicity of the habit, unknown periodicities are handled like Daily
+    :param day: Number of days since 1970-01-01
+    :return: The day number for Daily, the number of the ISO week (weeks start on Monday) for Weekly and the number of
+    the calendar month since year 0 for Monthly
+    """
+    if periodicity == 'Weekly':
+        return (day + EPOCH_ORDINAL - 1) // 7
+    if periodicity == 'Monthly':
+        completion_date = date.fromordinal(day + EPOCH_ORDINAL)
+        return completion_date.year * 12 + completion_date.month - 1
+    return day
+
+
+def _advance_streaks(cur, habit_name, day):
+    """
+    Updates the stored streaks of a habit after a completion date has been inserted
+
+    Completions in a period after the stored last completed period only need to be compared with that period. Only
+    the first incremental completion of a habit and completions in an earlier period fall back to rebuilding the
+    streaks from the full history.
+
+    :param cur: Cursor of an SQLite3 database connection with an open transaction
+    :param habit_name: Name of the habit that has been completed
+    :param day: Day number of the date the habit has been completed
+    """
+    cur.execute('''SELECT h.periodicity, h.current_streak, h.longest_streak, s.last_period FROM habit h
+    LEFT JOIN habit_streak_state s ON s.habit_name = h.habit_name WHERE h.habit_name=?''', (habit_name,))
+    habit_row = cur.fetchone()
+    if not habit_row:
+        return
+    periodicity, current_streak, longest_streak, last_period = habit_row
+    period = period_number(periodicity, day)
+    # Habits with an unknown periodicity never continue a streak
+    step = 1 if periodicity in PERIOD_LENGTHS else None
+
+    if last_period is None or period < last_period:
+        periods = get_periods_for_habit(cur, habit_name)
+        current_streak = longest_streak = 0
+        for previous_period, next_period in zip(periods, periods[1:]):
+            if next_period - previous_period == step:
+                current_streak += 1
+                longest_streak = max(longest_streak, current_streak)
+            else:
+                current_streak = 0
+        last_period = periods[-1]
+    elif period > last_period:
+        if period - last_period == step:
+            current_streak = (current_streak or 0) + 1
+            longest_streak = max(longest_streak or 0, current_streak)
+        else:
+            current_streak = 0
+        last_period = period
+    # A further completion within the last completed period leaves the streaks unchanged
+
+    cur.execute("UPDATE habit SET current_streak = ?, longest_streak = ? WHERE habit_name = ?",
+                (current_streak, longest_streak, habit_name))
+    cur.execute("INSERT INTO habit_streak_state VALUES (?, ?) ON CONFLICT(habit_name) DO UPDATE SET last_period = "
+                "excluded.last_period", (habit_name, last_period))
+
+
+class CompletionBitmap:
+    """
+    Completion history of a daily habit as one bit per day, bit i is set if the habit was completed on day first_day + i
+
+    The bits are held in a Python integer, so that lookups, counts and streaks are answered with bit operations
+    instead of scanning the completion dates. Several completions on the same day set the same bit.
+    """
+
+    def __init__(self, first_day, bits=0):
+        """
+        :param first_day: Day number since 1970-01-01 of the first bit
+        :param bits: Integer whose set bits are the completed days
+        """
+        self.first_day = first_day
+        self.bits = bits
+
+    @classmethod
+    def from_blob(cls, first_day, blob):
+        return cls(first_day, int.from_bytes(blob, 'little'))
+
+    def to_blob(self):
+        return self.bits.to_bytes((self.bits.bit_length() + 7) // 8, 'little')
+
+    def add(self, day):
+        """
+        Sets the bit of a completed day, days before the first bit move the start of the bitmap
+
+        :param day: Day number of the completion
+        """
+        if day < self.first_day:
+            self.bits <<= self.first_day - day
+            self.first_day = day
+        self.bits |= 1 << (day - self.first_day)
+
+    def is_completed(self, day):
+        """
+        :param day: Day number
+        :return: Whether the habit was completed on the day
+        """
+        return day >= self.first_day and bool(self.bits >> (day - self.first_day) & 1)
+
+    def count(self, start_day=None, end_day=None):
+        """
+        :param start_day: Day number of the first day of the window, None for no lower bound
+        :param end_day: Day number of the last day of the window, None for no upper bound
+        :return: Number of days within the window on which the habit was completed
+        """
+        bits = self.bits
+        if end_day is not None:
+            if end_day < self.first_day:
+                return 0
+            bits &= (1 << (end_day - self.first_day + 1)) - 1
+        if start_day is not None and start_day > self.first_day:
+            bits >>= start_day - self.first_day
+        return bits.bit_count()
+
+    def current_streak(self):
+        """
+        :return: Number of consecutive days before the last completed day on which the habit was completed as well
+        """
+        last = self.bits.bit_length()
+        # The highest unset bit below the last completed day ends the run of completed days
+        gaps = ~self.bits & ((1 << last) - 1)
+        return max(last - gaps.bit_length() - 1, 0)
+
+    def longest_streak(self):
+        """
+        :return: Length of the longest run of consecutive completed days minus its first day
+        """
+        # Each step shortens every run of set bits by one, so the number of steps is the length of the longest run
+        bits = self.bits
+        longest_run = 0
+        while bits:
+            bits &= bits >> 1
+            longest_run += 1
+        return max(longest_run - 1, 0)
+
+
+@profiled
+def enable_completion_bitmap(db, habit_name):
+    """
+    Stores the completion history of a daily habit as a bitmap, which increment_habit keeps up to date from now on.
+    Other changes of the completion dates or the periodicity of the habit delete the bitmap.
+
+    :param db: An initialized SQLite3 database connection
+    :param habit_name: Name of the daily habit
+    :return: The bitmap built from the stored completion dates
+    """
+    cur = db.cursor()
+    cur.execute("SELECT periodicity, creation_date FROM habit WHERE habit_name=?", (habit_name,))
+    habit_row = cur.fetchone()
+    if not habit_row:
+        raise Exception(f"This habit ({habit_name}) does not exist.")
+    if habit_row[0] != 'Daily':
+        raise Exception("Completion bitmaps are only available for daily habits.")
+    bitmap = CompletionBitmap(day_number(habit_row[1]))
+    for day in get_days_for_habit(cur, habit_name):
+        bitmap.add(day)
+    try:
+        _store_bitmap(cur, habit_name, bitmap)
+    except Exception:
+        db.rollback()
+        raise
+    db.commit()
+    return bitmap
+
+
+@profiled
+def disable_completion_bitmap(db, habit_name):
+    """
+    Deletes the completion bitmap of a habit, the completion dates themselves are kept
+
+    :param db: An initialized SQLite3 database connection
+    :param habit_name: Name of the habit
+    """
+    db.execute("DELETE FROM habit_bitmap WHERE habit_name=?", (habit_name,))
+    db.commit()
+
+
+@profiled
+def get_completion_bitmap(db, habit_name):
+    """
+    Retrieves the completion bitmap of a habit
+
+    :param db: An initialized SQLite3 database connection or cursor
+    :param habit_name: Name of the habit
+    :return: CompletionBitmap or None in the case the habit has no completion bitmap
+    """
+    bitmap_row = db.execute("SELECT first_day, bits FROM habit_bitmap WHERE habit_name=?", (habit_name,)).fetchone()
+    if bitmap_row:
+        return CompletionBitmap.from_blob(*bitmap_row)
+    else:
+        return None
+
+
+def _store_bitmap(cur, habit_name, bitmap):
+    cur.execute("INSERT INTO habit_bitmap VALUES (?, ?, ?) ON CONFLICT(habit_name) DO UPDATE SET "
+                "first_day = excluded.first_day, bits = excluded.bits",
+                (habit_name, bitmap.first_day, bitmap.to_blob()))
+
+
+def _add_to_bitmap(cur, habit_name, days, bitmap=None):
     """
-    Initializes SQlite3 database connection
+    Sets the bits of new completion days in the completion bitmap of a habit, if the habit has one
 
-    :param name: Name of the SQlite3 database
-    :return: Allows access to database
+    :param cur: Cursor of an SQLite3 database connection with an open transaction
+    :param habit_name: Name of the habit that has been completed
+    :param days: Day numbers of the new completions
+    :param bitmap: Completion bitmap of the habit read before the completions were inserted, None reads the stored one
     """
-    db = sqlite3.connect(name)
-    create_tables(db)
-    return db
+    if bitmap is None:
+        bitmap = get_completion_bitmap(cur, habit_name)
+    if bitmap is None:
+        return
+    for day in days:
+        bitmap.add(day)
+    _store_bitmap(cur, habit_name, bitmap)
 
 
-def create_tables(db):
+@profiled
+def get_completion_archive(db):
     """
-    Creates tables for habits and completion dates
+    Retrieves the description of the completion archive of the database
 
-    :param db: An initialized SQLite3 database connection
-    :return: The tables habit and completion dates are created in the database
+    :param db: An initialized SQLite3 database connection or cursor
+    :return: Tuple of the path of the current archive file and the day number before which completion dates have been
+    archived, None in the case no completion dates have been archived
     """
-    cursor = db.cursor()
+    archive_row = db.execute("SELECT path, generation, cutoff_day FROM completion_archive").fetchone()
+    if archive_row:
+        return _archive_file(archive_row[0], archive_row[1]), archive_row[2]
+    else:
+        return None
 
-    cursor.execute('''CREATE TABLE IF NOT EXISTS habit (
-    habit_name VARCHAR(20) PRIMARY KEY,
-    description TEXT NOT NULL, 
-    periodicity VARCHAR(20) NOT NULL,
-    habit_group VARCHAR(20), 
-    creation_date DATE NOT NULL,
-    current_streak INT,
-    longest_streak INT
-    )''')
 
-    cursor.execute('''CREATE TABLE IF NOT EXISTS completion_dates (
-    habit_name VARCHAR(20),
-    event_date DATETIME,
-    FOREIGN KEY (habit_name) REFERENCES habit(habit_name)
-    )''')
+def _archive_file(path, generation):
+    """
+    :return: Path of the archive file of a generation, every archiving writes a file of the next generation
+    """
+    return f"{path}.{generation}"
 
-    db.commit()
 
+@profiled
+def open_completion_archive(db):
+    """
+    Opens the completion archive of the database for reading its columns as NumPy arrays
 
-def add_habit(db, habit_name, description, periodicity, habit_group, creation_date, current_streak, longest_streak):
+    :param db: An initialized SQLite3 database connection or cursor
+    :return: archive.CompletionArchive or None in the case no completion dates have been archived
     """
-    Adding a new habit with its corresponding attributes defined as in the class to the database
+    completion_archive = get_completion_archive(db)
+    if completion_archive is None:
+        return None
+    from archive import open_archive
 
-    :param db: An initialized SQLite3 database connection
-    :param habit_name: Name of the habit that should be added to the database
-    :param description: Description of the habit that should be added to the database
-    :param periodicity: Periodicity of the habit that should be added to the database
-    :param habit_group: Group of the habit that should be added to the database
-    :param creation_date: Creation date of the habit that should be added to the database
-    :param longest_streak: Longest streak of the habit that should be added to the database
-    :param current_streak: Current streak of the habit that should be added to the database
-    :return: An entry with the columns displayed above for the new habit is added to the database
+    return open_archive(completion_archive[0])
+
+
+@profiled
+def get_archived_habits(db, habit_range=None):
     """
-    cur = db.cursor()
-    cur.execute("SELECT habit_name FROM habit WHERE habit_name=?", (habit_name,))
-    existing_habit = cur.fetchone()
+    Retrieves the names of the habits with archived completion dates
 
-    if existing_habit:
-        raise Exception(f"The habit with the name '{habit_name}' already exists.")
-    else:
-        cur.execute("INSERT INTO habit VALUES (?, ?, ?, ?, ?, ?, ?)",
-                    (habit_name, description, periodicity, habit_group, creation_date, current_streak, longest_streak))
-        db.commit()
+    :param db: An initialized SQLite3 database connection or cursor
+    :param habit_range: Tuple (first habit name, last habit name) restricting the habits to an inclusive range of
+    names, None for all habits
+    :return: List of the habit names in ascending order
+    """
+    condition, parameters = _habit_range_condition(habit_range)
+    rows = db.execute(f"SELECT habit_name FROM archived_habit{condition} ORDER BY habit_name", parameters).fetchall()
+    return [habit_row[0] for habit_row in rows]
 
 
-def increment_habit(db, habit_name, event_date=None):
+def _archived_days(db, habit_name):
     """
-    Store the dates on which a habit was executed in the database
+    Looks up the archived completion days of a habit
+
+    :param db: An initialized SQLite3 database connection or cursor
+    :param habit_name: Name of the habit
+    :return: Array of the archived completion days in ascending order, a view of the memory-mapped archive file, None
+    for a habit without archived completion dates
+    """
+    archive_row = db.execute("SELECT a.path, a.generation FROM completion_archive a JOIN archived_habit h "
+                             "ON h.habit_name = ?", (habit_name,)).fetchone()
+    if not archive_row:
+        return None
+    from archive import open_archive
+
+    return open_archive(_archive_file(*archive_row)).habit_days(habit_name)
+
+
+def _iter_days(db, habit_name, archived_days, first_day=None, last_day=None, limit=None, batch_size=500):
+    """
+    Iterates over the completion days of a habit in both tiers, merging the archived days with the rows of the
+    completion days table as they are read, so that neither is loaded into memory as a whole
+
+    :param db: An initialized SQLite3 database connection or cursor
+    :param habit_name: Name of the habit
+    :param archived_days: Array of the archived completion days of the habit, see _archived_days
+    :param first_day: Earliest day number that should be retrieved, None for no lower bound
+    :param last_day: Latest day number that should be retrieved, None for no upper bound
+    :param limit: Maximum number of days that should be retrieved, None for no limit
+    :param batch_size: Number of days that are read from either tier at once
+    :return: Generator of the day numbers in ascending order
+    """
+    # The bounds are found by binary search, a range after the archived days reads only the completion days table
+    start = 0 if first_day is None else int(archived_days.searchsorted(first_day))
+    end = len(archived_days) if last_day is None else int(archived_days.searchsorted(last_day, side="right"))
+    archived = (day for batch_start in range(start, end, batch_size)
+                for day in archived_days[batch_start:min(batch_start + batch_size, end)].tolist())
+
+    query = "SELECT day FROM completion_days WHERE habit_name=?"
+    parameters = [habit_name]
+    if first_day is not None:
+        query += " AND day >= ?"
+        parameters.append(first_day)
+    if last_day is not None:
+        query += " AND day <= ?"
+        parameters.append(last_day)
+    query += " ORDER BY day LIMIT ?"
+    parameters.append(-1 if limit is None else limit)
+    live = (day_row[0] for day_row in _iter_rows(db, query, parameters, batch_size))
+    return islice(heapq.merge(archived, live), limit)
+
+
+def _dates_of_days(db, days):
+    """
+    Converts day numbers into completion dates of the type the connection returns for completion date columns
+
+    :param db: An initialized SQLite3 database connection or cursor
+    :param days: Sequence or array of day numbers
+    :return: List of ISO strings or of datetime.date objects on connections opened with date_objects=True
+    """
+    import numpy as np
+
+    if not len(days):
+        return []
+    dates = np.datetime_as_string(np.asarray(days, dtype=np.int64).astype("datetime64[D]")).tolist()
+    probe = db.execute(f"SELECT '1970-01-01' AS \"event_date [{DATE_CONVERTER}]\"").fetchone()[0]
+    if isinstance(probe, date):
+        return [parse_date(text) for text in dates]
+    return dates
+
+
+def _completion_dates(db, habit_name, archived_days):
+    """
+    Reads the completion dates of a habit from both tiers
+
+    :param db: An initialized SQLite3 database connection or cursor
+    :param habit_name: Name of the habit
+    :param archived_days: Array of the archived completion days of the habit, see _archived_days
+    :return: List of the completion dates sorted by date, see _dates_of_days
+    """
+    live = db.execute(f"SELECT day, {_DAY_TO_ISO.format('day')} AS \"event_date [{DATE_CONVERTER}]\" "
+                      f"FROM completion_days WHERE habit_name=? ORDER BY day", (habit_name,)).fetchall()
+    archived = _dates_of_days(db, archived_days)
+    if live and archived and live[0][0] < archived_days[-1]:
+        # Completion dates before the cutoff that have been added after archiving interleave with the archived ones
+        return [completion_date for day, completion_date in heapq.merge(zip(archived_days.tolist(), archived), live)]
+    return archived + [completion_row[1] for completion_row in live]
+
+
+@profiled
+def archive_completions(db, cutoff_date, path=None):
+    """
+    Moves the completion dates before a cutoff date out of the completion days table into the completion archive, a
+    compact columnar file that is memory-mapped by the functions reading completion dates
+
+    Every call writes an archive file of the next generation holding the previously archived together with the moved
+    completion dates. The new file replaces the previous one in the same transaction that deletes the moved rows, so
+    an interruption neither loses nor duplicates completion dates. Completion dates of habits that do not exist are
+    not archived.
 
     :param db: An initialized SQLite3 database connection
-    :param habit_name: Name of the habit for which an additional completion date should be stored
-    :param event_date: Date the respective habit was executed
-    :return: Table completion dates is appended by respective date
+    :param cutoff_date: Completion dates before this date are archived, as ISO formatted string, datetime.date or
+    datetime.datetime object
+    :param path: Path of the archive, the files get the generation as suffix, None keeps the path of the current
+    archive
+    :return: Number of archived completion dates
     """
+    from archive import open_archive, close_archive, write_archive, merge_archive
+    import numpy as np
+
+    cutoff_day = day_number(cutoff_date)
+    cold = "FROM completion_days c JOIN habit h ON h.habit_name = c.habit_name WHERE c.day < ?"
     cur = db.cursor()
-    if not event_date:
-        event_date = str(date.today())
-    cur.execute("INSERT INTO completion_dates VALUES (?,?)", (habit_name, event_date))
+    if not db.in_transaction:
+        cur.execute("BEGIN IMMEDIATE")
+    new_file = None
+    try:
+        cur.execute("SELECT path, generation, cutoff_day FROM completion_archive")
+        archive_row = cur.fetchone()
+        if path is None and archive_row is None:
+            raise Exception("The path of the completion archive is required for the first archiving.")
+        cur.execute(f"SELECT c.habit_name, COUNT(*), MAX(c.day) {cold} GROUP BY c.habit_name ORDER BY c.habit_name",
+                    (cutoff_day,))
+        moved_habits = cur.fetchall()
+        if not moved_habits:
+            db.rollback()
+            return 0
+        cur.execute(f"SELECT c.day {cold} ORDER BY c.habit_name, c.day", (cutoff_day,))
+        moved_days = np.array([day_row[0] for day_row in cur.fetchall()], dtype=np.int64)
+
+        previous_file = None if archive_row is None else _archive_file(archive_row[0], archive_row[1])
+        path = os.path.abspath(path) if path is not None else archive_row[0]
+        generation = 1 if archive_row is None else archive_row[1] + 1
+        new_file = _archive_file(path, generation)
+        write_archive(new_file, *merge_archive(None if previous_file is None else open_archive(previous_file),
+                                               get_archived_habits(cur), [habit_row[:2] for habit_row in moved_habits],
+                                               moved_days))
+
+        # Archived completions keep counting in the summaries and the completion dates of the habits do not change,
+        # so the moved rows are deleted without the per-row triggers
+        cur.executemany("INSERT INTO archived_habit VALUES (?, ?, ?) ON CONFLICT(habit_name) DO UPDATE SET "
+                        "completions = completions + excluded.completions, "
+                        "last_day = MAX(last_day, excluded.last_day)", moved_habits)
+        with _bulk_maintenance(cur):
+            cur.execute("DELETE FROM completion_days WHERE day < ? AND habit_name IN (SELECT habit_name FROM habit)",
+                        (cutoff_day,))
+        cur.execute("INSERT INTO completion_archive VALUES (1, ?, ?, ?) ON CONFLICT(id) DO UPDATE SET "
+                    "path = excluded.path, generation = excluded.generation, "
+                    "cutoff_day = MAX(cutoff_day, excluded.cutoff_day)", (path, generation, cutoff_day))
+    except Exception:
+        db.rollback()
+        if new_file is not None and os.path.exists(new_file):
+            os.remove(new_file)
+        raise
     db.commit()
+    if previous_file is not None:
+        close_archive(previous_file)
+        try:
+            os.remove(previous_file)
+        except OSError:
+            # The database no longer refers to the file, a file that cannot be removed yet is only left behind
+            pass
+    return len(moved_days)
 
 
+@profiled
 def get_date_for_habit(db, habit_name):
     """
     Retrieves completion dates from the database based on the habit's name
 
     :param db: An initialized SQLite3 database connection
     :param habit_name: Name of the habit for which date should be retrieved from the database
-    :return: Retrieves all the rows returned by the SQL query and returns them as a list of tuples
+    :return: Retrieves all the rows returned by the SQL query and returns them as a list sorted by date, as ISO strings
+    or as datetime.date objects on connections opened with date_objects=True
     """
+    archived_days = _archived_days(db, habit_name)
+    if archived_days is not None:
+        return _completion_dates(db, habit_name, archived_days)
     cur = db.cursor()
-    cur.execute("SELECT event_date FROM completion_dates WHERE habit_name=?", (habit_name,))
+    cur.execute(f"SELECT {_DAY_TO_ISO.format('day')} AS \"event_date [{DATE_CONVERTER}]\" FROM completion_days "
+                f"WHERE habit_name=? ORDER BY day", (habit_name,))
     completion_dates = [date[0] for date in cur.fetchall()]
     return completion_dates
 
 
+@profiled
+def get_days_for_habit(db, habit_name):
+    """
+    Retrieves the completion dates of a habit as day numbers, which can be compared without parsing them
+
+    :param db: An initialized SQLite3 database connection or cursor
+    :param habit_name: Name of the habit for which the completion days should be retrieved
+    :return: List of the completion dates as days since 1970-01-01 in ascending order
+    """
+    archived_days = _archived_days(db, habit_name)
+    if archived_days is not None:
+        return list(_iter_days(db, habit_name, archived_days))
+    rows = db.execute("SELECT day FROM completion_days WHERE habit_name=? ORDER BY day", (habit_name,)).fetchall()
+    return [day[0] for day in rows]
+
+
+@profiled
+def get_periods_for_habit(db, habit_name):
+    """
+    Retrieves the distinct period numbers of the completion dates of a habit, see period_number
+
+    :param db: An initialized SQLite3 database connection or cursor
+    :param habit_name: Name of the habit for which the completed periods should be retrieved
+    :return: List of the period numbers in ascending order, a period with several completions is listed once
+    """
+    rows = db.execute("SELECT DISTINCT period FROM completion_days WHERE habit_name=? ORDER BY period",
+                      (habit_name,)).fetchall()
+    periods = [period[0] for period in rows]
+    archived_days = _archived_days(db, habit_name)
+    if archived_days is not None:
+        import numpy as np
+        from archive import period_numbers
+
+        periodicity = db.execute("SELECT periodicity FROM habit WHERE habit_name=?", (habit_name,)).fetchone()[0]
+        periods = np.union1d(period_numbers(periodicity, archived_days), periods).tolist()
+    return periods
+
+
+@profiled
 def get_all_dates_for_habit(db, habit_name):
     """
     Retrieves the entire completion dates table from the database based on the habit's name
@@ -106,12 +1591,176 @@ def get_all_dates_for_habit(db, habit_name):
     :param habit_name: Name of the habit for which completion date table should be retrieved
     :return: Retrieves entire completion dates table by the SQL query and returns it as a list of tuples
     """
+    archived_days = _archived_days(db, habit_name)
+    if archived_days is not None:
+        return [(habit_name, completion_date) for completion_date in _completion_dates(db, habit_name, archived_days)]
     cur = db.cursor()
-    cur.execute("SELECT * FROM completion_dates WHERE habit_name=?", (habit_name,))
+    cur.execute(f"SELECT habit_name, {_DAY_TO_ISO.format('day')} AS \"event_date [{DATE_CONVERTER}]\" "
+                f"FROM completion_days WHERE habit_name=? ORDER BY day", (habit_name,))
     completion_dates = cur.fetchall()
     return completion_dates
 
 
+def iter_completion_dates(db, habit_name, start_date=None, end_date=None, limit=None, batch_size=500):
+    """
+    Iterates over the completion dates of a habit without loading all of them into memory
+
+    :param db: An initialized SQLite3 database connection
+    :param habit_name: Name of the habit for which completion dates should be retrieved
+    :param start_date: Earliest completion date that should be retrieved, None for no lower bound
+    :param end_date: Latest completion date that should be retrieved, None for no upper bound
+    :param limit: Maximum number of completion dates that should be retrieved, None for no limit
+    :param batch_size: Number of rows that are fetched from the cursor at once
+    :return: Generator of tuples (habit name, completion date) sorted by date
+    """
+    archived_days = _archived_days(db, habit_name)
+    if archived_days is not None:
+        days = _iter_days(db, habit_name, archived_days, None if start_date is None else day_number(start_date),
+                          None if end_date is None else day_number(end_date), limit, batch_size)
+        while True:
+            batch = list(islice(days, batch_size))
+            if not batch:
+                break
+            yield from ((habit_name, completion_date) for completion_date in _dates_of_days(db, batch))
+        return
+    query = (f"SELECT habit_name, {_DAY_TO_ISO.format('day')} AS \"event_date [{DATE_CONVERTER}]\" "
+             f"FROM completion_days WHERE habit_name=?")
+    parameters = [habit_name]
+    if start_date is not None:
+        query += " AND day >= ?"
+        parameters.append(day_number(start_date))
+    if end_date is not None:
+        query += " AND day <= ?"
+        parameters.append(day_number(end_date))
+    query += " ORDER BY day LIMIT ?"
+    parameters.append(-1 if limit is None else limit)
+
+    yield from _iter_rows(db, query, parameters, batch_size)
+
+
+def _iter_rows(db, query, parameters, batch_size):
+    """
+    Iterates over the rows of a query, fetching them from the cursor in batches
+
+    :param db: An initialized SQLite3 database connection or cursor, a cursor must not run other queries until the
+    rows have been read
+    :param query: SQL query
+    :param parameters: Parameters of the query
+    :param batch_size: Number of rows that are fetched from the cursor at once
+    :return: Generator of the rows
+    """
+    cur = db.execute(query, parameters)
+    while True:
+        rows = cur.fetchmany(batch_size)
+        if not rows:
+            break
+        yield from rows
+
+
+def iter_habits(db, batch_size=500):
+    """
+    Iterates over all habits without loading all of them into memory
+
+    :param db: An initialized SQLite3 database connection
+    :param batch_size: Number of rows that are fetched from the cursor at once
+    :return: Generator of tuples with the columns of each habit in the order of HABIT_COLUMNS sorted by name
+    """
+    return _iter_rows(db, f"SELECT {HABIT_COLUMNS} FROM habit ORDER BY habit_name", [], batch_size)
+
+
+def iter_all_completion_dates(db, batch_size=500):
+    """
+    Iterates over the completion dates of all habits without loading all of them into memory
+
+    :param db: An initialized SQLite3 database connection
+    :param batch_size: Number of rows that are fetched from the cursor at once
+    :return: Generator of tuples (habit name, completion date) sorted by habit name and date
+    """
+    query = (f"SELECT habit_name, {_DAY_TO_ISO.format('day')} AS \"event_date [{DATE_CONVERTER}]\" "
+             f"FROM completion_days ORDER BY habit_name, day")
+    if get_completion_archive(db) is None:
+        yield from _iter_rows(db, query, [], batch_size)
+        return
+    # With an archive the completion dates are read habit by habit, each from both tiers
+    for habit_row in _iter_rows(db, "SELECT habit_name FROM completion_days UNION SELECT habit_name "
+                                    "FROM archived_habit ORDER BY habit_name", [], batch_size):
+        yield from iter_completion_dates(db, habit_row[0], batch_size=batch_size)
+
+
+def _habit_range_condition(habit_range):
+    """
+    Builds the SQL condition restricting a query to a range of habit names
+
+    :param habit_range: Tuple (first habit name, last habit name) of an inclusive range, None for all habits
+    :return: Tuple of the SQL condition including WHERE, empty for all habits, and its parameters
+    """
+    if habit_range is None:
+        return "", []
+    return " WHERE habit_name BETWEEN ? AND ?", list(habit_range)
+
+
+@profiled
+def get_all_completion_periods(db, habit_range=None):
+    """
+    Retrieves the distinct period numbers of the completion dates of all habits from the database, grouped by habit
+
+    :param db: An initialized SQLite3 database connection
+    :param habit_range: Tuple (first habit name, last habit name) restricting the habits to an inclusive range of
+    names, None for all habits
+    :return: Tuple of a list of (habit name, number of completed periods) sorted by habit name and a flat list of all
+    completed periods in the same habit order, sorted within each habit. Only the completion days table is read, the
+    archived completion dates are read from open_completion_archive.
+    """
+    condition, parameters = _habit_range_condition(habit_range)
+    cur = db.cursor()
+    # Both queries have to see the same snapshot of the table, so they run inside one read transaction
+    own_transaction = not db.in_transaction
+    if own_transaction:
+        cur.execute("BEGIN")
+    try:
+        cur.execute(f"SELECT habit_name, COUNT(DISTINCT period) FROM completion_days{condition} GROUP BY habit_name "
+                    f"ORDER BY habit_name", parameters)
+        habit_counts = cur.fetchall()
+        cur.execute(f"SELECT DISTINCT habit_name, period FROM completion_days{condition} ORDER BY habit_name, period",
+                    parameters)
+        completion_periods = [row[1] for row in cur.fetchall()]
+    finally:
+        if own_transaction:
+            db.commit()
+    return habit_counts, completion_periods
+
+
+@profiled
+def get_all_periodicities(db, habit_range=None):
+    """
+    Retrieves the periodicity of all habits from the habit table in the database
+
+    :param db: An initialized SQLite3 database connection
+    :param habit_range: Tuple (first habit name, last habit name) restricting the habits to an inclusive range of
+    names, None for all habits
+    :return: Dictionary mapping each habit name to its periodicity
+    """
+    condition, parameters = _habit_range_condition(habit_range)
+    cur = db.cursor()
+    cur.execute(f"SELECT habit_name, periodicity FROM habit{condition}", parameters)
+    periodicities = dict(cur.fetchall())
+    return periodicities
+
+
+@profiled
+def get_habit_names(db):
+    """
+    Retrieves the names of all habits from the habit table in the database
+
+    :param db: An initialized SQLite3 database connection
+    :return: List of the habit names in ascending order
+    """
+    cur = db.cursor()
+    cur.execute("SELECT habit_name FROM habit ORDER BY habit_name")
+    return [habit_row[0] for habit_row in cur.fetchall()]
+
+
+@profiled
 def get_habit_data(db, habit_name):
     """
     Retrieves entire habit table from the database based on the habit's name
@@ -127,6 +1776,51 @@ def get_habit_data(db, habit_name):
     return habit_data
 
 
+# Columns of the habit table in the order of the arguments of the Habit class
+HABIT_COLUMNS = "habit_name, description, periodicity, habit_group, creation_date, current_streak, longest_streak"
+
+# Display names of the habit columns, in the same order as HABIT_COLUMNS
+HABIT_HEADERS = ["habit name", "habit description", "periodicity", "habit group", "creation date", "current streak",
+                 "longest streak"]
+
+
+@profiled
+def get_habit_record(db, habit_name):
+    """
+    Retrieves all columns of a certain habit from the habit table in the database with a single query
+
+    :param db: An initialized SQLite3 database connection
+    :param habit_name: Name of the habit that should be retrieved
+    :return: Tuple with the columns of the habit in the order of HABIT_COLUMNS or None in the case the habit does not
+    exist
+    """
+    cur = db.cursor()
+    cur.execute(f"SELECT {HABIT_COLUMNS} FROM habit WHERE habit_name=?", (habit_name,))
+    return cur.fetchone()
+
+
+@profiled
+def get_habit_records(db, habit_names, chunk_size=500):
+    """
+    Retrieves all columns of several habits from the habit table in the database
+
+    :param db: An initialized SQLite3 database connection
+    :param habit_names: Names of the habits that should be retrieved
+    :param chunk_size: Maximum number of habit names per query, to stay below SQLite's limit of query parameters
+    :return: List of tuples with the columns of each existing habit in the order of HABIT_COLUMNS
+    """
+    habit_names = list(dict.fromkeys(habit_names))
+    cur = db.cursor()
+    habit_records = []
+    for start in range(0, len(habit_names), chunk_size):
+        chunk = habit_names[start:start + chunk_size]
+        placeholders = ", ".join("?" * len(chunk))
+        cur.execute(f"SELECT {HABIT_COLUMNS} FROM habit WHERE habit_name IN ({placeholders})", chunk)
+        habit_records.extend(cur.fetchall())
+    return habit_records
+
+
+@profiled
 def get_periodicity(db, habit_name):
     """
     Retrieves the periodicity column of a certain habit from the habit table in the database
@@ -146,6 +1840,7 @@ def get_periodicity(db, habit_name):
         return None
 
 
+@profiled
 def get_description(db, habit_name):
     """
     Retrieves the description column of a certain habit from the habit table in the database
@@ -165,6 +1860,7 @@ def get_description(db, habit_name):
         return None
 
 
+@profiled
 def get_habit_group(db, habit_name):
     """
     Retrieves the habit group column of a certain habit from the habit table in the database
@@ -184,6 +1880,7 @@ def get_habit_group(db, habit_name):
         return None
 
 
+@profiled
 def get_creation_date(db, habit_name):
     """
     Retrieves the creation date column of a certain habit from the habit table in the database
@@ -203,6 +1900,7 @@ def get_creation_date(db, habit_name):
         return None
 
 
+@profiled
 def get_current_streak(db, habit_name):
     """
     Retrieves the current streak column of a certain habit from the habit table in the database
@@ -222,6 +1920,7 @@ def get_current_streak(db, habit_name):
         return None
 
 
+@profiled
 def get_longest_streak(db, habit_name):
     """
     Retrieves the longest streak column of a certain habit from the habit table in the database
@@ -241,6 +1940,7 @@ def get_longest_streak(db, habit_name):
         return None
 
 
+@profiled
 def get_all_habits(db):
     """
     Retrieves all data from the habit table in the database
@@ -249,20 +1949,235 @@ def get_all_habits(db):
     :return: Returns a list which contains dictionaries representing each habit record. Each dictionary has keys
     corresponding to the column names and values representing the habit data.
     """
-    cur = db.cursor()
-    cur.execute("SELECT * FROM habit")
-    habits_data = cur.fetchall()
-    columns = ["habit name", "habit description", "periodicity", "habit group", "creation date", "current streak",
-               "longest streak"]
+    habits_data = get_habit_rows(db)
 
     all_habits = []
     for habit_data in habits_data:
-        habit_dict = dict(zip(columns, habit_data))
+        habit_dict = dict(zip(HABIT_HEADERS, habit_data))
         all_habits.append(habit_dict)
 
     return all_habits
 
 
+@profiled
+def get_habit_rows(db):
+    """
+    Retrieves all data from the habit table in the database as plain rows
+
+    :param db: An initialized SQLite3 database connection
+    :return: Returns a list of tuples with the columns of each habit in the order of HABIT_HEADERS
+    """
+    cur = db.cursor()
+    cur.execute(f"SELECT {HABIT_COLUMNS} FROM habit")
+    return cur.fetchall()
+
+
+# Columns of the habit table that habits can be sorted by
+SORT_COLUMNS = ("habit_name", "periodicity", "current_streak", "longest_streak")
+
+
+@profiled
+def get_sorted_habits(db, sort_by="habit_name", descending=False, limit=None, offset=0):
+    """
+    Retrieves habits from the habit table in the database sorted by one of its columns
+
+    :param db: An initialized SQLite3 database connection
+    :param sort_by: Column of the habit table the habits should be sorted by, one of SORT_COLUMNS
+    :param descending: Whether the habits should be sorted in descending instead of ascending order
+    :param limit: Maximum number of habits that should be retrieved, None retrieves all habits
+    :param offset: Number of habits at the start of the sort order that should be skipped
+    :return: Returns a list of tuples with the columns of each habit in the order of HABIT_HEADERS, habits with the
+    same value in the sort column are sorted by name
+    """
+    if sort_by not in SORT_COLUMNS:
+        raise Exception(f"Habits cannot be sorted by '{sort_by}'.")
+    direction = "DESC" if descending else "ASC"
+    order = f"{sort_by} {direction}" if sort_by == "habit_name" else f"{sort_by} {direction}, habit_name {direction}"
+    cur = db.cursor()
+    cur.execute(f"SELECT {HABIT_COLUMNS} FROM habit ORDER BY {order} LIMIT ? OFFSET ?",
+                (-1 if limit is None else limit, offset))
+    return cur.fetchall()
+
+
+# Streak columns of the habit table that leaderboards can rank habits by, and columns they can be partitioned by
+LEADERBOARD_COLUMNS = ("current_streak", "longest_streak")
+LEADERBOARD_PARTITIONS = ("habit_group", "periodicity")
+
+# Columns of the habit table with a summary table holding the aggregated values of all habits per column value
+SUMMARY_PARTITIONS = ("habit_group", "periodicity")
+
+
+@profiled
+def get_streak_leaders(db, column):
+    """
+    Retrieves all habits that share the highest value of a streak column
+
+    :param db: An initialized SQLite3 database connection
+    :param column: Streak column of the habit table, one of LEADERBOARD_COLUMNS
+    :return: List of tuples (habit name, streak) sorted by habit name, empty if there are no habits
+    """
+    if column not in LEADERBOARD_COLUMNS:
+        raise Exception(f"Habits cannot be ranked by '{column}'.")
+    cur = db.cursor()
+    cur.execute(f"SELECT habit_name, {column} FROM habit WHERE {column} = (SELECT MAX({column}) FROM habit) "
+                f"ORDER BY habit_name")
+    return cur.fetchall()
+
+
+@profiled
+def get_leaderboard(db, column="longest_streak", limit=10, partition_by=None, partition_value=None):
+    """
+    Retrieves the habits with the highest values of a streak column together with their rank
+
+    Habits that tie with the last place are included, so a leaderboard can hold more than limit habits. A leaderboard
+    of the whole table or of a single partition only reads the leading entries of an index.
+
+    :param db: An initialized SQLite3 database connection
+    :param column: Streak column of the habit table, one of LEADERBOARD_COLUMNS
+    :param limit: Number of places of the leaderboard, a leaderboard without places is empty
+    :param partition_by: Column of the habit table, one of LEADERBOARD_PARTITIONS, with a separate leaderboard for
+    each of its values, None for a single leaderboard of all habits
+    :param partition_value: Value of the partition column the leaderboard should be restricted to, None for the
+    leaderboards of all its values
+    :return: List of tuples (habit name, partition value, streak, rank, dense rank) sorted by partition value and rank
+    """
+    if column not in LEADERBOARD_COLUMNS:
+        raise Exception(f"Habits cannot be ranked by '{column}'.")
+    if partition_by is not None and partition_by not in LEADERBOARD_PARTITIONS:
+        raise Exception(f"Leaderboards cannot be partitioned by '{partition_by}'.")
+    if limit <= 0:
+        return []
+
+    cur = db.cursor()
+    if partition_by is not None and partition_value is None:
+        cur.execute(f"""SELECT habit_name, {partition_by}, {column}, place, dense_place FROM (
+        SELECT habit_name, {partition_by}, {column}, RANK() OVER places AS place,
+        DENSE_RANK() OVER places AS dense_place FROM habit WHERE {column} IS NOT NULL
+        WINDOW places AS (PARTITION BY {partition_by} ORDER BY {column} DESC))
+        WHERE place <= ? ORDER BY {partition_by}, place, habit_name""", (limit,))
+        return cur.fetchall()
+
+    if partition_by is None:
+        partition, condition, parameters = "NULL", "", []
+    else:
+        partition, condition, parameters = partition_by, f"{partition_by} = ? AND", [partition_value]
+    # The last place is the limit-th highest value, or the lowest value if there are fewer habits
+    cur.execute(f"""SELECT habit_name, {partition}, {column}, RANK() OVER places, DENSE_RANK() OVER places FROM habit
+    WHERE {condition} {column} >= IFNULL(
+        (SELECT {column} FROM habit WHERE {condition} {column} IS NOT NULL ORDER BY {column} DESC LIMIT 1 OFFSET ?),
+        (SELECT MIN({column}) FROM habit WHERE {condition} {column} IS NOT NULL))
+    WINDOW places AS (ORDER BY {column} DESC)
+    ORDER BY {column} DESC, habit_name""", parameters + parameters + [limit - 1] + parameters)
+    return cur.fetchall()
+
+
+@profiled
+def get_streak_version(db):
+    """
+    Retrieves the version counter of the streak columns, which increases whenever a habit is added or deleted or its
+    streaks, group or periodicity change
+
+    :param db: An initialized SQLite3 database connection
+    :return: Current version of the streak columns
+    """
+    cur = db.cursor()
+    cur.execute("SELECT version FROM streak_version")
+    return cur.fetchone()[0]
+
+
+@profiled
+def get_habit_version(db, habit_name):
+    """
+    Retrieves the change counter of a habit, which increases whenever its completion dates or periodicity change
+
+    :param db: An initialized SQLite3 database connection
+    :param habit_name: Name of the habit
+    :return: Current version of the habit, 0 for a habit that has never been changed
+    """
+    cur = db.cursor()
+    cur.execute("SELECT version FROM habit_version WHERE habit_name=?", (habit_name,))
+    version_row = cur.fetchone()
+    return version_row[0] if version_row else 0
+
+
+class LeaderboardCache:
+    """
+    Cache of the leaderboards of one database connection that is invalidated whenever the streak columns change
+    """
+
+    def __init__(self, db):
+        """
+        :param db: An initialized SQLite3 database connection
+        """
+        self.db = db
+        self._version = None
+        self._results = {}
+
+    def _cached(self, function, *args):
+        version = get_streak_version(self.db)
+        if version != self._version:
+            self._results.clear()
+            self._version = version
+        key = (function.__name__,) + args
+        if key not in self._results:
+            self._results[key] = function(self.db, *args)
+        return self._results[key]
+
+    def get_streak_leaders(self, column):
+        """
+        Cached version of get_streak_leaders
+        """
+        return self._cached(get_streak_leaders, column)
+
+    def get_leaderboard(self, column="longest_streak", limit=10, partition_by=None, partition_value=None):
+        """
+        Cached version of get_leaderboard
+        """
+        return self._cached(get_leaderboard, column, limit, partition_by, partition_value)
+
+
+@profiled
+def get_summary(db, partition_by, partition_value=None):
+    """
+    Retrieves the aggregated values of all habits per habit group or periodicity from the summary tables
+
+    :param db: An initialized SQLite3 database connection
+    :param partition_by: Column of the habit table the habits are aggregated by, one of SUMMARY_PARTITIONS
+    :param partition_value: Value of the column the summary should be restricted to, None for all values
+    :return: List of tuples (column value, number of habits, number of completion dates, average current streak,
+    maximum longest streak, latest completion date) sorted by column value
+    """
+    if partition_by not in SUMMARY_PARTITIONS:
+        raise Exception(f"There is no summary of habits per '{partition_by}'.")
+    query = (f"SELECT {partition_by}, habit_count, total_completions, ROUND(CAST(current_streak_sum AS REAL) / "
+             f"habit_count, 2), max_longest_streak, last_activity FROM {partition_by}_summary")
+    parameters = []
+    if partition_value is not None:
+        query += f" WHERE {partition_by} = ?"
+        parameters.append(partition_value)
+    cur = db.cursor()
+    cur.execute(query + f" ORDER BY {partition_by}", parameters)
+    return cur.fetchall()
+
+
+@profiled
+def get_habits_by_partition(db, partition_by, partition_value):
+    """
+    Retrieves the habits with a certain habit group or periodicity
+
+    :param db: An initialized SQLite3 database connection
+    :param partition_by: Column of the habit table, one of SUMMARY_PARTITIONS
+    :param partition_value: Value of the column the habits should have
+    :return: Returns a list of tuples with the columns of each habit in the order of HABIT_HEADERS sorted by name
+    """
+    if partition_by not in SUMMARY_PARTITIONS:
+        raise Exception(f"Habits cannot be selected by '{partition_by}'.")
+    cur = db.cursor()
+    cur.execute(f"SELECT {HABIT_COLUMNS} FROM habit WHERE {partition_by} = ? ORDER BY habit_name", (partition_value,))
+    return cur.fetchall()
+
+
+@profiled
 def update_current_streak(db, current_streak, habit_name):
     """
     Updates the current streak of a specific habit in the database
@@ -277,6 +2192,7 @@ def update_current_streak(db, current_streak, habit_name):
     db.commit()
 
 
+@profiled
 def update_longest_streak(db, longest_streak, habit_name):
     """
     Updates the longest streak of a specific habit in the database
@@ -291,6 +2207,30 @@ def update_longest_streak(db, longest_streak, habit_name):
     db.commit()
 
 
+@profiled
+def update_streaks_bulk(db, streaks):
+    """
+    Updates the current and the longest streak of many habits in the database within a single transaction
+
+    :param db: An initialized SQLite3 database connection
+    :param streaks: Dictionary mapping habit names to a tuple of their current streak and their longest streak
+    :return: Number of habits whose stored streaks have changed
+    """
+    cur = db.cursor()
+    try:
+        # Habits whose stored streaks are already correct are left alone, so their triggers do not fire
+        cur.executemany("UPDATE habit SET current_streak = ?1, longest_streak = ?2 WHERE habit_name = ?3 "
+                        "AND (current_streak IS NOT ?1 OR longest_streak IS NOT ?2)",
+                        [(current_streak, longest_streak, habit_name)
+                         for habit_name, (current_streak, longest_streak) in streaks.items()])
+    except Exception:
+        db.rollback()
+        raise
+    db.commit()
+    return cur.rowcount
+
+
+@profiled
 def delete_habit_from_db(db, habit_name):
     """
     Delete a habit and its associated completion dates from the database
@@ -307,11 +2247,16 @@ def delete_habit_from_db(db, habit_name):
         return
     else:
         cur.execute("DELETE FROM habit WHERE habit_name=?", (habit_name,))
-        cur.execute("DELETE FROM completion_dates WHERE habit_name=?", (habit_name,))
+        # The habit delete triggers have already subtracted the completions and increased the version
+        with _bulk_maintenance(cur):
+            cur.execute("DELETE FROM completion_days WHERE habit_name=?", (habit_name,))
+        cur.execute("DELETE FROM habit_streak_state WHERE habit_name=?", (habit_name,))
+        cur.execute("DELETE FROM habit_bitmap WHERE habit_name=?", (habit_name,))
         db.commit()
         print(f"The habit '{habit_name}' and its associated completion dates have been deleted.")
 
 
+@profiled
 def habit_exists(db, habit_name):
     """
     Checks if a habit exists in the database
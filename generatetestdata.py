@@ -0,0 +1,163 @@
+import argparse
+import calendar
+import math
+import random
+import time
+from datetime import date, timedelta
+
+from db import get_db, add_habits_bulk, increment_habits_bulk, PERIOD_LENGTHS
+
+HABIT_GROUPS = ["Health", "Education", "Food", "Sports", "Living"]
+
+# Share of the generated habits per periodicity
+DEFAULT_PERIODICITY_MIX = {"Daily": 0.6, "Weekly": 0.3, "Monthly": 0.1}
+
+# Share of the periods in which a habit is completed
+DEFAULT_COMPLETION_PROBABILITY = {"Daily": 0.8, "Weekly": 0.7, "Monthly": 0.6}
+
+# Average number of consecutive periods in which a habit is completed before the streak breaks
+DEFAULT_MEAN_STREAK = {"Daily": 10.0, "Weekly": 6.0, "Monthly": 4.0}
+
+
+def _geometric(rng, mean):
+    """
+    Draws a run length from a geometric distribution
+
+    :param rng: Random number generator
+    :param mean: Mean run length, at least 1
+    :return: Run length of at least 1
+    """
+    if mean <= 1:
+        return 1
+    return 1 + int(math.log(1.0 - rng.random()) / math.log(1.0 - 1.0 / mean))
+
+
+def _period_dates(periodicity, start_date):
+    """
+    Generates one date per period, so that consecutive dates lie in consecutive periods as db.period_number counts them
+
+    :param periodicity: Periodicity of the habit
+    :param start_date: First date
+    :return: Endless generator of the start date and the same weekday of each following ISO week for Weekly, the same
+    day of each following calendar month for Monthly, limited to the last day of shorter months, and each following
+    day for Daily
+    """
+    period = 0
+    while True:
+        if periodicity == 'Monthly':
+            year, month = divmod(start_date.month - 1 + period, 12)
+            year += start_date.year
+            yield date(year, month + 1, min(start_date.day, calendar.monthrange(year, month + 1)[1]))
+        elif periodicity == 'Weekly':
+            yield start_date + timedelta(weeks=period)
+        else:
+            yield start_date + timedelta(days=period)
+        period += 1
+
+
+def generate_habits(rng, habit_count, creation_date, periodicity_mix):
+    """
+    Generates the habit rows of the synthetic dataset
+
+    :param rng: Random number generator
+    :param habit_count: Number of habits
+    :param creation_date: Creation date of all habits
+    :param periodicity_mix: Dictionary with the share of the habits per periodicity
+    :return: List of tuples with the columns of each habit in the order of db.HABIT_COLUMNS
+    """
+    periodicities = rng.choices(list(periodicity_mix), weights=list(periodicity_mix.values()), k=habit_count)
+    return [(f"Habit {number:07d}", f"Synthetic {periodicity.lower()} habit", periodicity, rng.choice(HABIT_GROUPS),
+             str(creation_date), 0, 0) for number, periodicity in enumerate(periodicities)]
+
+
+def generate_completions(rng, habits, end_date, completion_probability, mean_streak):
+    """
+    Generates the completion dates of the synthetic dataset habit by habit without holding them in memory
+
+    Each habit alternates between streaks and gaps, both with geometrically distributed lengths. The mean gap length
+    is chosen so that the expected share of completed periods equals the completion probability.
+
+    :param rng: Random number generator
+    :param habits: Habit rows as generated by generate_habits
+    :param end_date: Latest possible completion date
+    :param completion_probability: Dictionary with the share of completed periods per periodicity
+    :param mean_streak: Dictionary with the mean streak length in periods per periodicity
+    :return: Generator of tuples (habit name, completion date) sorted by date within each habit
+    """
+    for habit_name, description, periodicity, habit_group, creation_date, current_streak, longest_streak in habits:
+        period_dates = _period_dates(periodicity, date.fromisoformat(creation_date))
+        probability = min(max(completion_probability[periodicity], 0.001), 1.0)
+        mean_gap = mean_streak[periodicity] * (1.0 - probability) / probability
+        event_date = next(period_dates)
+        completed = rng.random() < probability
+        while event_date <= end_date:
+            run_length = _geometric(rng, mean_streak[periodicity] if completed else mean_gap)
+            if not completed and mean_gap < 1 and rng.random() >= mean_gap:
+                run_length = 0
+            for _ in range(run_length):
+                if event_date > end_date:
+                    break
+                if completed:
+                    yield habit_name, str(event_date)
+                event_date = next(period_dates)
+            completed = not completed
+
+
+def _per_periodicity(text):
+    """
+    Parses a command line value of the form Daily=0.8,Weekly=0.7
+
+    :param text: Command line value
+    :return: Dictionary with the float value per periodicity
+    """
+    values = {}
+    for item in text.split(","):
+        periodicity, _, value = item.partition("=")
+        if periodicity not in PERIOD_LENGTHS:
+            raise argparse.ArgumentTypeError(f"Unknown periodicity '{periodicity}'.")
+        values[periodicity] = float(value)
+    return values
+
+
+def main(argv=None):
+    """
+    Generates a synthetic dataset of habits and completion dates and writes it to a database
+
+    :param argv: List of command line arguments, None uses the arguments the program was started with
+    """
+    parser = argparse.ArgumentParser(description="Generate a synthetic habit tracker database for profiling.")
+    parser.add_argument("--db", default="generated.db", help="target database file (default: generated.db)")
+    parser.add_argument("--habits", type=int, default=1000, help="number of habits (default: 1000)")
+    parser.add_argument("--days", type=int, default=365, help="length of the history in days (default: 365)")
+    parser.add_argument("--end-date", type=date.fromisoformat, default=date.today(),
+                        help="latest completion date as YYYY-MM-DD (default: today)")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the random number generator (default: 0)")
+    parser.add_argument("--mix", type=_per_periodicity, default={},
+                        help="share of habits per periodicity, e.g. Daily=0.6,Weekly=0.3,Monthly=0.1")
+    parser.add_argument("--probability", type=_per_periodicity, default={},
+                        help="share of completed periods per periodicity, e.g. Daily=0.8")
+    parser.add_argument("--mean-streak", type=_per_periodicity, default={},
+                        help="mean streak length in periods per periodicity, e.g. Daily=10")
+    parser.add_argument("--chunk-size", type=int, default=50000, help="completion dates per batch (default: 50000)")
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    creation_date = args.end_date - timedelta(days=args.days - 1)
+    habits = generate_habits(rng, args.habits, creation_date, {**DEFAULT_PERIODICITY_MIX, **args.mix})
+    completions = generate_completions(rng, habits, args.end_date,
+                                       {**DEFAULT_COMPLETION_PROBABILITY, **args.probability},
+                                       {**DEFAULT_MEAN_STREAK, **args.mean_streak})
+
+    start = time.perf_counter()
+    db = get_db(args.db)
+    added_habits = add_habits_bulk(db, habits)
+    batch_counts = increment_habits_bulk(db, completions, args.chunk_size)
+    db.close()
+    inserted = sum(batch[0] for batch in batch_counts)
+    duration = time.perf_counter() - start
+    print(f"Added {added_habits} habits and {inserted} completion dates to {args.db} in {duration:.1f} s "
+          f"({inserted / max(duration, 1e-9):,.0f} completion dates/s).")
+
+
+if __name__ == '__main__':
+    main()
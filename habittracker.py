@@ -1,4 +1,4 @@
-from db import add_habit
+from db import add_habit, get_habit_record, get_habit_records
 from datetime import datetime
 
 
@@ -34,3 +34,30 @@ class Habit:
         :param self: Calls the respective habit instance
         """
         self.completion_dates.append(datetime.today())
+
+
+def load_habit(db, habit_name):
+    """
+    Loads a habit with all its attributes from the database with a single query
+
+    :param db: An initialized SQLite3 database connection
+    :param habit_name: Name of the habit that should be loaded
+    :return: Habit instance or None in the case the habit does not exist
+    """
+    habit_record = get_habit_record(db, habit_name)
+    if habit_record:
+        return Habit(*habit_record)
+    else:
+        return None
+
+
+def load_habits(db, habit_names):
+    """
+    Loads several habits with all their attributes from the database in one batch
+
+    :param db: An initialized SQLite3 database connection
+    :param habit_names: Names of the habits that should be loaded
+    :return: List of Habit instances in the order of the given names, habits that do not exist are left out
+    """
+    habits = {habit_record[0]: Habit(*habit_record) for habit_record in get_habit_records(db, habit_names)}
+    return [habits[habit_name] for habit_name in dict.fromkeys(habit_names) if habit_name in habits]
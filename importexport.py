@@ -0,0 +1,142 @@
+import csv
+import json
+import os
+
+from db import (iter_habits, iter_all_completion_dates, import_habits, import_completions, reset_import_progress,
+                HABIT_COLUMNS)
+
+# Field names of the exported files, habits use the column names of the habit table
+HABIT_FIELDS = HABIT_COLUMNS.split(", ")
+COMPLETION_FIELDS = ["habit_name", "event_date"]
+
+# File formats by file name extension
+FORMATS = {".csv": "csv", ".jsonl": "jsonl", ".ndjson": "jsonl"}
+
+
+def detect_format(path, file_format=None):
+    """
+    Determines the format of an import or export file
+
+    :param path: Path of the file
+    :param file_format: Format given by the user, one of "csv" and "jsonl", None to derive it from the file extension
+    :return: "csv" or "jsonl"
+    """
+    if file_format is not None:
+        return file_format
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in FORMATS:
+        raise Exception(f"The format of '{path}' cannot be derived from its extension, use .csv or .jsonl.")
+    return FORMATS[extension]
+
+
+def read_records(path, fields, file_format=None):
+    """
+    Reads the records of a CSV file with a header row or of a JSON Lines file one by one
+
+    :param path: Path of the file
+    :param fields: Field names in the order of the returned tuples
+    :param file_format: "csv" or "jsonl", None to derive it from the file extension
+    :return: Generator of tuples with the fields of each record, empty CSV values and missing fields are None
+    """
+    with open(path, newline="", encoding="utf-8") as file:
+        if detect_format(path, file_format) == "csv":
+            for record in csv.DictReader(file):
+                yield tuple(record.get(field) or None for field in fields)
+        else:
+            for line in file:
+                if line.strip():
+                    record = json.loads(line)
+                    yield tuple(record.get(field) for field in fields)
+
+
+def write_records(path, fields, records, file_format=None):
+    """
+    Writes records one by one to a CSV file with a header row or to a JSON Lines file
+
+    :param path: Path of the file, an existing file is replaced
+    :param fields: Field names of the values of each record
+    :param records: Iterable of tuples with the values of each record
+    :param file_format: "csv" or "jsonl", None to derive it from the file extension
+    :return: Number of written records
+    """
+    count = 0
+    with open(path, "w", newline="", encoding="utf-8") as file:
+        if detect_format(path, file_format) == "csv":
+            writer = csv.writer(file)
+            writer.writerow(fields)
+            for record in records:
+                writer.writerow(record)
+                count += 1
+        else:
+            for record in records:
+                file.write(json.dumps(dict(zip(fields, record)), default=str) + "\n")
+                count += 1
+    return count
+
+
+def export_data(db, habits_path=None, completions_path=None, file_format=None):
+    """
+    Streams the habits and the completion dates of a database to files
+
+    :param db: An initialized SQLite3 database connection
+    :param habits_path: Path of the habit file, None to not export habits
+    :param completions_path: Path of the completion dates file, None to not export completion dates
+    :param file_format: "csv" or "jsonl", None to derive it from the file extensions
+    :return: Tuple of the number of exported habits and the number of exported completion dates
+    """
+    habits = completions = 0
+    if habits_path is not None:
+        habits = write_records(habits_path, HABIT_FIELDS, iter_habits(db), file_format)
+    if completions_path is not None:
+        completions = write_records(completions_path, COMPLETION_FIELDS, iter_all_completion_dates(db),
+                                    file_format)
+    return habits, completions
+
+
+def _source(kind, path):
+    """
+    :return: Name identifying an imported file in the import progress of the database
+    """
+    return f"{kind}:{os.path.abspath(path)}"
+
+
+def import_data(db, habits_path=None, completions_path=None, file_format=None, chunk_size=10000, restart=False,
+                progress=None):
+    """
+    Streams habits and completion dates from files into a database in chunked transactions
+
+    The habits are imported before the completion dates, so that completions of newly imported habits are not
+    skipped. An interrupted import continues after the last stored chunk when it is started again with the same
+    files.
+
+    :param db: An initialized SQLite3 database connection
+    :param habits_path: Path of the habit file, None to not import habits
+    :param completions_path: Path of the completion dates file, None to not import completion dates
+    :param file_format: "csv" or "jsonl", None to derive it from the file extensions
+    :param chunk_size: Number of records per transaction
+    :param restart: Whether previous imports of the files should be ignored and the files imported from the start
+    :param progress: Function called with the kind of records ("habits" or "completions") and the number of records
+    read so far after each chunk, None for no progress reports
+    :return: Dictionary with a tuple per kind of the number of stored records, the number of skipped records, the
+    names of the habits that do not exist and the names of the habits that already exist or already have some of the
+    imported completion dates
+    """
+    report = {}
+    for kind, path, fields in (("habits", habits_path, HABIT_FIELDS),
+                               ("completions", completions_path, COMPLETION_FIELDS)):
+        if path is None:
+            continue
+        if restart:
+            reset_import_progress(db, _source(kind, path))
+        records = read_records(path, fields, file_format)
+        kind_progress = None if progress is None else lambda records: progress(kind, records)
+        missing, duplicates = set(), []
+        if kind == "habits":
+            chunk_counts = import_habits(db, records, _source(kind, path), chunk_size, duplicates, kind_progress)
+        else:
+            duplicates = set()
+            chunk_counts = import_completions(db, records, _source(kind, path), chunk_size, missing, kind_progress,
+                                              duplicates)
+        report[kind] = (sum(stored for stored, skipped in chunk_counts),
+                        sum(skipped for stored, skipped in chunk_counts), sorted(missing), sorted(duplicates))
+    return report
@@ -0,0 +1,235 @@
+import functools
+import sqlite3
+import sys
+import threading
+from time import perf_counter
+
+# Measurements are only taken while instrumentation is enabled, disabled instrumentation costs one flag check
+_enabled = False
+_lock = threading.Lock()
+_function_stats = {}
+_sql_stats = {}
+_trace_stats = {}
+
+
+def enable():
+    """
+    Starts taking measurements, connections opened by db.get_db from now on record their SQL statements
+    """
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    """
+    Stops taking measurements, the measurements taken so far are kept
+    """
+    global _enabled
+    _enabled = False
+
+
+def is_enabled():
+    """
+    :return: Whether measurements are taken
+    """
+    return _enabled
+
+
+def reset():
+    """
+    Discards all measurements taken so far
+    """
+    with _lock:
+        _function_stats.clear()
+        _sql_stats.clear()
+        _trace_stats.clear()
+
+
+def _record_function(name, seconds):
+    with _lock:
+        stats = _function_stats.setdefault(name, [0, 0.0])
+        stats[0] += 1
+        stats[1] += seconds
+
+
+def _record_sql(statement, seconds, rows, executed):
+    with _lock:
+        stats = _sql_stats.setdefault(statement, [0, 0.0, 0])
+        stats[0] += executed
+        stats[1] += seconds
+        stats[2] += rows
+
+
+def _normalize(statement):
+    return " ".join(statement.split())
+
+
+class timed:
+    """
+    Measures the wall time of a block of code or of every call of a function
+
+    Usable as context manager, e.g. with timed("import"): ..., or as decorator, e.g. @timed("streaks").
+    """
+
+    def __init__(self, name):
+        """
+        :param name: Name the measurements are reported under
+        """
+        self.name = name
+        self._start = None
+
+    def __enter__(self):
+        if _enabled:
+            self._start = perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self._start is not None:
+            _record_function(self.name, perf_counter() - self._start)
+            self._start = None
+
+    def __call__(self, function):
+        name = self.name
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return function(*args, **kwargs)
+            start = perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                _record_function(name, perf_counter() - start)
+
+        return wrapper
+
+
+def profiled(function):
+    """
+    Decorator that measures every call of a function under its module and function name
+
+    :param function: Function that should be measured
+    :return: Wrapped function
+    """
+    return timed(f"{function.__module__}.{function.__name__}")(function)
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """
+    Cursor that records the wall time, the number of executions and the number of rows of every SQL statement
+    """
+
+    _statement = None
+
+    def execute(self, sql, parameters=()):
+        self._statement = _normalize(sql)
+        start = perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            _record_sql(self._statement, perf_counter() - start, max(self.rowcount, 0), 1)
+
+    def executemany(self, sql, seq_of_parameters):
+        self._statement = _normalize(sql)
+        start = perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            _record_sql(self._statement, perf_counter() - start, max(self.rowcount, 0), 1)
+
+    def _fetched(self, start, rows):
+        if self._statement is not None:
+            _record_sql(self._statement, perf_counter() - start, rows, 0)
+
+    def fetchone(self):
+        start = perf_counter()
+        row = super().fetchone()
+        self._fetched(start, row is not None)
+        return row
+
+    def fetchmany(self, size=None):
+        start = perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._fetched(start, len(rows))
+        return rows
+
+    def fetchall(self):
+        start = perf_counter()
+        rows = super().fetchall()
+        self._fetched(start, len(rows))
+        return rows
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """
+    Connection whose cursors record their SQL statements and whose statements, including those run by triggers, are
+    counted by a trace callback
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.set_trace_callback(trace_statement)
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+def trace_statement(statement):
+    """
+    Trace callback for sqlite3.Connection.set_trace_callback that counts every statement SQLite executes
+
+    :param statement: SQL statement with bound parameters as reported by SQLite
+    """
+    if _enabled:
+        with _lock:
+            _trace_stats[statement] = _trace_stats.get(statement, 0) + 1
+
+
+def summary():
+    """
+    Collects all measurements taken so far
+
+    :return: Dictionary with the measurements of functions, SQL statements and traced statements
+    """
+    with _lock:
+        return {
+            "functions": [{"name": name, "calls": calls, "seconds": seconds}
+                          for name, (calls, seconds) in sorted(_function_stats.items(), key=lambda item: -item[1][1])],
+            "sql": [{"statement": statement, "executions": executions, "seconds": seconds, "rows": rows}
+                    for statement, (executions, seconds, rows) in sorted(_sql_stats.items(),
+                                                                         key=lambda item: -item[1][1])],
+            "traced_statements": sum(_trace_stats.values()),
+        }
+
+
+def report(json_path=None, file=None):
+    """
+    Prints a summary table of all measurements or writes them as JSON
+
+    :param json_path: File the measurements should be written to as JSON, None prints a table instead
+    :param file: Stream the table is printed to, standard error by default
+    """
+    measurements = summary()
+    if json_path:
+        import json
+
+        with open(json_path, "w") as output:
+            json.dump(measurements, output, indent=2)
+        return
+
+    file = file or sys.stderr
+    print(f"{'calls':>8} {'total ms':>12} {'mean ms':>10}  function", file=file)
+    for stats in measurements["functions"]:
+        print(f"{stats['calls']:>8} {stats['seconds'] * 1000:>12.3f} "
+              f"{stats['seconds'] * 1000 / stats['calls']:>10.4f}  {stats['name']}", file=file)
+    print(f"\n{'runs':>8} {'total ms':>12} {'rows':>10}  SQL statement", file=file)
+    for stats in measurements["sql"]:
+        print(f"{stats['executions']:>8} {stats['seconds'] * 1000:>12.3f} {stats['rows']:>10}  "
+              f"{stats['statement'][:100]}", file=file)
+    print(f"\n{measurements['traced_statements']} statements executed by SQLite including triggers", file=file)
@@ -1,22 +1,44 @@
+import argparse
+import atexit
+import sys
 from datetime import datetime
 from time import sleep
 
-import questionary
-from db import (get_db, delete_habit_from_db, increment_habit, get_all_habits,
-                get_periodicity, get_habit_group, get_description, get_creation_date, get_current_streak,
-                get_longest_streak, update_current_streak, update_longest_streak, habit_exists)
-from habittracker import Habit
-from analyze import (calculate_current_streak, calculate_longest_streak, table_all_habits, table_sorted_periodicity,
+from db import (get_db, delete_habit_from_db, increment_habit, update_current_streak, update_longest_streak,
+                habit_exists, enable_completion_bitmap, archive_completions, get_completion_archive)
+from habittracker import Habit, load_habit
+import instrumentation
+from analyze import (calculate_current_streak, calculate_longest_streak, calculate_bitmap_streaks, StreakCache,
+                     table_all_habits, table_sorted_habits,
+                     table_sorted_periodicity,
                      table_sorted_alphabet, table_sorted_current_streak, table_sorted_longest_streak,
                      display_habit_by_periodicity, display_habit_by_group,
-                     habit_with_longest_current_streak, habit_with_longest_streak, table_completion_dates)
+                     habit_with_longest_current_streak, habit_with_longest_streak, table_completion_dates,
+                     table_leaderboard, table_summary, PAGE_SIZE)
 
+PERIODICITIES = ["Daily", "Weekly", "Monthly"]
+HABIT_GROUPS = ["Health", "Education", "Food", "Sports", "Living"]
 
-def cli():
+# Columns of the habit table the report command sorts by, None keeps the order of the habit table
+REPORTS = {
+    "none": None,
+    "name": "habit_name",
+    "periodicity": "periodicity",
+    "current": "current_streak",
+    "longest": "longest_streak",
+}
+
+
+def cli(db_name='main.db'):
     """
     Command-line interface function that allows the user the interaction with the habit tracker program
+
+    :param db_name: Name of the SQlite3 database
     """
-    db = get_db()
+    import questionary
+
+    db = get_db(db_name)
+    streak_cache = StreakCache(db)
     print("Welcome to the revolutionary habit tracker")
 
     stop = False
@@ -30,10 +52,10 @@ def cli():
             name = questionary.text("What is the name of the habit you want to create?").ask()
             desc = questionary.text("Please give a brief description of your habit.").ask()
             periodicity = questionary.select("What is the rhythm in which you want to execute your habit?",
-                                             choices=["Daily", "Weekly", "Monthly"]
+                                             choices=PERIODICITIES
                                              ).ask()
             habit_group = questionary.select("Which group does your habit belong to?",
-                                             choices=["Health", "Education", "Food", "Sports", "Living"]
+                                             choices=HABIT_GROUPS
                                              ).ask()
             creation_date = datetime.today().date()
             current_streak = 0
@@ -45,19 +67,12 @@ def cli():
 
         elif choice_action == "Increment habit":
             habit_name = questionary.text("Choose a habit to check off:").ask()
-            if habit_exists(db, habit_name) == None:
+            chosen_habit = load_habit(db, habit_name)
+            if chosen_habit is None:
                 print("This habit does not exist.")
             else:
-                desc = get_description(db, habit_name)
-                periodicity = get_periodicity(db, habit_name)
-                creation_date = get_creation_date(db, habit_name)
-                habit_group = get_habit_group(db, habit_name)
-                current_streak = get_current_streak(db, habit_name)
-                longest_streak = get_longest_streak(db, habit_name)
-                chosen_habit = Habit(habit_name, desc, periodicity, habit_group, creation_date, current_streak,
-                                     longest_streak)
                 chosen_habit.complete_habit()
-                increment_habit(db, habit_name)
+                increment_habit(db, habit_name, incremental=True)
                 print(f"{habit_name} has been incremented.")
                 sleep(2)
 
@@ -84,7 +99,7 @@ def cli():
                     if None == habit_exists(db, habit_name):
                         print("This habit does not exist.")
                     else:
-                        current_streak = calculate_current_streak(db, habit_name)
+                        current_streak = streak_cache.calculate_current_streak(habit_name)
                         print(f"Your current streak for {habit_name} is {current_streak}")
                         update_current_streak(db, current_streak, habit_name)
                         print(f"Current streak for habit '{habit_name}' has been updated in the database.")
@@ -95,50 +110,30 @@ def cli():
                     if None == habit_exists(db, habit_name):
                         print("This habit does not exist.")
                     else:
-                        longest_streak = calculate_longest_streak(db, habit_name)
+                        longest_streak = streak_cache.calculate_longest_streak(habit_name)
                         print(f"Your longest streak for {habit_name} is {longest_streak}")
                         update_longest_streak(db, longest_streak, habit_name)
                         print(f"Longest streak for habit '{habit_name}' has been updated in the database.")
                     sleep(2)
 
                 elif choice_analysis == "Get a table with all habits":
-                    all_habits = get_all_habits(db)
-                    if not all_habits:
-                        print("There are no existing habits.")
-                    else:
-                        table_all_habits(db)
+                    table_all_habits(db)
                     sleep(2)
 
                 elif choice_analysis == "Get a list of habits sorted by alphabet":
-                    user_habits = get_all_habits(db)
-                    if not user_habits:
-                        print("There are no existing habits.")
-                    else:
-                        table_sorted_alphabet(db)
+                    table_sorted_alphabet(db)
                     sleep(2)
 
                 elif choice_analysis == "Get a list of habits sorted by periodicity":
-                    user_habits = get_all_habits(db)
-                    if not user_habits:
-                        print("There are no existing habits.")
-                    else:
-                        table_sorted_periodicity(db)
+                    table_sorted_periodicity(db)
                     sleep(2)
 
                 elif choice_analysis == "Get a list of habits sorted by current streak":
-                    user_habits = get_all_habits(db)
-                    if not user_habits:
-                        print("There are no existing habits.")
-                    else:
-                        table_sorted_current_streak(db)
+                    table_sorted_current_streak(db)
                     sleep(2)
 
                 elif choice_analysis == "Get a list of habits sorted by longest streak":
-                    user_habits = get_all_habits(db)
-                    if not user_habits:
-                        print("There are no existing habits.")
-                    else:
-                        table_sorted_longest_streak(db)
+                    table_sorted_longest_streak(db)
                     sleep(2)
 
                 elif choice_analysis == "Display all completion dates for a habit":
@@ -147,7 +142,7 @@ def cli():
                     if None == habit_exists(db, habit_name):
                         print("This habit does not exist.")
                     else:
-                        table_completion_dates(db, habit_name)
+                        table_completion_dates(db, habit_name, page_size=PAGE_SIZE)
                     sleep(2)
 
                 elif choice_analysis == "Display habits with certain periodicity":
@@ -190,5 +185,182 @@ def cli():
             sleep(2)
 
 
+def run_command(args):
+    """
+    Executes a single command of the non-interactive mode without prompts and pauses
+
+    :param args: Parsed command line arguments
+    :return: Exit status of the program
+    """
+    db = get_db(args.db)
+
+    if args.command == "create":
+        creation_date = datetime.today().date()
+        Habit(args.name, args.description, args.periodicity, args.group, creation_date, 0, 0).store_habit(db)
+        if args.bitmap:
+            enable_completion_bitmap(db, args.name)
+        print(f"The habit '{args.name}' has been created.")
+        return 0
+
+    if args.command in ("increment", "streak", "dates") and habit_exists(db, args.name) is None:
+        print(f"This habit ({args.name}) does not exist.")
+        return 1
+
+    if args.command == "increment":
+        increment_habit(db, args.name, args.date, incremental=True)
+        print(f"{args.name} has been incremented.")
+    elif args.command == "streak":
+        streaks = calculate_bitmap_streaks(db, args.name)
+        if streaks is None:
+            streaks = calculate_current_streak(db, args.name), calculate_longest_streak(db, args.name)
+        current_streak, longest_streak = streaks
+        update_current_streak(db, current_streak, args.name)
+        update_longest_streak(db, longest_streak, args.name)
+        print(f"Current streak for {args.name}: {current_streak}, longest streak: {longest_streak}")
+    elif args.command == "report":
+        if REPORTS[args.sort] is None:
+            table_all_habits(db)
+        else:
+            table_sorted_habits(db, REPORTS[args.sort], args.descending, args.limit, args.offset)
+    elif args.command == "leaderboard":
+        table_leaderboard(db, REPORTS[args.by], args.limit, args.per)
+    elif args.command == "overview":
+        table_summary(db, args.per)
+    elif args.command == "dates":
+        table_completion_dates(db, args.name, page_size=args.page_size, start_date=args.start, end_date=args.end,
+                               limit=args.limit)
+    elif args.command == "recompute":
+        from recompute import recompute_all_streaks, print_progress
+        habits, changed, seconds = recompute_all_streaks(args.db, args.workers, progress=print_progress)
+        print(f"Recalculated the streaks of {habits:,} habits in {seconds:.1f} s, {changed:,} of them have changed.")
+    elif args.command == "export":
+        from importexport import export_data
+        habits, completions = export_data(db, args.habits, args.completions, args.format)
+        print(f"Exported {habits:,} habits and {completions:,} completion dates.")
+    elif args.command == "import":
+        from importexport import import_data
+        report = import_data(db, args.habits, args.completions, args.format, args.chunk_size, args.restart,
+                             lambda kind, records: print(f"{records:,} {kind} read"))
+        duplicate_reasons = {"habits": "already exist", "completions": "already have some of the completion dates"}
+        for kind, (stored, skipped, missing, duplicates) in report.items():
+            print(f"Imported {stored:,} {kind}, {skipped:,} conflicting {kind} were skipped.")
+            for reason, habit_names in (("do not exist", missing), (duplicate_reasons[kind], duplicates)):
+                if habit_names:
+                    print(f"Habits that {reason}: {', '.join(habit_names[:10])}" +
+                          (" ..." if len(habit_names) > 10 else ""))
+    elif args.command == "archive":
+        path = args.path
+        if path is None and get_completion_archive(db) is None:
+            path = f"{args.db}.archive"
+        archived = archive_completions(db, args.before, path)
+        print(f"Archived {archived:,} completion dates before {args.before}.")
+    elif args.command == "delete":
+        delete_habit_from_db(db, args.name)
+    return 0
+
+
+def parse_arguments(argv=None):
+    """
+    Parses the command line arguments of the program
+
+    :param argv: List of command line arguments, None uses the arguments the program was started with
+    :return: Parsed command line arguments, the command is None if the interactive interface should be started
+    """
+    parser = argparse.ArgumentParser(description="The revolutionary habit tracker. Without a command the interactive "
+                                                 "interface is started.")
+    parser.add_argument("--db", default="main.db", help="SQLite3 database file (default: main.db)")
+    parser.add_argument("--user", help="use the database of this user in the shard directory instead of --db")
+    parser.add_argument("--shard-dir", default="shards", help="directory with one database per user (default: shards)")
+    parser.add_argument("--profile", action="store_true",
+                        help="measure SQL statements and functions and print a summary on exit")
+    parser.add_argument("--profile-json", metavar="FILE",
+                        help="measure SQL statements and functions and write the summary to FILE as JSON on exit")
+    commands = parser.add_subparsers(dest="command")
+
+    create = commands.add_parser("create", help="create a new habit")
+    create.add_argument("name")
+    create.add_argument("--description", required=True)
+    create.add_argument("--periodicity", choices=PERIODICITIES, required=True)
+    create.add_argument("--group", choices=HABIT_GROUPS, required=True)
+    create.add_argument("--bitmap", action="store_true",
+                        help="also store the completion history of a daily habit as one bit per day")
+
+    increment = commands.add_parser("increment", help="check off a habit")
+    increment.add_argument("name")
+    increment.add_argument("--date", help="completion date as YYYY-MM-DD (default: today)")
+
+    streak = commands.add_parser("streak", help="calculate and store the current and longest streak of a habit")
+    streak.add_argument("name")
+
+    report = commands.add_parser("report", help="display a table with all habits")
+    report.add_argument("--sort", choices=list(REPORTS), default="none")
+    report.add_argument("--descending", action="store_true", help="sort in descending order")
+    report.add_argument("--limit", type=int, help="maximum number of habits to display when sorting")
+    report.add_argument("--offset", type=int, default=0, help="number of habits to skip when sorting")
+
+    leaderboard = commands.add_parser("leaderboard", help="display the habits with the highest streaks")
+    leaderboard.add_argument("--by", choices=["current", "longest"], default="longest")
+    leaderboard.add_argument("--limit", type=int, default=10, help="number of places (default: 10)")
+    leaderboard.add_argument("--per", choices=["habit_group", "periodicity"], help="rank separately per group or "
+                                                                                    "periodicity")
+
+    overview = commands.add_parser("overview", help="display aggregated values per group or periodicity")
+    overview.add_argument("--per", choices=["habit_group", "periodicity"], default="habit_group")
+
+    dates = commands.add_parser("dates", help="display the completion dates of a habit")
+    dates.add_argument("name")
+    dates.add_argument("--from", dest="start", help="earliest completion date as YYYY-MM-DD")
+    dates.add_argument("--to", dest="end", help="latest completion date as YYYY-MM-DD")
+    dates.add_argument("--limit", type=int)
+    dates.add_argument("--page-size", type=int, default=PAGE_SIZE)
+
+    recompute = commands.add_parser("recompute", help="recalculate and store the streaks of all habits on all cores")
+    recompute.add_argument("--workers", type=int, help="number of worker processes (default: one per core)")
+
+    export = commands.add_parser("export", help="write habits and completion dates to CSV or JSON Lines files")
+    export.add_argument("--habits", metavar="FILE", help="file for the habits")
+    export.add_argument("--completions", metavar="FILE", help="file for the completion dates")
+    export.add_argument("--format", choices=["csv", "jsonl"], help="file format (default: from the file extension)")
+
+    import_ = commands.add_parser("import", help="read habits and completion dates from CSV or JSON Lines files, an "
+                                                 "interrupted import continues where it stopped")
+    import_.add_argument("--habits", metavar="FILE", help="file with the habits")
+    import_.add_argument("--completions", metavar="FILE", help="file with the completion dates")
+    import_.add_argument("--format", choices=["csv", "jsonl"], help="file format (default: from the file extension)")
+    import_.add_argument("--chunk-size", type=int, default=10000, help="records per transaction (default: 10000)")
+    import_.add_argument("--restart", action="store_true", help="import the files from the start")
+
+    archive = commands.add_parser("archive", help="move old completion dates from the database into a compact archive "
+                                                  "file that is read together with the database")
+    archive.add_argument("--before", required=True, help="completion dates before this date as YYYY-MM-DD are moved")
+    archive.add_argument("--path", help="path of the archive files (default: the current archive or the database "
+                                        "file name with .archive appended)")
+
+    delete = commands.add_parser("delete", help="delete a habit and its completion dates")
+    delete.add_argument("name")
+
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """
+    Starts the interactive interface or executes a single command given on the command line
+
+    :param argv: List of command line arguments, None uses the arguments the program was started with
+    :return: Exit status of the program
+    """
+    args = parse_arguments(argv)
+    if args.profile or args.profile_json:
+        instrumentation.enable()
+        atexit.register(instrumentation.report, args.profile_json)
+    if args.user is not None:
+        from shardrouter import ShardRouter
+        args.db = ShardRouter(args.shard_dir).shard_path(args.user)
+    if args.command is None:
+        cli(args.db)
+        return 0
+    return run_command(args)
+
+
 if __name__ == '__main__':
-    cli()
+    sys.exit(main())
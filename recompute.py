@@ -0,0 +1,83 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from time import perf_counter
+
+from db import get_db, get_read_only_db, get_habit_names, update_streaks_bulk
+from analyze import calculate_all_streaks
+
+
+def partition_habits(habit_names, partitions):
+    """
+    Splits sorted habit names into contiguous ranges of about the same number of habits
+
+    :param habit_names: List of habit names in ascending order
+    :param partitions: Maximum number of ranges
+    :return: List of tuples (first habit name, last habit name, number of habits) of inclusive ranges
+    """
+    size = -(-len(habit_names) // max(partitions, 1))
+    return [(habit_names[start], habit_names[min(start + size, len(habit_names)) - 1],
+             min(start + size, len(habit_names)) - start) for start in range(0, len(habit_names), size or 1)]
+
+
+def _calculate_partition(name, habit_range, busy_timeout):
+    """
+    Calculates the streaks of a range of habits in a worker process from a read-only connection of its own
+
+    :param name: Name of the SQlite3 database file
+    :param habit_range: Tuple (first habit name, last habit name) of an inclusive range
+    :param busy_timeout: Milliseconds to wait for a lock held by another connection before giving up
+    :return: Dictionary mapping each habit name of the range to a tuple of its current streak and its longest streak
+    """
+    db = get_read_only_db(name, busy_timeout)
+    try:
+        return calculate_all_streaks(db, habit_range)
+    finally:
+        db.close()
+
+
+def recompute_all_streaks(name='main.db', workers=None, partitions_per_worker=4, busy_timeout=5000, progress=None):
+    """
+    Recalculates the current and the longest streak of every habit on all cores and stores them in one transaction
+
+    The habits are split into ranges of names that worker processes calculate from read-only connections. The
+    results are written back with a single batched update once all ranges are done.
+
+    :param name: Name of the SQlite3 database file
+    :param workers: Number of worker processes, None uses one per core
+    :param partitions_per_worker: Number of habit ranges per worker, more ranges balance uneven histories better
+    :param busy_timeout: Milliseconds to wait for a lock held by another connection before giving up
+    :param progress: Function called with the number of calculated habits, the number of all habits and the elapsed
+    seconds whenever a range is done, None for no progress reports
+    :return: Tuple of the number of habits, the number of habits whose stored streaks changed and the elapsed seconds
+    """
+    start = perf_counter()
+    db = get_db(name, busy_timeout)
+    try:
+        habit_names = get_habit_names(db)
+        workers = workers or os.cpu_count() or 1
+        partitions = partition_habits(habit_names, workers * partitions_per_worker)
+        streaks = {}
+        with ProcessPoolExecutor(max_workers=min(workers, max(len(partitions), 1))) as executor:
+            futures = {executor.submit(_calculate_partition, name, (first, last), busy_timeout): count
+                       for first, last, count in partitions}
+            calculated = 0
+            for future in as_completed(futures):
+                streaks.update(future.result())
+                calculated += futures[future]
+                if progress is not None:
+                    progress(calculated, len(habit_names), perf_counter() - start)
+        changed = update_streaks_bulk(db, streaks)
+    finally:
+        db.close()
+    return len(habit_names), changed, perf_counter() - start
+
+
+def print_progress(calculated, total, seconds):
+    """
+    Prints the progress and the throughput of a recalculation
+
+    :param calculated: Number of habits whose streaks have been calculated
+    :param total: Number of all habits
+    :param seconds: Elapsed seconds
+    """
+    print(f"{calculated:,}/{total:,} habits ({calculated / max(seconds, 1e-9):,.0f} habits/s)")
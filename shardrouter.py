@@ -0,0 +1,137 @@
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+
+from db import get_db
+
+# User IDs made of these characters are used as file names directly, all others are replaced by their SHA-256 hash
+_SAFE_USER_ID = re.compile(r"[A-Za-z0-9_-]{1,64}")
+
+
+class _Shard:
+    """
+    Cached connection to the database file of one user
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.db = None
+        # Serializes the threads using the connection, SQLite connections must only be used by one thread at a time
+        self.lock = threading.Lock()
+        # Number of threads that have checked out or are waiting for the connection
+        self.checkouts = 0
+
+
+class ShardRouter:
+    """
+    Routes each user to a database file of its own, so that writes of different users do not wait for the same lock
+
+    Connections are opened on first use and kept open for later calls. If more than max_open shards are open, the
+    least recently used shards that no thread is using are closed. Every function of the db and analyze modules that
+    takes a database connection as first argument can be run against the shard of a user with call.
+    """
+
+    def __init__(self, directory='shards', max_open=64, busy_timeout=5000):
+        """
+        :param directory: Directory holding one SQlite3 database file per user, it is created if it does not exist
+        :param max_open: Maximum number of idle connections that are kept open
+        :param busy_timeout: Milliseconds to wait for a lock held by another connection before giving up
+        """
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_open = max_open
+        self.busy_timeout = busy_timeout
+        self._shards = OrderedDict()
+        self._lock = threading.Lock()
+
+    def shard_path(self, user_id):
+        """
+        :param user_id: ID of the user or tenant
+        :return: Path of the database file of the user
+        """
+        name = str(user_id)
+        if not _SAFE_USER_ID.fullmatch(name):
+            name = hashlib.sha256(name.encode()).hexdigest()
+        return str(self.directory / f"{name}.db")
+
+    @contextmanager
+    def connection(self, user_id):
+        """
+        Checks out the connection to the database of a user, waiting until no other thread is using it
+
+        :param user_id: ID of the user or tenant
+        :return: The connection; open transactions are committed on success and rolled back on errors
+        """
+        with self._lock:
+            shard = self._shards.get(user_id)
+            if shard is None:
+                shard = self._shards[user_id] = _Shard(self.shard_path(user_id))
+            self._shards.move_to_end(user_id)
+            shard.checkouts += 1
+        try:
+            with shard.lock:
+                if shard.db is None:
+                    shard.db = get_db(shard.path, self.busy_timeout)
+                try:
+                    yield shard.db
+                except BaseException:
+                    shard.db.rollback()
+                    raise
+                else:
+                    if shard.db.in_transaction:
+                        shard.db.commit()
+        finally:
+            with self._lock:
+                shard.checkouts -= 1
+                self._evict_idle()
+
+    def call(self, user_id, function, *args, **kwargs):
+        """
+        Runs a database function against the database of a user
+
+        :param user_id: ID of the user or tenant
+        :param function: Function of the db or analyze module taking a database connection as first argument
+        :return: Result of the function
+        """
+        with self.connection(user_id) as db:
+            return function(db, *args, **kwargs)
+
+    def open_shards(self):
+        """
+        :return: List of the IDs of the users whose connections are open, from least to most recently used
+        """
+        with self._lock:
+            return [user_id for user_id, shard in self._shards.items() if shard.db is not None]
+
+    def _evict_idle(self):
+        """
+        Closes the least recently used idle connections until at most max_open shards are cached, must be called
+        while holding the lock of the router
+        """
+        excess = len(self._shards) - self.max_open
+        for user_id in [user_id for user_id, shard in self._shards.items() if shard.checkouts == 0][:max(excess, 0)]:
+            shard = self._shards.pop(user_id)
+            if shard.db is not None:
+                shard.db.close()
+
+    def close(self):
+        """
+        Closes the connections of all shards, waiting until no thread is using them
+        """
+        with self._lock:
+            shards = list(self._shards.values())
+            self._shards.clear()
+        for shard in shards:
+            with shard.lock:
+                if shard.db is not None:
+                    shard.db.close()
+                    shard.db = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -2,9 +2,10 @@ import pytest
 import sqlite3
 import pandas as pd
 from tabulate import tabulate
-from unittest.mock import patch
 from analyze import (calculate_current_streak, calculate_longest_streak, table_sorted_alphabet, table_completion_dates,
-                     habit_with_longest_current_streak)
+                     habit_with_longest_current_streak, calculate_all_streaks, calculate_bitmap_streaks,
+                     was_completed_on, count_completions, StreakCache)
+from db import migrate_schema, enable_completion_bitmap, increment_habit, delete_habit_from_db, archive_completions
 
 
 @pytest.fixture
@@ -16,6 +17,8 @@ def db():
     """
     db = sqlite3.connect(':memory:')
     create_tables(db)
+    # Upgrade the original tables to the current schema, e.g. completion dates stored as day numbers
+    migrate_schema(db)
     return db
 
 
@@ -73,26 +76,18 @@ def add_habit(db, habit_name, description, periodicity, habit_group, creation_da
         db.commit()
 
 
-# Mock functions for get_date_for_habit and get_periodicity
-def mock_habit_data(db, habit_name):
-    cursor = db.cursor()
-    cursor.execute('''CREATE TABLE IF NOT EXISTS habit (
-                            habit_name VARCHAR(20),
-                            description TEXT,
-                            periodicity VARCHAR(20),
-                            habit_group VARCHAR(20),
-                            creation_date DATE,
-                            current_streak INTEGER,
-                            longest_streak INTEGER
-                        )''')
-
-    # Insert sample habit data
-    habit_data = [
-        ("Running", "Run 5km each day", "Daily", "Health", "2024-01-01", 0, 0),
-        ("Reading", "Read a book each week", "Weekly", "Personal Development", "2024-01-05", 0, 0),
-        ("Meditation", "Meditate for 15 minutes daily", "Daily", "Mindfulness", "2024-01-10", 0, 0)
-    ]
-    cursor.executemany("INSERT INTO habit VALUES (?, ?, ?, ?, ?, ?, ?)", habit_data)
+def store_completion_dates(db, habit_name, periodicity, completion_dates):
+    """
+    Adds a habit and its completion dates to the database
+
+    :param db: An initialized SQLite3 database connection
+    :param habit_name: Name of the habit
+    :param periodicity: Periodicity of the habit
+    :param completion_dates: List of completion dates as ISO formatted strings
+    """
+    add_habit(db, habit_name, "Description", periodicity, "Health", "2024-01-01", 0, 0)
+    db.executemany("INSERT INTO completion_dates VALUES (?, ?)", [(habit_name, date) for date in completion_dates])
+    db.commit()
 
 
 def mock_get_date_for_habit(db, habit_name):
@@ -100,56 +95,42 @@ def mock_get_date_for_habit(db, habit_name):
     return ["2024-01-06", "2024-01-05", "2024-01-04", "2024-01-02", "2024-01-01"]
 
 
-def mock_get_periodicity(db, habit_name):
-    # Return the periodicity for testing
-    return "Daily"
-
-
 # Test cases
-def test_calculate_current_streak_daily(monkeypatch):
-    with monkeypatch.context() as m:
-        m.setattr("analyze.get_date_for_habit", mock_get_date_for_habit)
-        m.setattr("analyze.get_periodicity", mock_get_periodicity)
+def test_calculate_current_streak_daily(db):
+    store_completion_dates(db, "Running", "Daily", mock_get_date_for_habit(db, "Running"))
 
-        streak = calculate_current_streak(db, "Running")
+    streak = calculate_current_streak(db, "Running")
 
-        assert streak == 2
+    assert streak == 2
 
 
-def test_calculate_current_streak_weekly(monkeypatch):
-    with monkeypatch.context() as m:
-        # Mock get_date_for_habit to return completion dates for testing
-        def mock_get_date_for_habit_weekly(db, habit_name):
-            return ["2024-01-29", "2024-01-22", "2024-01-15", "2024-01-08", "2024-01-01"]
+def test_calculate_current_streak_weekly(db):
+    store_completion_dates(db, "Running", "Weekly", ["2024-01-29", "2024-01-22", "2024-01-15", "2024-01-08",
+                                                     "2024-01-01"])
 
-        # Mock get_periodicity to return the periodicity for testing
-        def mock_get_periodicity_weekly(db, habit_name):
-            return "Weekly"
+    streak = calculate_current_streak(db, "Running")
 
-        m.setattr("analyze.get_date_for_habit", mock_get_date_for_habit_weekly)
-        m.setattr("analyze.get_periodicity", mock_get_periodicity_weekly)
+    assert streak == 4
 
-        streak = calculate_current_streak(db, "Running")
+    # Completions on different weekdays of consecutive weeks continue the streak
+    store_completion_dates(db, "Cleaning", "Weekly", ["2024-01-01", "2024-01-14", "2024-01-15", "2024-01-24"])
 
-        assert streak == 4
+    assert calculate_current_streak(db, "Cleaning") == 3
 
 
-def test_calculate_current_streak_monthly(monkeypatch):
-    with monkeypatch.context() as m:
-        # Mock get_date_for_habit to return completion dates for testing
-        def mock_get_date_for_habit_monthly(db, habit_name):
-            return ["2024-07-31", "2024-07-01", "2024-03-01", "2024-02-01", "2024-01-01"]
+def test_calculate_current_streak_monthly(db):
+    # Month ends are one calendar month apart although the months have different lengths
+    store_completion_dates(db, "Reading", "Monthly", ["2024-04-30", "2024-03-31", "2024-02-29", "2024-01-31",
+                                                      "2023-11-30"])
 
-        # Mock get_periodicity to return the periodicity for testing
-        def mock_get_periodicity_monthly(db, habit_name):
-            return "Monthly"
+    streak = calculate_current_streak(db, "Reading")
 
-        m.setattr("analyze.get_date_for_habit", mock_get_date_for_habit_monthly)
-        m.setattr("analyze.get_periodicity", mock_get_periodicity_monthly)
+    assert streak == 3
 
-        streak = calculate_current_streak(db, "Reading")
+    # Several completions within one month count as one completed month
+    store_completion_dates(db, "Baking", "Monthly", ["2024-03-01", "2024-02-01", "2024-02-29", "2024-01-31"])
 
-        assert streak == 1
+    assert calculate_current_streak(db, "Baking") == 2
 
 
 def mock_get_date_for_habit_ls(db, habit_name):
@@ -158,61 +139,36 @@ def mock_get_date_for_habit_ls(db, habit_name):
             "2024-01-02", "2024-01-01"]
 
 
-def mock_get_periodicity_ls(db, habit_name):
-    # Return the periodicity for testing
-    return "Daily"
-
-
 # Test cases
-def test_calculate_longest_streak_daily(monkeypatch):
-    with monkeypatch.context() as m:
-        m.setattr("analyze.get_date_for_habit", mock_get_date_for_habit_ls)
-        m.setattr("analyze.get_periodicity", mock_get_periodicity_ls)
-
-        streak = calculate_longest_streak(db, "Running")
-
-        assert streak == 5
+def test_calculate_longest_streak_daily(db):
+    store_completion_dates(db, "Running", "Daily", mock_get_date_for_habit_ls(db, "Running"))
 
+    streak = calculate_longest_streak(db, "Running")
 
-def test_calculate_longest_streak_weekly(monkeypatch):
-    with monkeypatch.context() as m:
-        # Mock get_date_for_habit to return completion dates for testing
-        def mock_get_date_for_habit_weekly(db, habit_name):
-            return ["2024-01-29", "2024-01-22", "2024-01-15", "2024-01-08", "2024-01-01"]
+    assert streak == 5
 
-        # Mock get_periodicity to return the periodicity for testing
-        def mock_get_periodicity_weekly(db, habit_name):
-            return "Weekly"
 
-        m.setattr("analyze.get_date_for_habit", mock_get_date_for_habit_weekly)
-        m.setattr("analyze.get_periodicity", mock_get_periodicity_weekly)
+def test_calculate_longest_streak_weekly(db):
+    store_completion_dates(db, "Running", "Weekly", ["2024-01-29", "2024-01-22", "2024-01-15", "2024-01-08",
+                                                     "2024-01-01"])
 
-        streak = calculate_longest_streak(db, "Running")
+    streak = calculate_longest_streak(db, "Running")
 
-        assert streak == 4
+    assert streak == 4
 
 
-def test_calculate_longest_streak_monthly(monkeypatch):
-    with monkeypatch.context() as m:
-        # Mock get_date_for_habit to return completion dates for testing
-        def mock_get_date_for_habit_monthly(db, habit_name):
-            return ["2024-07-31", "2024-07-01", "2024-06-01", "2024-02-01", "2024-01-01"]
+def test_calculate_longest_streak_monthly(db):
+    store_completion_dates(db, "Reading", "Monthly", ["2024-07-31", "2024-06-30", "2024-05-31", "2024-02-01",
+                                                      "2024-01-01"])
 
-        # Mock get_periodicity to return the periodicity for testing
-        def mock_get_periodicity_monthly(db, habit_name):
-            return "Monthly"
+    streak = calculate_longest_streak(db, "Reading")
 
-        m.setattr("analyze.get_date_for_habit", mock_get_date_for_habit_monthly)
-        m.setattr("analyze.get_periodicity", mock_get_periodicity_monthly)
-
-        streak = calculate_longest_streak(db, "Reading")
-
-        assert streak == 2
+    assert streak == 2
 
 
 # the following test applies similarly to function table_sorted_periodicity, table_sorted_current_streak,
 # table_sorted_longest_streak
-def test_table_sorted_alphabet(monkeypatch, capsys):
+def test_table_sorted_alphabet(db, capsys):
     habit_data = [
         {"habit name": "Reading", "habit description": "Read 30 minutes daily", "periodicity": "Daily",
          "habit group": "Personal Development", "creation date": "2023-01-01", "current streak": 5,
@@ -223,21 +179,29 @@ def test_table_sorted_alphabet(monkeypatch, capsys):
          "habit group": "Professional Development", "creation date": "2023-03-01", "current streak": 10,
          "longest streak": 15}
     ]
-
-    def mock_get_all_habits(db):
-        return habit_data
-
-    monkeypatch.setattr("analyze.get_all_habits", mock_get_all_habits)
+    for habit in habit_data:
+        add_habit(db, *habit.values())
 
     table_sorted_alphabet(db)
 
     captured = capsys.readouterr()
     printed_table = captured.out
 
-    expected_output = tabulate(pd.DataFrame(habit_data).sort_values(by='habit name'), headers='keys', tablefmt='psql')
+    # The habits are sorted by the database, the index column holds their rank
+    expected_output = tabulate(pd.DataFrame(habit_data).sort_values(by='habit name').reset_index(drop=True),
+                               headers='keys', tablefmt='psql')
 
     assert printed_table.strip() == expected_output.strip()
 
+    # Only the requested page of the sort order is displayed
+    table_sorted_alphabet(db, descending=True, limit=1, offset=1)
+
+    captured = capsys.readouterr()
+
+    expected_output = tabulate(pd.DataFrame(habit_data[:1], index=[1]), headers='keys', tablefmt='psql')
+
+    assert captured.out.strip() == expected_output.strip()
+
 
 def test_table_completion_dates(monkeypatch, capsys):
     habit_name = "Reading"
@@ -265,17 +229,126 @@ def test_table_completion_dates(monkeypatch, capsys):
 
 
 # the following test applies similarly to function habit_with_longest_streak
-def test_habit_with_longest_current_streak(capsys):
+def test_habit_with_longest_current_streak(db, capsys):
     habit_data = [
-        {"habit name": "Reading", "current streak": 5},
-        {"habit name": "Running", "current streak": 3},
-        {"habit name": "Coding", "current streak": 10},
-        {"habit name": "Meditation", "current streak": 7}
+        ("Reading", 5),
+        ("Running", 3),
+        ("Coding", 10),
+        ("Meditation", 7)
     ]
+    for habit_name, current_streak in habit_data:
+        add_habit(db, habit_name, "Description", "Daily", "Health", "2024-01-01", current_streak, current_streak)
 
-    with patch("analyze.get_all_habits", return_value=habit_data):
-        habit_with_longest_current_streak(None)
+    habit_with_longest_current_streak(db)
 
     captured = capsys.readouterr()
 
     assert "Habit with the longest current streak (10): Coding" in captured.out
+
+    # Habits that share the longest current streak are all displayed
+    add_habit(db, "Baking", "Description", "Daily", "Food", "2024-01-01", 10, 10)
+    habit_with_longest_current_streak(db)
+
+    captured = capsys.readouterr()
+
+    assert "Habits with the longest current streak (10): Baking, Coding" in captured.out
+
+
+def test_calculate_all_streaks(db):
+    add_habit(db, "Running", "Run 5km each day", "Daily", "Sports", "2024-01-01", 0, 0)
+    add_habit(db, "Cleaning", "Clean the apartment", "Weekly", "Living", "2024-01-01", 0, 0)
+    add_habit(db, "Clean windows", "Clean all the windows in one room", "Monthly", "Living", "2024-01-01", 0, 0)
+    add_habit(db, "Meditation", "Meditate for 15 minutes daily", "Daily", "Health", "2024-01-01", 0, 0)
+    completion_dates = [("Running", date) for date in mock_get_date_for_habit_ls(db, "Running")]
+    completion_dates += [("Cleaning", date) for date in ["2024-01-29", "2024-01-22", "2024-01-08", "2024-01-01"]]
+    completion_dates += [("Clean windows", date) for date in ["2024-01-31", "2024-02-29", "2024-03-01"]]
+    completion_dates += [("Meditation", "2024-01-01")]
+    db.executemany("INSERT INTO completion_dates VALUES (?, ?)", completion_dates)
+    db.commit()
+
+    streaks = calculate_all_streaks(db)
+
+    assert streaks == {"Running": (2, 5), "Cleaning": (1, 1), "Clean windows": (2, 2), "Meditation": (0, 0)}
+    # The bulk engine agrees with the per-habit calculations
+    for habit_name, (current_streak, longest_streak) in streaks.items():
+        assert calculate_current_streak(db, habit_name) == current_streak
+        assert calculate_longest_streak(db, habit_name) == longest_streak
+
+
+def test_table_completion_dates_streaming(db, capsys):
+    completion_dates_data = [("Reading", f"2023-01-{day:02d}") for day in range(1, 8)]
+    db.executemany("INSERT INTO completion_dates VALUES (?, ?)", completion_dates_data)
+    db.commit()
+
+    # Display the completion dates from the second to the sixth of January in pages of two rows
+    table_completion_dates(db, "Reading", page_size=2, start_date="2023-01-02", end_date="2023-01-06", limit=4)
+
+    captured = capsys.readouterr()
+
+    expected_pages = [
+        tabulate(pd.DataFrame(completion_dates_data[1:3], columns=['habit name', 'completion date']),
+                 headers='keys', tablefmt='psql'),
+        tabulate(pd.DataFrame(completion_dates_data[3:5], columns=['habit name', 'completion date'], index=[2, 3]),
+                 headers='keys', tablefmt='psql'),
+    ]
+    assert captured.out.strip() == "\n".join(expected_pages)
+
+
+def test_bitmap_analyses(db):
+    add_habit(db, "Running", "Run 5km each day", "Daily", "Sports", "2024-01-01", 0, 0)
+    db.executemany("INSERT INTO completion_dates VALUES (?, ?)",
+                   [("Running", date) for date in mock_get_date_for_habit_ls(db, "Running")])
+    db.commit()
+
+    # Without a bitmap the analyses read the completion dates
+    assert calculate_bitmap_streaks(db, "Running") is None
+    assert count_completions(db, "Running", "2024-01-05", "2024-01-10") == 3
+    assert was_completed_on(db, "Running", "2024-01-07") is False
+
+    # The bitmap gives the same answers
+    enable_completion_bitmap(db, "Running")
+    assert calculate_bitmap_streaks(db, "Running") == (calculate_current_streak(db, "Running"),
+                                                       calculate_longest_streak(db, "Running"))
+    assert count_completions(db, "Running", "2024-01-05", "2024-01-10") == 3
+    assert count_completions(db, "Running") == 9
+    assert was_completed_on(db, "Running", "2024-01-06") is True
+
+
+def test_streak_cache(db, monkeypatch):
+    store_completion_dates(db, "Running", "Daily", ["2024-01-01", "2024-01-02"])
+    store_completion_dates(db, "Reading", "Weekly", ["2024-01-01", "2024-01-08"])
+    cache = StreakCache(db, max_size=2)
+    assert cache.calculate_current_streak("Running") == 1
+
+    # Unchanged habits are answered from the cache without reading their completion dates
+    calls = []
+    monkeypatch.setattr("analyze.get_periods_for_habit", lambda db, habit_name: calls.append(habit_name) or [])
+    assert cache.calculate_current_streak("Running") == 1
+    assert calls == []
+    monkeypatch.undo()
+
+    # New completions and deleted habits invalidate the cached streaks of their habit only
+    increment_habit(db, "Running", "2024-01-03")
+    assert cache.calculate_current_streak("Running") == 2
+    assert cache.calculate_longest_streak("Reading") == 1
+    delete_habit_from_db(db, "Running")
+    store_completion_dates(db, "Running", "Daily", ["2024-01-01"])
+    assert cache.calculate_current_streak("Running") == 0
+
+    # The least recently used streaks are evicted
+    assert cache.calculate_longest_streak("Running") == 0
+    assert len(cache._results) == 2 and ("calculate_longest_streak", "Reading") not in cache._results
+
+
+def test_archived_streaks(db, tmp_path):
+    store_completion_dates(db, "Running", "Daily", ["2024-01-01", "2024-01-02", "2024-01-03", "2024-01-05"])
+    store_completion_dates(db, "Reading", "Monthly", ["2023-11-30", "2023-12-01", "2024-01-31", "2024-02-01"])
+    archive_completions(db, "2024-01-03", str(tmp_path / "archive"))
+
+    # Streaks running from the archive into the completion days table are calculated from both
+    assert calculate_longest_streak(db, "Running") == 2
+    assert calculate_current_streak(db, "Running") == 0
+    assert calculate_current_streak(db, "Reading") == 3
+    assert calculate_all_streaks(db) == {"Running": (0, 2), "Reading": (3, 3)}
+    assert was_completed_on(db, "Running", "2024-01-01")
+    assert count_completions(db, "Reading", "2023-12-01", "2024-01-31") == 2
@@ -1,7 +1,23 @@
+import asyncio
 import pytest
+from datetime import date, datetime
 import sqlite3
+import threading
+import instrumentation
+from asyncstore import AsyncHabitStore
+from shardrouter import ShardRouter
+from recompute import recompute_all_streaks, partition_habits
+from importexport import export_data, import_data, read_records, COMPLETION_FIELDS
+from habittracker import load_habit, load_habits
+from analyze import calculate_all_streaks
 from db import (create_tables, add_habit, increment_habit, get_date_for_habit, get_all_dates_for_habit, get_periodicity,
-                get_all_habits, get_current_streak, update_current_streak, delete_habit_from_db, habit_exists)
+                get_all_habits, get_current_streak, get_longest_streak, update_current_streak, delete_habit_from_db,
+                habit_exists, get_db,
+                get_schema_version, SCHEMA_VERSION, increment_habits_bulk, ConnectionPool, get_sorted_habits,
+                get_leaderboard, LeaderboardCache, update_longest_streak, get_summary, enable_completion_bitmap,
+                get_completion_bitmap, day_number, period_number, get_periods_for_habit, parse_date,
+                iter_completion_dates, import_completions, get_import_progress, archive_completions, get_completion_archive,
+                get_days_for_habit, open_completion_archive, get_habit_version)
 
 
 @pytest.fixture
@@ -26,8 +42,10 @@ def test_create_tables(db):
     cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='habit';")
     assert cursor.fetchone() is not None
 
-    # Check if the completion_dates table is created
-    cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='completion_dates';")
+    # Check if the completion_dates view over the completion_days table is created
+    cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='completion_days';")
+    assert cursor.fetchone() is not None
+    cursor.execute("SELECT name FROM sqlite_master WHERE type='view' AND name='completion_dates';")
     assert cursor.fetchone() is not None
 
     # Check if the habit table has the expected columns
@@ -333,3 +351,635 @@ def test_delete_habit_from_db_nonexistent_habit(db):
 
     # Verify that the function handles the case when the habit does not exist
     assert not habit_exists(db, habit_name)
+
+
+def test_create_tables_applies_migrations(db):
+    # A freshly created database is at the latest schema version
+    assert get_schema_version(db) == SCHEMA_VERSION
+
+    # Check if the covering index for completion days exists
+    cursor = db.cursor()
+    cursor.execute("PRAGMA index_list(completion_days);")
+    index_names = [row[1] for row in cursor.fetchall()]
+    assert 'idx_completion_days_habit_day' in index_names
+
+
+def test_migrate_existing_database(tmp_path):
+    # Create a database with the original, unversioned schema and some data
+    path = str(tmp_path / "legacy.db")
+    legacy = sqlite3.connect(path)
+    legacy.execute('''CREATE TABLE habit (
+                        habit_name VARCHAR(20) PRIMARY KEY,
+                        description TEXT NOT NULL,
+                        periodicity VARCHAR(20) NOT NULL,
+                        habit_group VARCHAR(20),
+                        creation_date DATE NOT NULL,
+                        current_streak INT,
+                        longest_streak INT
+                    )''')
+    legacy.execute("CREATE TABLE completion_dates (habit_name VARCHAR(20), event_date DATETIME)")
+    legacy.execute("INSERT INTO habit VALUES ('Running', 'Run 5km each day', 'Daily', 'Sports', '2024-01-01', 0, 0)")
+    legacy.executemany("INSERT INTO completion_dates VALUES (?, ?)",
+                       [("Running", "2024-01-03"), ("Running", "2024-01-01"), ("Running", "2024-01-02")])
+    legacy.commit()
+    legacy.close()
+
+    # Opening the database upgrades it in place
+    db = get_db(path)
+    assert get_schema_version(db) == SCHEMA_VERSION
+    assert habit_exists(db, "Running") is not None
+    assert get_date_for_habit(db, "Running") == ["2024-01-01", "2024-01-02", "2024-01-03"]
+    db.close()
+
+
+def test_completion_days_storage(db, tmp_path):
+    add_habit(db, "Running", "Run 5km each day", "Daily", "Sports", "2024-01-01", 0, 0)
+    increment_habit(db, "Running", "2024-01-02")
+    db.execute("INSERT INTO completion_dates VALUES (?, ?)", ("Running", "2024-01-01"))
+
+    # Completion dates are stored as day numbers and read back as ISO date strings
+    assert db.execute("SELECT day FROM completion_days ORDER BY day").fetchall() == [(19723,), (19724,)]
+    assert get_date_for_habit(db, "Running") == ["2024-01-01", "2024-01-02"]
+    assert get_summary(db, "habit_group") == [("Sports", 1, 2, 0.0, 0, "2024-01-02")]
+
+    db.execute("DELETE FROM completion_dates WHERE event_date = '2024-01-02'")
+    assert get_date_for_habit(db, "Running") == ["2024-01-01"]
+    assert get_summary(db, "habit_group") == [("Sports", 1, 1, 0.0, 0, "2024-01-01")]
+
+    # Completion dates that are not valid dates stop the upgrade before anything is changed
+    path = str(tmp_path / "invalid.db")
+    legacy = sqlite3.connect(path)
+    legacy.execute("CREATE TABLE completion_dates (habit_name VARCHAR(20), event_date DATETIME)")
+    legacy.execute("INSERT INTO completion_dates VALUES ('Running', 'yesterday')")
+    legacy.commit()
+    legacy.close()
+    with pytest.raises(Exception) as exception_info:
+        get_db(path)
+    assert str(exception_info.value) == "1 completion date(s) are not valid dates and cannot be converted."
+    legacy = sqlite3.connect(path)
+    assert get_schema_version(legacy) == 5
+    legacy.close()
+
+
+def test_increment_habit_incremental(db):
+    add_habit(db, "Running", "Run 5km each day", "Daily", "Health", "2024-01-01", 0, 0)
+
+    for event_date in ["2024-01-01", "2024-01-02", "2024-01-03", "2024-01-05", "2024-01-06"]:
+        increment_habit(db, "Running", event_date, incremental=True)
+
+    # The streaks are up to date without recalculating them from the history
+    assert get_current_streak(db, "Running") == 1
+    assert get_longest_streak(db, "Running") == 2
+
+    # A completion that is older than the last one is merged into the history
+    increment_habit(db, "Running", "2024-01-04", incremental=True)
+    assert get_current_streak(db, "Running") == 5
+    assert get_longest_streak(db, "Running") == 5
+
+    increment_habit(db, "Running", "2024-01-07", incremental=True)
+    assert get_current_streak(db, "Running") == 6
+    assert get_longest_streak(db, "Running") == 6
+
+    # Deleting a completion date invalidates the stored state, so the next completion does not extend the old streak
+    db.execute("DELETE FROM completion_dates WHERE habit_name = 'Running' AND event_date = '2024-01-07'")
+    increment_habit(db, "Running", "2024-01-08", incremental=True)
+    assert (get_current_streak(db, "Running"), get_longest_streak(db, "Running")) == \
+        calculate_all_streaks(db)["Running"]
+    assert get_longest_streak(db, "Running") == 5
+
+
+def test_increment_habits_bulk(db):
+    add_habit(db, "Running", "Run 5km each day", "Daily", "Health", "2024-01-01", 0, 0)
+    completions = (("Running", f"2024-01-{day:02d}") for day in range(1, 6))
+    completions = list(completions) + [("NonExistentHabit", "2024-01-01")]
+
+    # Call the function under test with a generator and a small batch size
+    batch_counts = increment_habits_bulk(db, iter(completions), chunk_size=2)
+
+    # Completion dates of unknown habits are skipped and reported per batch
+    assert batch_counts == [(2, 0), (2, 0), (1, 1)]
+    assert get_date_for_habit(db, "Running") == [f"2024-01-{day:02d}" for day in range(1, 6)]
+    assert get_date_for_habit(db, "NonExistentHabit") == []
+
+
+def test_connection_pool_concurrent_access(tmp_path):
+    errors = []
+
+    with ConnectionPool(str(tmp_path / "pool.db"), readers=2, busy_timeout=1000) as pool:
+        with pool.writer() as db:
+            add_habit(db, "Running", "Run 5km each day", "Daily", "Health", "2024-01-01", 0, 0)
+            journal_mode = db.execute("PRAGMA journal_mode").fetchone()[0]
+
+        def write():
+            try:
+                for _ in range(20):
+                    with pool.writer() as db:
+                        increment_habit(db, "Running", "2024-01-01")
+            except Exception as error:
+                errors.append(error)
+
+        def read():
+            try:
+                for _ in range(20):
+                    with pool.reader() as db:
+                        get_date_for_habit(db, "Running")
+            except Exception as error:
+                errors.append(error)
+
+        threads = [threading.Thread(target=target) for target in (write, write, read, read, read)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # Read-only connections cannot write to the database
+        with pytest.raises(sqlite3.OperationalError):
+            with pool.reader() as db:
+                increment_habit(db, "Running")
+
+        with pool.reader() as db:
+            assert len(get_date_for_habit(db, "Running")) == 40
+
+    assert journal_mode == "wal"
+    assert errors == []
+
+
+def test_load_habit(db):
+    add_habit(db, "Running", "Run 5km each day", "Daily", "Health", "2024-01-01", 3, 5)
+    add_habit(db, "Reading", "Read a book each week", "Weekly", "Education", "2024-01-05", 0, 1)
+
+    habit = load_habit(db, "Running")
+
+    # Check if all attributes are loaded from the database
+    assert (habit.habit_name, habit.habit_description, habit.periodicity, habit.habit_group, habit.creation_date,
+            habit.current_streak, habit.longest_streak) == ("Running", "Run 5km each day", "Daily", "Health",
+                                                            "2024-01-01", 3, 5)
+    assert load_habit(db, "NonExistentHabit") is None
+
+    # The batch variant keeps the requested order and leaves out habits that do not exist
+    habits = load_habits(db, ["Reading", "NonExistentHabit", "Running"])
+    assert [habit.habit_name for habit in habits] == ["Reading", "Running"]
+
+
+def test_async_habit_store(tmp_path):
+    async def use_store():
+        async with AsyncHabitStore(str(tmp_path / "async.db"), readers=2, max_pending=4) as store:
+            await store.add_habit("Running", "Run 5km each day", "Daily", "Health", "2024-01-01", 0, 0)
+            # Many concurrent calls are queued without blocking the event loop
+            await asyncio.gather(*(store.increment_habit("Running", f"2024-01-{day:02d}") for day in range(1, 11)))
+            habits, current_streak, all_streaks = await asyncio.gather(
+                store.get_all_habits(), store.calculate_current_streak("Running"), store.calculate_all_streaks())
+        return habits, current_streak, all_streaks
+
+    habits, current_streak, all_streaks = asyncio.run(use_store())
+
+    assert [habit["habit name"] for habit in habits] == ["Running"]
+    assert current_streak == 9
+    assert all_streaks == {"Running": (9, 9)}
+
+
+def test_async_habit_store_cancellation(tmp_path):
+    started, finish = threading.Event(), threading.Event()
+
+    def block(db):
+        started.set()
+        finish.wait(5)
+
+    async def use_store():
+        async with AsyncHabitStore(str(tmp_path / "async.db"), readers=2, max_pending=1) as store:
+            blocked = asyncio.ensure_future(store._read(block))
+            await asyncio.get_running_loop().run_in_executor(None, started.wait, 5)
+            blocked.cancel()
+            # The cancelled call still runs on its thread and keeps the only slot until it has finished
+            waiting = asyncio.ensure_future(store.get_all_habits())
+            await asyncio.sleep(0.05)
+            assert not waiting.done()
+            finish.set()
+            return await waiting
+
+    assert asyncio.run(use_store()) == []
+
+
+def test_get_sorted_habits(db):
+    add_habit(db, "Running", "Run 5km each day", "Daily", "Health", "2024-01-01", 3, 9)
+    add_habit(db, "Reading", "Read a book each week", "Weekly", "Education", "2024-01-05", 0, 4)
+    add_habit(db, "Meditation", "Meditate for 15 minutes daily", "Daily", "Health", "2024-01-10", 3, 12)
+
+    # Top two habits by longest streak
+    top_habits = get_sorted_habits(db, "longest_streak", descending=True, limit=2)
+    assert [habit[0] for habit in top_habits] == ["Meditation", "Running"]
+
+    # Habits with the same value are sorted by name
+    assert [habit[0] for habit in get_sorted_habits(db, "current_streak")] == ["Reading", "Meditation", "Running"]
+    assert [habit[0] for habit in get_sorted_habits(db, "habit_name", offset=1)] == ["Reading", "Running"]
+
+    # The sort order is served by an index instead of sorting the whole table
+    cursor = db.cursor()
+    cursor.execute("EXPLAIN QUERY PLAN SELECT * FROM habit ORDER BY longest_streak DESC, habit_name DESC LIMIT 2")
+    assert "idx_habit_longest_streak" in " ".join(row[3] for row in cursor.fetchall())
+
+    with pytest.raises(Exception):
+        get_sorted_habits(db, "description")
+
+
+def test_get_leaderboard(db):
+    for habit_name, habit_group, longest_streak in [("Running", "Sports", 9), ("Swimming", "Sports", 9),
+                                                    ("Reading", "Education", 4), ("Cycling", "Sports", 2),
+                                                    ("Writing", "Education", 1)]:
+        add_habit(db, habit_name, "Description", "Daily", habit_group, "2024-01-01", 0, longest_streak)
+
+    # Habits that tie with the last place are included
+    assert get_leaderboard(db, "longest_streak", limit=1) == [("Running", None, 9, 1, 1), ("Swimming", None, 9, 1, 1)]
+    assert get_leaderboard(db, "longest_streak", limit=3) == [("Running", None, 9, 1, 1), ("Swimming", None, 9, 1, 1),
+                                                              ("Reading", None, 4, 3, 2)]
+
+    # Leaderboards per group, for all groups or a single one
+    assert get_leaderboard(db, "longest_streak", limit=1, partition_by="habit_group") == [
+        ("Reading", "Education", 4, 1, 1), ("Running", "Sports", 9, 1, 1), ("Swimming", "Sports", 9, 1, 1)]
+    assert get_leaderboard(db, "longest_streak", limit=5, partition_by="habit_group", partition_value="Education") == [
+        ("Reading", "Education", 4, 1, 1), ("Writing", "Education", 1, 2, 2)]
+
+    # A leaderboard without places is empty
+    assert get_leaderboard(db, "longest_streak", limit=0) == []
+    assert get_leaderboard(db, "longest_streak", limit=0, partition_by="habit_group") == []
+
+    # Cached leaderboards are recalculated after a streak column has changed
+    cache = LeaderboardCache(db)
+    assert cache.get_leaderboard("longest_streak", 1) == get_leaderboard(db, "longest_streak", 1)
+    update_longest_streak(db, 12, "Writing")
+    assert cache.get_leaderboard("longest_streak", 1) == [("Writing", None, 12, 1, 1)]
+    assert cache.get_streak_leaders("longest_streak") == [("Writing", 12)]
+
+
+def test_summary_tables(db):
+    add_habit(db, "Running", "Run 5km each day", "Daily", "Sports", "2024-01-01", 0, 0)
+    add_habit(db, "Swimming", "Swim 1km", "Weekly", "Sports", "2024-01-01", 0, 0)
+    add_habit(db, "Reading", "Read a book each week", "Weekly", "Education", "2024-01-01", 0, 0)
+    for event_date in ["2024-01-01", "2024-01-02", "2024-01-03"]:
+        increment_habit(db, "Running", event_date, incremental=True)
+    increment_habit(db, "Swimming", "2024-01-05")
+    increment_habit(db, "Reading", "2024-01-04")
+
+    # The summary tables are kept up to date by triggers
+    assert get_summary(db, "habit_group") == [("Education", 1, 1, 0.0, 0, "2024-01-04"),
+                                              ("Sports", 2, 4, 1.0, 2, "2024-01-05")]
+    assert get_summary(db, "periodicity", "Weekly") == [("Weekly", 2, 2, 0.0, 0, "2024-01-05")]
+
+    delete_habit_from_db(db, "Swimming")
+    assert get_summary(db, "habit_group", "Sports") == [("Sports", 1, 3, 2.0, 2, "2024-01-03")]
+    assert get_summary(db, "periodicity") == [("Daily", 1, 3, 2.0, 2, "2024-01-03"),
+                                              ("Weekly", 1, 1, 0.0, 0, "2024-01-04")]
+
+    # Moving a habit to another group moves its completions as well
+    db.execute("UPDATE habit SET habit_group = 'Education' WHERE habit_name = 'Running'")
+    assert get_summary(db, "habit_group") == [("Education", 2, 4, 1.0, 2, "2024-01-04")]
+
+
+def test_completion_bitmap(db):
+    add_habit(db, "Running", "Run 5km each day", "Daily", "Sports", "2024-01-01", 0, 0)
+    add_habit(db, "Reading", "Read a book each week", "Weekly", "Education", "2024-01-01", 0, 0)
+    for event_date in ["2024-01-01", "2024-01-02", "2024-01-03", "2024-01-05"]:
+        increment_habit(db, "Running", event_date)
+
+    # The bitmap is built from the existing history and kept up to date by increment_habit
+    enable_completion_bitmap(db, "Running")
+    increment_habit(db, "Running", "2024-01-06")
+    increment_habits_bulk(db, [("Running", "2023-12-31"), ("Running", "2024-01-07")])
+    bitmap = get_completion_bitmap(db, "Running")
+    assert bitmap.first_day == day_number("2023-12-31")
+    assert bitmap.is_completed(day_number("2024-01-02")) and not bitmap.is_completed(day_number("2024-01-04"))
+    assert bitmap.count(day_number("2024-01-03"), day_number("2024-01-06")) == 3
+    assert (bitmap.current_streak(), bitmap.longest_streak()) == (2, 3)
+    assert len(bitmap.to_blob()) == 1
+
+    with pytest.raises(Exception):
+        enable_completion_bitmap(db, "Reading")
+
+    # Changes the bitmap cannot follow delete it instead of leaving it stale
+    db.execute("DELETE FROM completion_dates WHERE habit_name = 'Running' AND event_date = '2024-01-07'")
+    assert get_completion_bitmap(db, "Running") is None
+    enable_completion_bitmap(db, "Running")
+    db.execute("UPDATE habit SET periodicity = 'Weekly' WHERE habit_name = 'Running'")
+    assert get_completion_bitmap(db, "Running") is None
+    db.execute("UPDATE habit SET periodicity = 'Daily' WHERE habit_name = 'Running'")
+    enable_completion_bitmap(db, "Running")
+    delete_habit_from_db(db, "Running")
+    assert get_completion_bitmap(db, "Running") is None
+
+
+def test_completion_periods(db):
+    add_habit(db, "Reading", "Read a book each month", "Monthly", "Education", "2024-01-01", 0, 0)
+    for event_date in ["2024-01-31", "2024-02-29", "2024-02-01", "2024-03-01"]:
+        increment_habit(db, "Reading", event_date, incremental=True)
+
+    # Month ends of months with different lengths are consecutive months
+    assert get_periods_for_habit(db, "Reading") == [24288, 24289, 24290]
+    assert (get_current_streak(db, "Reading"), get_longest_streak(db, "Reading")) == (2, 2)
+
+    # The period numbers stored by SQL agree with period_number
+    for periodicity in ["Daily", "Weekly", "Monthly"]:
+        db.execute("UPDATE habit SET periodicity = ? WHERE habit_name = 'Reading'", (periodicity,))
+        rows = db.execute("SELECT day, period FROM completion_days WHERE habit_name = 'Reading'").fetchall()
+        assert [period for day, period in rows] == [period_number(periodicity, day) for day, period in rows]
+    assert period_number("Weekly", day_number("2024-01-07")) + 1 == period_number("Weekly", day_number("2024-01-08"))
+
+    # Streaks are read from an index on the period numbers
+    cursor = db.cursor()
+    cursor.execute("EXPLAIN QUERY PLAN SELECT DISTINCT period FROM completion_days WHERE habit_name=? ORDER BY period",
+                   ("Reading",))
+    assert "idx_completion_days_habit_period" in " ".join(row[3] for row in cursor.fetchall())
+
+
+def test_date_normalization(tmp_path):
+    parse_date.cache_clear()
+    db = get_db(str(tmp_path / "dates.db"), date_objects=True)
+    add_habit(db, "Running", "Run 5km each day", "Daily", "Sports", "2024-01-01", 0, 0)
+    increment_habits_bulk(db, [("Running", "2024-01-01"), ("Running", "2024-01-02 08:30:00"),
+                               ("Running", datetime(2024, 1, 3, 7, 0)), ("Running", date(2024, 1, 4))])
+    increment_habits_bulk(db, [("Running", "2024-01-01"), ("Running", "2024-01-02 08:30:00")])
+
+    # Repeated date strings are parsed only once
+    assert (parse_date.cache_info().hits, parse_date.cache_info().misses) == (2, 2)
+
+    # Completion dates are returned as date objects through the sqlite3 converter
+    assert get_date_for_habit(db, "Running")[:4] == [date(2024, 1, 1), date(2024, 1, 1), date(2024, 1, 2),
+                                                     date(2024, 1, 2)]
+    assert list(iter_completion_dates(db, "Running", start_date=date(2024, 1, 3))) == [("Running", date(2024, 1, 3)),
+                                                                                       ("Running", date(2024, 1, 4))]
+    db.close()
+
+    # Other connections keep returning ISO strings
+    db = get_db(str(tmp_path / "dates.db"))
+    assert get_all_dates_for_habit(db, "Running")[-1] == ("Running", "2024-01-04")
+    db.close()
+
+
+def test_shard_router(tmp_path):
+    errors = []
+
+    with ShardRouter(str(tmp_path / "shards"), max_open=2, busy_timeout=1000) as router:
+        def write(user_id):
+            try:
+                router.call(user_id, add_habit, "Running", "Run 5km each day", "Daily", "Sports", "2024-01-01", 0, 0)
+                for day in range(1, 11):
+                    router.call(user_id, increment_habit, "Running", f"2024-01-{day:02d}", incremental=True)
+            except Exception as error:
+                errors.append(error)
+
+        # Each user writes to a database file of its own
+        threads = [threading.Thread(target=write, args=(user_id,)) for user_id in ["alice", "bob", "carol@example.com"]]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert errors == []
+        assert len(list((tmp_path / "shards").glob("*.db"))) == 3
+
+        # Only the most recently used idle connections are kept open
+        assert len(router.open_shards()) == 2
+        router.call("alice", delete_habit_from_db, "Running")
+        assert router.open_shards()[-1] == "alice"
+        assert router.call("alice", habit_exists, "Running") is None
+        assert router.call("bob", get_current_streak, "Running") == 9
+        assert router.call("bob", calculate_all_streaks) == {"Running": (9, 9)}
+        assert router.shard_path("carol@example.com").endswith(".db")
+        assert "@" not in router.shard_path("carol@example.com")
+
+
+def test_recompute_all_streaks(tmp_path):
+    path = str(tmp_path / "recompute.db")
+    db = get_db(path)
+    for number in range(10):
+        add_habit(db, f"Habit {number}", "Description", "Daily", "Health", "2024-01-01", 0, 0)
+    increment_habits_bulk(db, [(f"Habit {number}", f"2024-01-{day:02d}") for number in range(10)
+                               for day in range(1, number + 2)])
+    update_current_streak(db, 4, "Habit 4")
+
+    assert partition_habits(["a", "b", "c", "d", "e"], 2) == [("a", "c", 3), ("d", "e", 2)]
+
+    reports = []
+    habits, changed, seconds = recompute_all_streaks(path, workers=2, partitions_per_worker=2,
+                                                     progress=lambda *report: reports.append(report))
+
+    # Every habit is calculated once, only the stored streaks that were wrong are written
+    assert (habits, changed) == (10, 9)
+    assert [report[0] for report in reports][-1] == 10 and len(reports) == 4
+    assert [(get_current_streak(db, f"Habit {number}"), get_longest_streak(db, f"Habit {number}"))
+            for number in range(10)] == [(number, number) for number in range(10)]
+    db.close()
+
+
+def test_import_export(db, tmp_path):
+    add_habit(db, "Running", "Run 5km each day", "Daily", None, "2024-01-01", 0, 0)
+    add_habit(db, "Reading", "Read a book each week", "Weekly", "Education", "2024-01-01", 0, 0)
+    increment_habits_bulk(db, [("Running", f"2024-01-{day:02d}") for day in range(1, 6)] + [("Reading", "2024-01-01")])
+
+    # Habits and completion dates are written to and read back from both formats
+    habits_path, completions_path = str(tmp_path / "habits.csv"), str(tmp_path / "completions.jsonl")
+    assert export_data(db, habits_path, completions_path) == (2, 6)
+    target = sqlite3.connect(":memory:")
+    create_tables(target)
+    add_habit(target, "Reading", "Another description", "Weekly", "Education", "2024-01-01", 0, 0)
+    report = import_data(target, habits_path, completions_path, chunk_size=4)
+    assert report == {"habits": (1, 1, [], ["Reading"]), "completions": (6, 0, [], [])}
+    assert get_all_habits(target)[1]["habit group"] is None
+    assert get_date_for_habit(target, "Running") == get_date_for_habit(db, "Running")
+
+    # Importing the same files again does not duplicate anything, a restart reads them from the start but skips the
+    # completion dates that are already stored or archived
+    assert import_data(target, habits_path, completions_path) == {"habits": (0, 0, [], []),
+                                                                  "completions": (0, 0, [], [])}
+    archive_completions(target, "2024-01-03", str(tmp_path / "archive"))
+    increment_habit(target, "Running", "2024-01-02")
+    report = import_data(target, None, completions_path, restart=True)
+    assert report["completions"] == (0, 6, [], ["Reading", "Running"])
+    assert get_date_for_habit(target, "Running") == ["2024-01-01", "2024-01-02", "2024-01-02", "2024-01-03",
+                                                     "2024-01-04", "2024-01-05"]
+
+    # An interrupted import continues after the last stored chunk
+    def interrupted(records, stop):
+        for number, record in enumerate(records):
+            if number == stop:
+                raise KeyboardInterrupt
+            yield record
+
+    target = sqlite3.connect(":memory:")
+    create_tables(target)
+    add_habit(target, "Running", "Run 5km each day", "Daily", None, "2024-01-01", 0, 0)
+    conflicts = set()
+    with pytest.raises(KeyboardInterrupt):
+        import_completions(target, interrupted(read_records(completions_path, COMPLETION_FIELDS), 5), "source", 2,
+                           conflicts)
+    assert get_import_progress(target, "source") == 4
+    assert conflicts == {"Reading"}
+    assert import_completions(target, read_records(completions_path, COMPLETION_FIELDS), "source", 2) == [(2, 0)]
+    assert len(get_date_for_habit(target, "Running")) == 5
+
+    # Completion dates that are missing are invalid, the chunk holding them is not stored
+    invalid_path = str(tmp_path / "invalid.csv")
+    with open(invalid_path, "w") as invalid_file:
+        invalid_file.write("habit_name,event_date\nRunning,2024-01-15\nRunning,\n")
+    with pytest.raises(Exception):
+        import_data(target, None, invalid_path)
+    assert len(get_date_for_habit(target, "Running")) == 5
+
+
+def test_completion_archive(db, tmp_path, monkeypatch):
+    add_habit(db, "Running", "Run 5km each day", "Daily", "Sports", "2024-01-01", 0, 0)
+    add_habit(db, "Reading", "Read a book each week", "Weekly", "Education", "2024-01-01", 0, 0)
+    increment_habits_bulk(db, [("Running", f"2024-01-{day:02d}") for day in range(1, 11)] +
+                          [("Reading", "2024-01-01"), ("Reading", "2024-01-08"), ("Reading", "2024-01-15")])
+    dates = get_date_for_habit(db, "Running")
+    summary = get_summary(db, "habit_group")
+
+    # The archived completion dates leave the table but are still read together with the live ones
+    path = str(tmp_path / "main.archive")
+    assert archive_completions(db, "2024-01-06", path) == 6
+    assert get_completion_archive(db) == (f"{path}.1", day_number("2024-01-06"))
+    assert db.execute("SELECT COUNT(*) FROM completion_days").fetchone()[0] == 7
+    assert open_completion_archive(db).habit_names == ["Reading", "Running"]
+    assert get_date_for_habit(db, "Running") == dates
+    assert get_periods_for_habit(db, "Reading") == [period_number("Weekly", day_number(event_date))
+                                                     for event_date in ["2024-01-01", "2024-01-08", "2024-01-15"]]
+    assert [event_date for habit_name, event_date in iter_completion_dates(db, "Running", "2024-01-04", limit=4)] == \
+        ["2024-01-04", "2024-01-05", "2024-01-06", "2024-01-07"]
+    assert calculate_all_streaks(db) == {"Running": (9, 9), "Reading": (2, 2)}
+    assert get_summary(db, "habit_group") == summary
+
+    # A later archiving writes the next generation and closes and removes the previous file, backfilled dates are
+    # archived too
+    increment_habit(db, "Running", "2023-12-31")
+    previous_archive = open_completion_archive(db)
+    assert archive_completions(db, "2024-01-09") == 5
+    assert previous_archive.days is None
+    assert not (tmp_path / "main.archive.1").exists()
+    assert get_days_for_habit(db, "Running") == [day_number(event_date) for event_date in ["2023-12-31"] + dates]
+    assert calculate_all_streaks(db)["Running"] == (10, 10)
+    bitmap = enable_completion_bitmap(db, "Running")
+    assert bitmap.count(day_number("2023-12-31"), day_number("2024-01-10")) == 11
+    assert export_data(db, None, str(tmp_path / "completions.csv")) == (0, 14)
+
+    # Archived completion dates are returned in the form of the connection's completion dates
+    dated = get_db(str(tmp_path / "dated.db"), date_objects=True)
+    add_habit(dated, "Running", "Run 5km each day", "Daily", "Sports", "2024-01-01", 0, 0)
+    increment_habits_bulk(dated, [("Running", "2024-01-01"), ("Running", "2024-01-02")])
+    archive_completions(dated, "2024-01-02", str(tmp_path / "dated.archive"))
+    assert get_date_for_habit(dated, "Running") == [date(2024, 1, 1), date(2024, 1, 2)]
+    dated.close()
+
+    # A previous file that cannot be removed is left behind without failing the committed archiving
+    def locked(path):
+        raise PermissionError(path)
+
+    monkeypatch.setattr("os.remove", locked)
+    assert archive_completions(db, "2024-01-10") == 1
+    monkeypatch.undo()
+    assert (tmp_path / "main.archive.2").exists() and get_completion_archive(db)[0] == f"{path}.3"
+
+    # The archived completion dates of a deleted habit are neither counted nor read for a new habit of the same name
+    delete_habit_from_db(db, "Running")
+    assert get_summary(db, "habit_group") == [("Education", 1, 3, 0, 0, "2024-01-15")]
+    add_habit(db, "Running", "Run 5km each day", "Daily", "Sports", "2024-01-01", 0, 0)
+    assert get_date_for_habit(db, "Running") == []
+    assert calculate_all_streaks(db)["Running"] == (0, 0)
+
+
+def test_archived_summaries(db, tmp_path):
+    # The same changes on a database with and one without archived completions give the same summaries
+    plain = sqlite3.connect(":memory:")
+    create_tables(plain)
+    for connection in (db, plain):
+        add_habit(connection, "a", "Description", "Daily", "A", "2024-01-01", 0, 0)
+        add_habit(connection, "b", "Description", "Weekly", "A", "2024-01-01", 0, 0)
+        add_habit(connection, "c", "Description", "Daily", "C", "2024-01-01", 0, 0)
+        increment_habits_bulk(connection, [("a", "2024-03-11"), ("b", "2024-01-02"), ("c", "2024-02-14"),
+                                           ("c", "2024-04-07"), ("c", "2024-07-01")])
+    archive_completions(db, "2024-06-01", str(tmp_path / "archive"))
+
+    def change(connection):
+        delete_habit_from_db(connection, "b")
+        connection.execute("UPDATE habit SET habit_group = 'B' WHERE habit_name = 'a'")
+        connection.execute("DELETE FROM completion_dates WHERE habit_name = 'c' AND event_date = '2024-07-01'")
+        connection.commit()
+
+    for connection in (db, plain):
+        change(connection)
+    assert get_summary(db, "habit_group") == get_summary(plain, "habit_group") == [
+        ("B", 1, 1, 0, 0, "2024-03-11"), ("C", 1, 2, 0, 0, "2024-04-07")]
+    assert get_summary(db, "periodicity") == get_summary(plain, "periodicity")
+
+
+def test_bulk_maintenance(db):
+    # Bulk writes maintain the summaries and versions like the per-row triggers of single writes
+    single = sqlite3.connect(":memory:")
+    create_tables(single)
+    completions = [("b", "2024-01-09"), ("a", "2024-01-03"), ("b", "2024-01-01"), ("a", "2024-01-01"),
+                   ("a", "2024-01-02"), ("c", "2024-02-01")]
+    for connection in (db, single):
+        add_habit(connection, "a", "Description", "Daily", "A", "2024-01-01", 0, 0)
+        add_habit(connection, "b", "Description", "Weekly", "A", "2024-01-01", 0, 0)
+        add_habit(connection, "c", "Description", "Daily", None, "2024-01-01", 0, 0)
+    increment_habits_bulk(db, completions)
+    for habit_name, event_date in completions:
+        increment_habit(single, habit_name, event_date)
+
+    assert get_summary(db, "habit_group") == get_summary(single, "habit_group") == [("A", 2, 5, 0, 0, "2024-01-09")]
+    assert get_summary(db, "periodicity") == get_summary(single, "periodicity")
+    assert get_date_for_habit(db, "a") == ["2024-01-01", "2024-01-02", "2024-01-03"]
+    version = get_habit_version(db, "a")
+    assert version > 1
+    assert get_habit_version(db, "c") > 1
+
+    for connection in (db, single):
+        delete_habit_from_db(connection, "b")
+    assert get_summary(db, "habit_group") == get_summary(single, "habit_group") == [("A", 1, 3, 0, 0, "2024-01-03")]
+    assert get_summary(db, "periodicity") == get_summary(single, "periodicity")
+    assert get_habit_version(db, "b") > 1
+
+    # The per-row triggers are active again after bulk writes
+    assert db.execute("SELECT COUNT(*) FROM bulk_maintenance").fetchone()[0] == 0
+    db.execute("DELETE FROM completion_dates WHERE habit_name = 'a' AND event_date = '2024-01-03'")
+    assert get_summary(db, "habit_group") == [("A", 1, 2, 0, 0, "2024-01-02")]
+    assert get_habit_version(db, "a") == version + 1
+
+
+def test_instrumentation(tmp_path):
+    # Disabled instrumentation neither measures functions nor wraps connections
+    instrumentation.reset()
+    db = get_db(str(tmp_path / "plain.db"))
+    add_habit(db, "Running", "Run 5km each day", "Daily", "Sports", "2024-01-01", 0, 0)
+    assert type(db) is sqlite3.Connection
+    assert instrumentation.summary()["functions"] == []
+    db.close()
+
+    instrumentation.enable()
+    try:
+        db = get_db(str(tmp_path / "plain.db"))
+        increment_habit(db, "Running", "2024-01-01")
+        increment_habit(db, "Running", "2024-01-02")
+        assert get_date_for_habit(db, "Running") == ["2024-01-01", "2024-01-02"]
+        with instrumentation.timed("block"):
+            get_all_habits(db)
+        db.close()
+    finally:
+        instrumentation.disable()
+
+    summary = instrumentation.summary()
+    functions = {stats["name"]: stats["calls"] for stats in summary["functions"]}
+    assert functions["db.increment_habit"] == 2
+    assert functions["db.get_date_for_habit"] == 1
+    assert functions["block"] == 1
+
+    # Statements are counted per execution, rows are counted as they are fetched
+    sql = {stats["statement"]: stats for stats in summary["sql"]}
+    select = sql['SELECT date(day + 2440587.5) AS "event_date [isodate]" FROM completion_days WHERE habit_name=? '
+                 'ORDER BY day']
+    assert (select["executions"], select["rows"]) == (1, 2)
+    insert = next(stats for statement, stats in sql.items() if statement.startswith("INSERT INTO completion_days"))
+    assert (insert["executions"], insert["rows"]) == (2, 2)
+    # The trace callback also sees the statements run by triggers
+    assert summary["traced_statements"] > len(summary["sql"])
+
+    instrumentation.report(str(tmp_path / "profile.json"))
+    assert (tmp_path / "profile.json").exists()
+    instrumentation.reset()